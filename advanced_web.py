@@ -10,7 +10,6 @@ import uvicorn
 import sys
 import json
 import asyncio
-import httpx
 from typing import Optional, Dict
 from user_manager import user_manager
 from translations import get_text, get_all_translations, SUPPORTED_LANGUAGES
@@ -28,28 +27,25 @@ AVAILABLE_MODELS = {
     "qwen-max": {"name": "千问Max (高级)", "description": "最强性能，复杂任务"},
 }
 
-async def call_qwen_api(prompt: str, model: str = "qwen-plus") -> str:
-    """直接调用千问API"""
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.post(
-            f"{QWEN_BASE_URL}/chat/completions",
-            headers={
-                "Authorization": f"Bearer {QWEN_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": model,
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": 4096,
-                "temperature": 0.7
-            }
-        )
-        
-        if response.status_code != 200:
-            raise Exception(f"API调用失败: {response.text}")
-        
-        result = response.json()
-        return result["choices"][0]["message"]["content"]
+def get_chat_llm(model: str = "qwen-plus"):
+    """获取千问对话模型（与智能体共享限流、熔断与流式输出）"""
+    from app.config import LLMSettings
+    from app.llm import LLM
+
+    return LLM(
+        config_name=f"qwen:{model}",
+        llm_config={
+            "default": LLMSettings(
+                model=model,
+                base_url=QWEN_BASE_URL,
+                api_key=QWEN_API_KEY,
+                max_tokens=4096,
+                temperature=0.7,
+                api_type="openai",
+                api_version="",
+            )
+        },
+    )
 
 app = FastAPI(title="JELILIAN AI PRO")
 
@@ -1076,47 +1072,60 @@ async def api_chat(request: Request):
                     # 每日刷新积分
                     credit_manager.daily_refresh_credits(user_id)
                     
-                    # 检查积分是否足够（每次对话消耗10积分）
-                    credit_cost = 10
-                    if subscription == 'pro':
-                        credit_cost = 5  # Pro用户享受50%折扣
-                    elif subscription == 'custom':
-                        credit_cost = 3  # 自定义用户享受70%折扣
-                    
+                    # 检查积分是否足够支付问题本身（按字符数保守估算token，回答结束后按实际token扣费）
+                    min_cost = credit_manager.calculate_discounted_cost(
+                        user_id, credit_manager.calculate_token_cost(len(prompt), 0)
+                    )
                     credit_info = credit_manager.get_user_credits(user_id)
-                    if credit_info['current_credits'] < credit_cost:
-                        error_msg = f"积分不足，需要{credit_cost}积分，当前余额{credit_info['current_credits']}积分"
+                    if credit_info['current_credits'] < min_cost:
+                        error_msg = f"积分不足，至少需要{min_cost}积分，当前余额{credit_info['current_credits']}积分"
                         yield f"data: {json.dumps({'error': error_msg, 'type': 'insufficient_credits'})}\n\n"
                         return
-                    
-                    # 扣除积分
-                    credit_manager.use_credits(user_id, credit_cost)
                 
                 # 获取用户选择的模型
                 selected_model = body.get("model", "qwen-plus")
                 if selected_model not in AVAILABLE_MODELS:
                     selected_model = "qwen-plus"
                 
-                # 直接调用千问API（所有可以对话的用户）
+                # 根据订阅等级添加额外信息
+                prefix, suffix = "", ""
+                if subscription == 'basic':
+                    suffix = "\n\n---\n💼 *基础版用户专享服务*"
+                elif subscription == 'pro':
+                    prefix = "🔥 **专业版深度分析**\n\n"
+                    suffix = "\n\n---\n📊 *专业版用户专享：优先响应、深度分析*"
+                elif subscription == 'custom':
+                    prefix = "💎 **自定义版专属服务**\n\n"
+                    suffix = "\n\n---\n🎯 *企业级专属服务*\n📞 专属客服: 18501935068"
+                
+                # 通过LLM流式调用千问API（所有可以对话的用户），逐个token转发给前端
+                from app.llm import track_usage
+                from app.llm_stream import SSESink, stream_to_sink
+                from app.rate_limiter import Priority, llm_priority
+                
+                sink = SSESink()
+                llm = get_chat_llm(selected_model)
+                # 记录本次对话的实际token用量（流式响应的usage帧），用于计费
+                with llm_priority(Priority.INTERACTIVE), track_usage() as usage:
+                    chat_task = asyncio.create_task(stream_to_sink(
+                        llm.ask([{"role": "user", "content": prompt}], stream=True, sink=sink),
+                        sink,
+                    ))
                 try:
-                    final_response = await call_qwen_api(prompt, selected_model)
-                    
-                    # 根据订阅等级添加额外信息
-                    if subscription == 'basic':
-                        final_response = final_response + "\n\n---\n💼 *基础版用户专享服务*"
-                    elif subscription == 'pro':
-                        final_response = "🔥 **专业版深度分析**\n\n" + final_response + "\n\n---\n📊 *专业版用户专享：优先响应、深度分析*"
-                    elif subscription == 'custom':
-                        final_response = "💎 **自定义版专属服务**\n\n" + final_response + "\n\n---\n🎯 *企业级专属服务*\n📞 专属客服: 18501935068"
+                    if prefix:
+                        yield f"data: {json.dumps({'content': prefix})}\n\n"
+                    async for event in sink.events():
+                        yield event
+                    await chat_task
+                    if suffix:
+                        yield f"data: {json.dumps({'content': suffix})}\n\n"
                 except Exception as api_error:
                     yield f"data: {json.dumps({'error': f'AI服务暂时不可用: {str(api_error)}'})}\n\n"
                     return
-                
-                # 模拟流式输出效果
-                words = final_response.split()
-                for i, word in enumerate(words):
-                    yield f"data: {json.dumps({'content': word + ' '})}\n\n"
-                    await asyncio.sleep(0.03)  # 模拟打字效果
+                finally:
+                    # 客户端断开时停止生成
+                    if not chat_task.done():
+                        chat_task.cancel()
                 
                 # 免费用户的试用结束提示
                 if subscription == 'free':
@@ -1146,15 +1155,21 @@ async def api_chat(request: Request):
                 # 付费用户的积分余额提示
                 elif subscription in ['basic', 'pro', 'custom']:
                     from credit_manager import credit_manager
+                    
+                    # 按实际token用量扣除积分
+                    credit_cost = credit_manager.use_token_credits(
+                        user_id, usage.prompt_tokens, usage.completion_tokens
+                    )
                     credit_info = credit_manager.get_user_credits(user_id)
                     
                     # 显示积分使用情况
                     credit_status = {
                         'credit_used': True,
                         'cost': credit_cost,
+                        'tokens': usage.total_tokens,
                         'remaining': credit_info['current_credits'],
                         'plan': subscription,
-                        'message': f"💰 本次对话消耗 {credit_cost} 积分，余额 {credit_info['current_credits']} 积分"
+                        'message': f"💰 本次对话消耗 {credit_cost} 积分（{usage.total_tokens} tokens），余额 {credit_info['current_credits']} 积分"
                     }
                     yield f"data: {json.dumps(credit_status)}\n\n"
                 
@@ -1172,6 +1187,93 @@ async def api_chat(request: Request):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/multi-agent-chat")
+async def api_multi_agent_chat(request: Request):
+    """多智能体协作对话：以SSE实时推送各智能体和协调者的输出（需要付费计划的智能体协作额度）"""
+    try:
+        body = await request.json()
+        prompt = body.get("prompt", "").strip()
+        
+        if not prompt:
+            raise HTTPException(status_code=400, detail="请输入有效的问题")
+        
+        if len(prompt) > 2000:
+            raise HTTPException(status_code=400, detail="问题长度不能超过2000字符")
+        
+        async def generate_events():
+            try:
+                session_id = request.cookies.get("session_id")
+                current_user = user_manager.get_user_by_session(session_id) if session_id else None
+                if not current_user:
+                    yield f"data: {json.dumps({'error': '请先注册登录以使用AI对话功能', 'type': 'auth_required'})}\n\n"
+                    return
+                
+                from credit_manager import credit_manager
+                user_id = current_user['id']
+                
+                # 按订阅计划限制可协作的智能体数量
+                agent_limit = credit_manager.get_agent_collaboration_limit(user_id)
+                if agent_limit <= 0:
+                    yield f"data: {json.dumps({'upgrade_required': True, 'message': '🚫 当前计划不支持多智能体协作，请升级付费版本', 'recommendations': ['升级基础版 $20/月', '升级专业版 $50/月', '联系客服了解自定义版']})}\n\n"
+                    yield f"data: [DONE]\n\n"
+                    return
+                
+                # 每日刷新积分，并检查积分是否足够支付问题本身（回答结束后按实际token扣费）
+                credit_manager.daily_refresh_credits(user_id)
+                min_cost = credit_manager.calculate_discounted_cost(
+                    user_id, credit_manager.calculate_token_cost(len(prompt), 0)
+                )
+                credit_info = credit_manager.get_user_credits(user_id)
+                if credit_info['current_credits'] < min_cost:
+                    error_msg = f"积分不足，至少需要{min_cost}积分，当前余额{credit_info['current_credits']}积分"
+                    yield f"data: {json.dumps({'error': error_msg, 'type': 'insufficient_credits'})}\n\n"
+                    return
+                
+                from autogen_system import autogen_system
+                from app.llm import track_usage
+                
+                selected_agents = body.get("agents") or ['analyst', 'creative', 'technical', 'product']
+                selected_agents = [name for name in selected_agents if name in autogen_system.agents and name != 'coordinator']
+                selected_agents = selected_agents[:agent_limit]
+                quorum = body.get("quorum")
+                if not isinstance(quorum, int) or quorum <= 0:
+                    quorum = None
+                
+                # 记录整个协作过程的实际token用量，用于计费
+                with track_usage() as usage:
+                    async for event in autogen_system.stream_multi_agents(
+                        prompt, selected_agents, quorum=quorum, session_id=user_id
+                    ):
+                        yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+                
+                credit_cost = credit_manager.use_token_credits(
+                    user_id, usage.prompt_tokens, usage.completion_tokens
+                )
+                credit_info = credit_manager.get_user_credits(user_id)
+                credit_status = {
+                    'credit_used': True,
+                    'cost': credit_cost,
+                    'tokens': usage.total_tokens,
+                    'remaining': credit_info['current_credits'],
+                    'message': f"💰 本次协作消耗 {credit_cost} 积分（{usage.total_tokens} tokens），余额 {credit_info['current_credits']} 积分"
+                }
+                yield f"data: {json.dumps(credit_status)}\n\n"
+                yield f"data: [DONE]\n\n"
+                
+            except Exception as e:
+                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+        
+        return StreamingResponse(
+            generate_events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "Connection": "keep-alive"}
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # 用户API路由
 @app.post("/api/register")
 async def api_register(request: Request):
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 from contextlib import asynccontextmanager
-from typing import List, Optional
+from contextvars import ContextVar
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field, model_validator
 
@@ -10,6 +11,43 @@ from app.sandbox.client import SANDBOX_CLIENT
 from app.schema import ROLE_TYPE, AgentState, Memory, Message
 
 
+# Agents whose cleanup is deferred to the enclosing shared_agent_resources()
+_deferred_cleanup: ContextVar[Optional[Dict[int, "BaseAgent"]]] = ContextVar(
+    "deferred_agent_cleanup", default=None
+)
+
+
+@asynccontextmanager
+async def shared_agent_resources():
+    """Keep agent tools, browsers, MCP sessions and the sandbox warm across runs.
+
+    Agents run inside this scope skip their per-run cleanup. Each of them is
+    cleaned up once, and the sandbox released, when the outermost scope exits.
+
+    Example:
+        >>> async with shared_agent_resources():
+        ...     for step in steps:
+        ...         await agent.run(step)
+    """
+    if _deferred_cleanup.get() is not None:
+        # Nested scope: the outer one owns cleanup
+        yield
+        return
+
+    agents: Dict[int, "BaseAgent"] = {}
+    token = _deferred_cleanup.set(agents)
+    try:
+        yield
+    finally:
+        _deferred_cleanup.reset(token)
+        for agent in agents.values():
+            try:
+                await agent.cleanup()
+            except Exception as e:
+                logger.error(f"Error cleaning up agent '{agent.name}': {e}")
+        await SANDBOX_CLIENT.cleanup()
+
+
 class BaseAgent(BaseModel, ABC):
     """Abstract base class for managing agent state and execution.
 
@@ -130,6 +168,10 @@ class BaseAgent(BaseModel, ABC):
 
         if request:
             self.update_memory("user", request)
+            # Keep the current task (e.g. a plan step with its context)
+            # through compaction; earlier tasks may be compacted
+            self.memory.clear_pins()
+            self.memory.pin(self.memory.messages[-1])
 
         results: List[str] = []
         async with self.state_context(AgentState.RUNNING):
@@ -150,9 +192,21 @@ class BaseAgent(BaseModel, ABC):
                 self.current_step = 0
                 self.state = AgentState.IDLE
                 results.append(f"Terminated: Reached max steps ({self.max_steps})")
-        await SANDBOX_CLIENT.cleanup()
+        if not self._defer_cleanup():
+            await SANDBOX_CLIENT.cleanup()
         return "\n".join(results) if results else "No steps executed"
 
+    async def cleanup(self) -> None:
+        """Release resources held by the agent (nothing by default)."""
+
+    def _defer_cleanup(self) -> bool:
+        """Hand cleanup to an enclosing shared_agent_resources() scope, if any."""
+        agents = _deferred_cleanup.get()
+        if agents is None:
+            return False
+        agents[id(self)] = self
+        return True
+
     @abstractmethod
     async def step(self) -> str:
         """Execute a single step in the agent's workflow.
@@ -168,22 +222,13 @@ class BaseAgent(BaseModel, ABC):
         logger.warning(f"Agent detected stuck state. Added prompt: {stuck_prompt}")
 
     def is_stuck(self) -> bool:
-        """Check if the agent is stuck in a loop by detecting duplicate content"""
-        if len(self.memory.messages) < 2:
-            return False
+        """Check if the agent is stuck in a loop by detecting duplicate responses.
 
-        last_message = self.memory.messages[-1]
-        if not last_message.content:
-            return False
-
-        # Count identical content occurrences
-        duplicate_count = sum(
-            1
-            for msg in reversed(self.memory.messages[:-1])
-            if msg.role == "assistant" and msg.content == last_message.content
-        )
-
-        return duplicate_count >= self.duplicate_threshold
+        Memory indexes every assistant response by a hash of its tool calls
+        (name and normalized arguments) or, without tool calls, its content,
+        so the check is O(1) and also catches the same tool call repeated.
+        """
+        return self.memory.last_response_repeats >= self.duplicate_threshold
 
     @property
     def messages(self) -> List[Message]:
@@ -194,3 +239,4 @@ class BaseAgent(BaseModel, ABC):
     def messages(self, value: List[Message]):
         """Set the list of messages in the agent's memory."""
         self.memory.messages = value
+        self.memory.reindex()
@@ -182,4 +182,5 @@ class MCPAgent(ToolCallAgent):
             return result
         finally:
             # Ensure cleanup happens even if there's an error
-            await self.cleanup()
+            if not self._defer_cleanup():
+                await self.cleanup()
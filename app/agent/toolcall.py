@@ -1,15 +1,18 @@
 import asyncio
 import json
-from typing import Any, List, Optional, Union
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-from pydantic import Field
+from pydantic import Field, PrivateAttr
 
 from app.agent.react import ReActAgent
 from app.exceptions import TokenLimitExceeded
 from app.logger import logger
+from app.metrics import metrics
 from app.prompt.toolcall import NEXT_STEP_PROMPT, SYSTEM_PROMPT
 from app.schema import TOOL_CHOICE_TYPE, AgentState, Message, ToolCall, ToolChoice
 from app.tool import CreateChatCompletion, Terminate, ToolCollection
+from app.tool.base import ToolConcurrency
 
 
 TOOL_CALL_REQUIRED = "Tool calls required but none provided"
@@ -36,11 +39,31 @@ class ToolCallAgent(ReActAgent):
     max_steps: int = 30
     max_observe: Optional[Union[int, bool]] = None
 
+    stream_tool_calls: bool = Field(
+        default=False,
+        description="Stream tool calls and start executing each one as soon as its arguments are complete",
+    )
+    max_parallel_tool_calls: int = Field(
+        default=4,
+        description="Maximum tool calls of one step running at the same time (1 runs them sequentially)",
+    )
+    _pending_tool_runs: Dict[str, asyncio.Task] = PrivateAttr(default_factory=dict)
+    # Ordering state for the tool runs started in the current step
+    _step_tool_runs: List[asyncio.Task] = PrivateAttr(default_factory=list)
+    _last_barrier_run: Optional[asyncio.Task] = PrivateAttr(default=None)
+    _last_sandbox_run: Optional[asyncio.Task] = PrivateAttr(default=None)
+    _tool_run_slots: Optional[asyncio.Semaphore] = PrivateAttr(default=None)
+    _tool_run_times: Dict[str, Tuple[float, float]] = PrivateAttr(default_factory=dict)
+    _tool_call_images: Dict[str, Optional[str]] = PrivateAttr(default_factory=dict)
+
     async def think(self) -> bool:
         """Process current state and decide next actions using tools"""
         if self.next_step_prompt:
             user_msg = Message.user_message(self.next_step_prompt)
-            self.messages += [user_msg]
+            self.memory.add_message(user_msg)
+
+        self._discard_pending_tool_runs()
+        stream = self.stream_tool_calls and self.tool_choices != ToolChoice.NONE
 
         try:
             # Get response with tool options
@@ -53,16 +76,23 @@ class ToolCallAgent(ReActAgent):
                 ),
                 tools=self.available_tools.to_params(),
                 tool_choice=self.tool_choices,
+                stream=stream,
+                on_tool_call=self._schedule_tool_call if stream else None,
             )
         except ValueError:
+            self._discard_pending_tool_runs()
             raise
         except Exception as e:
-            # Check if this is a RetryError containing TokenLimitExceeded
-            if hasattr(e, "__cause__") and isinstance(e.__cause__, TokenLimitExceeded):
-                token_limit_error = e.__cause__
-                logger.error(
-                    f"🚨 Token limit error (from RetryError): {token_limit_error}"
-                )
+            # Streamed tool calls of a failed response have no message to answer
+            self._discard_pending_tool_runs()
+            # TokenLimitExceeded is not retried, but may still arrive wrapped
+            token_limit_error = (
+                e
+                if isinstance(e, TokenLimitExceeded)
+                else getattr(e, "__cause__", None)
+            )
+            if isinstance(token_limit_error, TokenLimitExceeded):
+                logger.error(f"🚨 Token limit error: {token_limit_error}")
                 self.memory.add_message(
                     Message.assistant_message(
                         f"Maximum token limit reached, cannot continue execution: {str(token_limit_error)}"
@@ -137,15 +167,18 @@ class ToolCallAgent(ReActAgent):
             # Return last message content if no tool calls
             return self.messages[-1].content or "No content or commands to execute"
 
-        results = []
-        for command in self.tool_calls:
-            # Reset base64_image for each tool call
-            self._current_base64_image = None
-
-            result = await self.execute_tool(command)
+        # Start every call not already started while the response was
+        # streaming; independent calls run concurrently, the rest in order
+        runs = [
+            self._pending_tool_runs.pop(command.id, None)
+            or self._start_tool_run(command)
+            for command in self.tool_calls
+        ]
 
-            if self.max_observe:
-                result = result[: self.max_observe]
+        results = []
+        for command, run in zip(self.tool_calls, runs):
+            # Results are added in call order to keep the conversation valid
+            result, base64_image = await run
 
             logger.info(
                 f"🎯 Tool '{command.function.name}' completed its mission! Result: {result}"
@@ -156,13 +189,107 @@ class ToolCallAgent(ReActAgent):
                 content=result,
                 tool_call_id=command.id,
                 name=command.function.name,
-                base64_image=self._current_base64_image,
+                base64_image=base64_image,
             )
             self.memory.add_message(tool_msg)
             results.append(result)
 
+        self._record_parallel_savings()
+        self._discard_pending_tool_runs()
         return "\n\n".join(results)
 
+    async def _run_tool_call(self, command: ToolCall) -> Tuple[str, Optional[str]]:
+        """Execute a tool call and return its observation and captured image"""
+        start = time.monotonic()
+        result = await self.execute_tool(command)
+        self._tool_run_times[command.id] = (start, time.monotonic())
+
+        if self.max_observe:
+            result = result[: self.max_observe]
+
+        # Images are tracked per call since calls may run concurrently
+        return result, self._tool_call_images.pop(command.id, None)
+
+    def _tool_concurrency(self, command: ToolCall) -> ToolConcurrency:
+        """Concurrency class of a call; unknown tools and bad arguments run alone"""
+        if self.max_parallel_tool_calls <= 1:
+            return ToolConcurrency.SIDE_EFFECTING
+        tool = self.available_tools.get_tool(command.function.name)
+        if tool is None:
+            return ToolConcurrency.SIDE_EFFECTING
+        try:
+            args = json.loads(command.function.arguments or "{}")
+            return tool.concurrency_for(**args)
+        except (json.JSONDecodeError, TypeError):
+            return ToolConcurrency.SIDE_EFFECTING
+
+    def _start_tool_run(self, command: ToolCall) -> asyncio.Task:
+        """Start a tool call as a task, ordered after the earlier calls it conflicts with.
+
+        Read-only calls only wait for the last side-effecting call, sandbox
+        calls also wait for the previous sandbox call, and side-effecting
+        calls wait for every earlier call of the step.
+        """
+        concurrency = self._tool_concurrency(command)
+        if concurrency == ToolConcurrency.SIDE_EFFECTING:
+            wait_for = list(self._step_tool_runs)
+        else:
+            wait_for = [self._last_barrier_run]
+            if concurrency == ToolConcurrency.SANDBOX_EXCLUSIVE:
+                wait_for.append(self._last_sandbox_run)
+        wait_for = [task for task in wait_for if task is not None]
+
+        if self._tool_run_slots is None:
+            self._tool_run_slots = asyncio.Semaphore(
+                max(1, self.max_parallel_tool_calls)
+            )
+        slots = self._tool_run_slots
+
+        async def run_when_ready() -> Tuple[str, Optional[str]]:
+            if wait_for:
+                await asyncio.wait(wait_for)
+            async with slots:
+                return await self._run_tool_call(command)
+
+        task = asyncio.create_task(run_when_ready())
+        self._step_tool_runs.append(task)
+        if concurrency == ToolConcurrency.SIDE_EFFECTING:
+            self._last_barrier_run = task
+        elif concurrency == ToolConcurrency.SANDBOX_EXCLUSIVE:
+            self._last_sandbox_run = task
+        return task
+
+    def _schedule_tool_call(self, command: ToolCall) -> None:
+        """Start a streamed tool call while the rest of the response arrives"""
+        logger.info(f"⚡ Starting streamed tool call '{command.function.name}' early")
+        self._pending_tool_runs[command.id] = self._start_tool_run(command)
+
+    def _record_parallel_savings(self) -> None:
+        """Report how much wall-clock time concurrent tool calls saved this step"""
+        times = list(self._tool_run_times.values())
+        if len(times) < 2:
+            return
+        serial = sum(end - start for start, end in times)
+        wall = max(end for _, end in times) - min(start for start, _ in times)
+        metrics.observe("agent_tool_step_seconds", wall, agent=self.name)
+        metrics.observe(
+            "agent_tool_parallel_saved_seconds",
+            max(0.0, serial - wall),
+            agent=self.name,
+        )
+
+    def _discard_pending_tool_runs(self) -> None:
+        """Cancel streamed tool runs that no longer belong to a response (e.g. from a retried request)"""
+        for task in self._pending_tool_runs.values():
+            task.cancel()
+        self._pending_tool_runs.clear()
+        self._step_tool_runs.clear()
+        self._last_barrier_run = None
+        self._last_sandbox_run = None
+        self._tool_run_slots = None
+        self._tool_run_times.clear()
+        self._tool_call_images.clear()
+
     async def execute_tool(self, command: ToolCall) -> str:
         """Execute a single tool call with robust error handling"""
         if not command or not command.function or not command.function.name:
@@ -187,6 +314,7 @@ class ToolCallAgent(ReActAgent):
             if hasattr(result, "base64_image") and result.base64_image:
                 # Store the base64_image for later use in tool_message
                 self._current_base64_image = result.base64_image
+                self._tool_call_images[command.id] = result.base64_image
 
             # Format result for display (standard case)
             observation = (
@@ -247,4 +375,5 @@ class ToolCallAgent(ReActAgent):
         try:
             return await super().run(request)
         finally:
-            await self.cleanup()
+            if not self._defer_cleanup():
+                await self.cleanup()
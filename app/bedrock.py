@@ -1,3 +1,4 @@
+import asyncio
 import json
 import sys
 import time
@@ -34,6 +35,117 @@ class OpenAIResponse:
         return data
 
 
+# Maps Bedrock stop reasons to OpenAI finish reasons
+BEDROCK_FINISH_REASONS = {
+    "end_turn": "stop",
+    "stop_sequence": "stop",
+    "tool_use": "tool_calls",
+    "max_tokens": "length",
+}
+
+
+# Async iterator translating Bedrock stream events into OpenAI-style chunks
+class BedrockStream:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __aiter__(self):
+        return self._iterate()
+
+    @staticmethod
+    def _chunk(content=None, tool_calls=None, finish_reason=None, usage=None):
+        return OpenAIResponse(
+            {
+                "id": f"chatcmpl-{uuid.uuid4()}",
+                "created": int(time.time()),
+                "object": "chat.completion.chunk",
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {
+                            "role": "assistant",
+                            "content": content,
+                            "tool_calls": tool_calls,
+                        },
+                        "finish_reason": finish_reason,
+                    }
+                ],
+                "usage": usage,
+            }
+        )
+
+    async def _iterate(self):
+        global CURRENT_TOOLUSE_ID
+        if not self.stream:
+            return
+
+        events = iter(self.stream)
+        # Content block index -> OpenAI tool call index
+        tool_indexes = {}
+        finish_reason = "stop"
+        usage = None
+        while True:
+            # boto3 event streams block on read, keep them off the event loop
+            event = await asyncio.to_thread(next, events, None)
+            if event is None:
+                break
+
+            text = event.get("contentBlockDelta", {}).get("delta", {}).get("text")
+            if text:
+                yield self._chunk(content=text)
+
+            tool_start = (
+                event.get("contentBlockStart", {}).get("start", {}).get("toolUse")
+            )
+            if tool_start:
+                block_index = event["contentBlockStart"].get("contentBlockIndex", 0)
+                tool_indexes[block_index] = len(tool_indexes)
+                CURRENT_TOOLUSE_ID = tool_start["toolUseId"]
+                yield self._chunk(
+                    tool_calls=[
+                        {
+                            "index": tool_indexes[block_index],
+                            "id": tool_start["toolUseId"],
+                            "type": "function",
+                            "function": {"name": tool_start["name"], "arguments": ""},
+                        }
+                    ]
+                )
+
+            tool_delta = (
+                event.get("contentBlockDelta", {}).get("delta", {}).get("toolUse")
+            )
+            if tool_delta:
+                block_index = event["contentBlockDelta"].get("contentBlockIndex", 0)
+                yield self._chunk(
+                    tool_calls=[
+                        {
+                            "index": tool_indexes.get(block_index, 0),
+                            "id": None,
+                            "type": "function",
+                            "function": {
+                                "name": None,
+                                "arguments": tool_delta.get("input", ""),
+                            },
+                        }
+                    ]
+                )
+
+            stop_reason = event.get("messageStop", {}).get("stopReason")
+            if stop_reason:
+                finish_reason = BEDROCK_FINISH_REASONS.get(stop_reason, stop_reason)
+
+            metadata_usage = event.get("metadata", {}).get("usage")
+            if metadata_usage:
+                usage = {
+                    "completion_tokens": metadata_usage.get("outputTokens", 0),
+                    "prompt_tokens": metadata_usage.get("inputTokens", 0),
+                    "total_tokens": metadata_usage.get("totalTokens", 0),
+                }
+
+        yield self._chunk(finish_reason=finish_reason, usage=usage)
+
+
 # Main client class for interacting with Amazon Bedrock
 class BedrockClient:
     def __init__(self):
@@ -226,76 +338,21 @@ class ChatCompletions:
         tools: Optional[List[dict]] = None,
         tool_choice: Literal["none", "auto", "required"] = "auto",
         **kwargs,
-    ) -> OpenAIResponse:
+    ) -> "BedrockStream":
         # Streaming invocation of Bedrock model
         (
             system_prompt,
             bedrock_messages,
         ) = self._convert_openai_messages_to_bedrock_format(messages)
-        response = self.client.converse_stream(
+        response = await asyncio.to_thread(
+            self.client.converse_stream,
             modelId=model,
             system=system_prompt,
             messages=bedrock_messages,
             inferenceConfig={"temperature": temperature, "maxTokens": max_tokens},
             toolConfig={"tools": tools} if tools else None,
         )
-
-        # Initialize response structure
-        bedrock_response = {
-            "output": {"message": {"role": "", "content": []}},
-            "stopReason": "",
-            "usage": {},
-            "metrics": {},
-        }
-        bedrock_response_text = ""
-        bedrock_response_tool_input = ""
-
-        # Process streaming response
-        stream = response.get("stream")
-        if stream:
-            for event in stream:
-                if event.get("messageStart", {}).get("role"):
-                    bedrock_response["output"]["message"]["role"] = event[
-                        "messageStart"
-                    ]["role"]
-                if event.get("contentBlockDelta", {}).get("delta", {}).get("text"):
-                    bedrock_response_text += event["contentBlockDelta"]["delta"]["text"]
-                    print(
-                        event["contentBlockDelta"]["delta"]["text"], end="", flush=True
-                    )
-                if event.get("contentBlockStop", {}).get("contentBlockIndex") == 0:
-                    bedrock_response["output"]["message"]["content"].append(
-                        {"text": bedrock_response_text}
-                    )
-                if event.get("contentBlockStart", {}).get("start", {}).get("toolUse"):
-                    bedrock_tool_use = event["contentBlockStart"]["start"]["toolUse"]
-                    tool_use = {
-                        "toolUseId": bedrock_tool_use["toolUseId"],
-                        "name": bedrock_tool_use["name"],
-                    }
-                    bedrock_response["output"]["message"]["content"].append(
-                        {"toolUse": tool_use}
-                    )
-                    global CURRENT_TOOLUSE_ID
-                    CURRENT_TOOLUSE_ID = bedrock_tool_use["toolUseId"]
-                if event.get("contentBlockDelta", {}).get("delta", {}).get("toolUse"):
-                    bedrock_response_tool_input += event["contentBlockDelta"]["delta"][
-                        "toolUse"
-                    ]["input"]
-                    print(
-                        event["contentBlockDelta"]["delta"]["toolUse"]["input"],
-                        end="",
-                        flush=True,
-                    )
-                if event.get("contentBlockStop", {}).get("contentBlockIndex") == 1:
-                    bedrock_response["output"]["message"]["content"][1]["toolUse"][
-                        "input"
-                    ] = json.loads(bedrock_response_tool_input)
-        print()
-        openai_response = self._convert_bedrock_response_to_openai_format(
-            bedrock_response
-        )
-        return openai_response
+        return BedrockStream(response.get("stream"))
 
     def create(
         self,
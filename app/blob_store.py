@@ -0,0 +1,133 @@
+"""Content-addressed storage for large message payloads such as screenshots.
+
+Messages keep only the SHA-256 key of their base64 image; the data lives
+here. Recently used blobs stay in memory up to a byte budget, older ones are
+spilled to a temporary directory and read back on demand. The directory has
+its own budget: past it the least recently used blobs are deleted, and
+reading one back raises KeyError, as does a spill file that has gone
+missing or cannot be read. Identical screenshots are stored once.
+"""
+
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from app.logger import logger
+from app.metrics import metrics
+
+
+class BlobStore:
+    """In-memory LRU of string blobs that spills to a bounded disk LRU"""
+
+    def __init__(
+        self,
+        max_memory_mb: float = 64,
+        directory: Optional[Path] = None,
+        max_disk_mb: float = 512,
+    ):
+        self.max_memory = int(max_memory_mb * 1024 * 1024)
+        self.max_disk = int(max_disk_mb * 1024 * 1024)
+        self._directory = Path(directory) if directory else None
+        self._tempdir: Optional[tempfile.TemporaryDirectory] = None
+        self._lock = threading.Lock()
+        # key -> blob, least recently used first
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._memory_size = 0
+        # key -> size of spilled blobs, least recently used first
+        self._on_disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_size = 0
+
+    @staticmethod
+    def key_for(data: str) -> str:
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    @property
+    def directory(self) -> Path:
+        if self._directory is None:
+            # Removed automatically when the process exits
+            self._tempdir = tempfile.TemporaryDirectory(prefix="jelilian-blobs-")
+            self._directory = Path(self._tempdir.name)
+        return self._directory
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def put(self, data: str) -> str:
+        """Store a blob and return its key"""
+        key = self.key_for(data)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+            elif key not in self._on_disk:
+                self._remember(key, data)
+        return key
+
+    def get(self, key: str) -> str:
+        """Return the blob for a key, raising KeyError if it was never stored,
+        has been evicted from disk or its spill file can't be read"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+            if key not in self._on_disk:
+                raise KeyError(key)
+            try:
+                data = self._path(key).read_text(encoding="utf-8")
+            except OSError as e:
+                # Deleted by a temp cleaner, disk error...: the blob is lost
+                logger.warning(f"Failed to read blob {key[:12]} from disk: {e}")
+                self._disk_size -= self._on_disk.pop(key)
+                raise KeyError(key) from e
+            self._on_disk.move_to_end(key)
+            metrics.incr("blob_store_disk_reads_total")
+            self._remember(key, data)
+            return data
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._memory or key in self._on_disk
+
+    def _remember(self, key: str, data: str) -> None:
+        """Keep a blob in memory, spilling the least recently used ones (lock held)"""
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.max_memory and len(self._memory) > 1:
+            old_key, old_data = self._memory.popitem(last=False)
+            self._memory_size -= len(old_data)
+            if old_key in self._on_disk:
+                continue
+            try:
+                path = self._path(old_key)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(old_data, encoding="utf-8")
+                self._on_disk[old_key] = len(old_data)
+                self._disk_size += len(old_data)
+                metrics.incr("blob_store_spills_total")
+            except OSError as e:
+                # Keep it in memory rather than lose it
+                logger.warning(f"Failed to spill blob {old_key[:12]} to disk: {e}")
+                self._memory[old_key] = old_data
+                self._memory.move_to_end(old_key, last=False)
+                self._memory_size += len(old_data)
+                break
+        self._evict_from_disk()
+        metrics.set_gauge("blob_store_memory_bytes", self._memory_size)
+
+    def _evict_from_disk(self) -> None:
+        """Delete the least recently used spilled blobs past the disk budget (lock held)"""
+        while self._disk_size > self.max_disk and len(self._on_disk) > 1:
+            key, size = self._on_disk.popitem(last=False)
+            self._disk_size -= size
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+            metrics.incr("blob_store_evictions_total")
+        metrics.set_gauge("blob_store_disk_bytes", self._disk_size)
+
+
+# Shared store for message images
+image_store = BlobStore()
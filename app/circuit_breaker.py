@@ -0,0 +1,344 @@
+"""Circuit breaking and retry budgeting for LLM endpoints.
+
+Every endpoint gets a ``CircuitBreaker`` (closed -> open -> half-open) that
+trips after consecutive upstream failures, so callers fail fast instead of
+sleeping through minutes of retries during an outage. Retries are further
+capped by a process-wide ``RetryBudget`` so that a failing upstream never
+sees more than a fixed fraction of extra load.
+"""
+
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from enum import Enum
+from typing import Dict, Optional
+
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    AuthenticationError,
+    BadRequestError,
+    NotFoundError,
+    PermissionDeniedError,
+    RateLimitError,
+    UnprocessableEntityError,
+)
+from tenacity import retry, stop_after_attempt, wait_random_exponential
+from tenacity.retry import retry_base
+from tenacity.wait import wait_base
+
+from app.config import ResilienceSettings, config
+from app.exceptions import (
+    CircuitOpenError,
+    LLMCacheMiss,
+    StreamInterrupted,
+    TokenLimitExceeded,
+)
+from app.logger import logger
+from app.metrics import metrics
+
+
+class CircuitState(str, Enum):
+    """Circuit breaker states"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+# Numeric encoding used for the circuit state gauge
+CIRCUIT_STATE_VALUES = {
+    CircuitState.CLOSED: 0,
+    CircuitState.HALF_OPEN: 1,
+    CircuitState.OPEN: 2,
+}
+
+# Client errors that will fail the same way on every attempt
+NON_RETRYABLE_ERRORS = (
+    TokenLimitExceeded,
+    CircuitOpenError,
+    LLMCacheMiss,
+    StreamInterrupted,
+    AuthenticationError,
+    PermissionDeniedError,
+    BadRequestError,
+    NotFoundError,
+    UnprocessableEntityError,
+)
+
+
+def get_retry_after(error: BaseException) -> Optional[float]:
+    """Extract the server-requested delay (seconds) from an API error, if any"""
+    if isinstance(error, CircuitOpenError):
+        return error.retry_after
+
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """Whether an error indicates an unhealthy endpoint (counts towards tripping)"""
+    if isinstance(error, (APIConnectionError, RateLimitError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code >= 500
+    return False
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether retrying the same request could succeed.
+
+    Cancellation and other BaseExceptions are never retried: a cancelled call
+    (timeout, lost race, client disconnect) must stop, not start over.
+    """
+    return isinstance(error, Exception) and not isinstance(error, NON_RETRYABLE_ERRORS)
+
+
+class CircuitBreaker:
+    """Per-endpoint circuit breaker.
+
+    CLOSED: calls pass through; consecutive failures are counted.
+    OPEN: calls are rejected with CircuitOpenError until the recovery timeout
+        (or a longer server-provided Retry-After) has elapsed.
+    HALF_OPEN: a limited number of trial calls are let through; a success
+        closes the circuit, a failure opens it again.
+    """
+
+    _breakers: Dict[str, "CircuitBreaker"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, endpoint: str, settings: Optional[ResilienceSettings] = None):
+        settings = settings or config.resilience or ResilienceSettings()
+        self.endpoint = endpoint
+        self.failure_threshold = settings.failure_threshold
+        self.recovery_timeout = settings.recovery_timeout
+        self.half_open_max_calls = settings.half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_until = 0.0
+        self._half_open_calls = 0
+        self._publish()
+
+    @classmethod
+    def for_endpoint(
+        cls, endpoint: str, settings: Optional[ResilienceSettings] = None
+    ) -> "CircuitBreaker":
+        """Get the shared breaker for an endpoint, creating it on first use"""
+        with cls._registry_lock:
+            if endpoint not in cls._breakers:
+                cls._breakers[endpoint] = cls(endpoint, settings)
+            return cls._breakers[endpoint]
+
+    @classmethod
+    def snapshot_all(cls) -> Dict[str, dict]:
+        """State of every known breaker, keyed by endpoint"""
+        with cls._registry_lock:
+            return {name: breaker.snapshot() for name, breaker in cls._breakers.items()}
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def before_call(self) -> None:
+        """Admit a call or raise CircuitOpenError"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CircuitState.OPEN:
+                self._reject(self._opened_until - time.monotonic())
+            if self._state == CircuitState.HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    self._reject(self.recovery_timeout)
+                self._half_open_calls += 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != CircuitState.CLOSED:
+                logger.info(f"Circuit breaker for {self.endpoint} closed")
+            self._state = CircuitState.CLOSED
+            self._failures = 0
+            self._half_open_calls = 0
+            self._publish()
+
+    def release(self) -> None:
+        """End an admitted call without an outcome (e.g. it was cancelled).
+
+        Gives a half-open trial slot back so the next call can probe the
+        endpoint instead of being rejected until the circuit reopens.
+        """
+        with self._lock:
+            if self._state == CircuitState.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record_failure(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            self._failures += 1
+            if (
+                self._state == CircuitState.HALF_OPEN
+                or self._failures >= self.failure_threshold
+            ):
+                self._open(max(self.recovery_timeout, retry_after or 0.0))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._maybe_half_open()
+            return {
+                "state": self._state.value,
+                "consecutive_failures": self._failures,
+                "retry_after": max(0.0, self._opened_until - time.monotonic())
+                if self._state == CircuitState.OPEN
+                else 0.0,
+            }
+
+    def _open(self, duration: float) -> None:
+        if self._state != CircuitState.OPEN:
+            logger.warning(
+                f"Circuit breaker for {self.endpoint} opened for {duration:.1f}s "
+                f"after {self._failures} consecutive failures"
+            )
+            metrics.incr("llm_circuit_opened_total", endpoint=self.endpoint)
+        self._state = CircuitState.OPEN
+        self._opened_until = time.monotonic() + duration
+        self._half_open_calls = 0
+        self._publish()
+
+    def _maybe_half_open(self) -> None:
+        if self._state == CircuitState.OPEN and time.monotonic() >= self._opened_until:
+            self._state = CircuitState.HALF_OPEN
+            self._half_open_calls = 0
+            self._publish()
+
+    def _reject(self, retry_after: float) -> None:
+        metrics.incr("llm_circuit_rejections_total", endpoint=self.endpoint)
+        raise CircuitOpenError(self.endpoint, max(0.0, retry_after))
+
+    def _publish(self) -> None:
+        metrics.set_gauge(
+            "llm_circuit_state",
+            CIRCUIT_STATE_VALUES[self._state],
+            endpoint=self.endpoint,
+        )
+
+
+class RetryBudget:
+    """Process-wide token bucket limiting retries to a fraction of requests.
+
+    Each request deposits ``ratio`` tokens and each retry withdraws one, so
+    during an outage retries add at most ``ratio`` extra load. A small
+    per-second allowance keeps retries possible when traffic is low.
+    """
+
+    def __init__(self, ratio: float, min_per_second: float, max_balance: float = 100):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_balance = max_balance
+        self._balance = max_balance * ratio
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record_request(self) -> None:
+        with self._lock:
+            self._balance = min(self.max_balance, self._balance + self.ratio)
+
+    def try_acquire(self) -> bool:
+        """Withdraw one retry from the budget; False if it is exhausted"""
+        with self._lock:
+            now = time.monotonic()
+            self._balance = min(
+                self.max_balance,
+                self._balance + (now - self._last_refill) * self.min_per_second,
+            )
+            self._last_refill = now
+            metrics.set_gauge("llm_retry_budget_balance", self._balance)
+            if self._balance < 1:
+                metrics.incr("llm_retry_budget_exhausted_total")
+                return False
+            self._balance -= 1
+            return True
+
+
+class retry_if_budget_allows(retry_base):
+    """Retry retryable errors while the shared retry budget has room"""
+
+    def __init__(self, max_attempts: int, max_retry_after: float):
+        self.max_attempts = max_attempts
+        self.max_retry_after = max_retry_after
+
+    def __call__(self, retry_state) -> bool:
+        if not retry_state.outcome.failed:
+            return False
+        error = retry_state.outcome.exception()
+        if not is_retryable(error):
+            return False
+        if retry_state.attempt_number >= self.max_attempts:
+            # The stop condition ends the loop, don't spend budget on it
+            return True
+
+        retry_after = get_retry_after(error)
+        if retry_after is not None and retry_after > self.max_retry_after:
+            logger.warning(
+                f"Not retrying: server asked to wait {retry_after:.0f}s "
+                f"(max {self.max_retry_after:.0f}s)"
+            )
+            return False
+        if not retry_budget.try_acquire():
+            logger.warning("Not retrying: LLM retry budget exhausted")
+            return False
+
+        metrics.incr("llm_retries_total", error=type(error).__name__)
+        return True
+
+
+class wait_retry_after(wait_base):
+    """Wait as long as the server's Retry-After asks, else use a fallback"""
+
+    def __init__(self, fallback: wait_base):
+        self.fallback = fallback
+
+    def __call__(self, retry_state) -> float:
+        error = retry_state.outcome.exception() if retry_state.outcome else None
+        retry_after = get_retry_after(error) if error else None
+        if retry_after is not None:
+            return retry_after
+        return self.fallback(retry_state)
+
+
+def llm_retry(settings: Optional[ResilienceSettings] = None):
+    """Tenacity retry decorator for LLM calls, driven by the resilience settings"""
+    settings = settings or config.resilience or ResilienceSettings()
+    return retry(
+        retry=retry_if_budget_allows(settings.max_attempts, settings.max_retry_after),
+        wait=wait_retry_after(wait_random_exponential(min=1, max=settings.max_wait)),
+        stop=stop_after_attempt(settings.max_attempts),
+    )
+
+
+_resilience = config.resilience or ResilienceSettings()
+retry_budget = RetryBudget(
+    ratio=_resilience.retry_budget_ratio,
+    min_per_second=_resilience.retry_budget_min_per_second,
+)
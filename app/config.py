@@ -16,6 +16,23 @@ PROJECT_ROOT = get_project_root()
 WORKSPACE_ROOT = PROJECT_ROOT / "workspace"
 
 
+class LLMEndpointSettings(BaseModel):
+    """An additional endpoint serving the same logical model"""
+
+    name: Optional[str] = Field(None, description="Endpoint name used in metrics")
+    model: Optional[str] = Field(
+        None, description="Model name at this endpoint (defaults to the parent model)"
+    )
+    base_url: str = Field(..., description="API base URL")
+    api_key: str = Field(..., description="API key")
+    api_type: Optional[str] = Field(
+        None, description="Azure, Openai, or Ollama (defaults to the parent api_type)"
+    )
+    api_version: Optional[str] = Field(
+        None, description="Azure Openai version if AzureOpenai"
+    )
+
+
 class LLMSettings(BaseModel):
     model: str = Field(..., description="Model name")
     base_url: str = Field(..., description="API base URL")
@@ -28,6 +45,63 @@ class LLMSettings(BaseModel):
     temperature: float = Field(1.0, description="Sampling temperature")
     api_type: str = Field(..., description="Azure, Openai, or Ollama")
     api_version: str = Field(..., description="Azure Openai version if AzureOpenai")
+    endpoints: List[LLMEndpointSettings] = Field(
+        default_factory=list,
+        description="Equivalent endpoints to route between in addition to base_url",
+    )
+    hedge_after: Optional[float] = Field(
+        None,
+        description="Seconds before a slow request is hedged on the next endpoint (None disables hedging)",
+    )
+    max_concurrency: Optional[int] = Field(
+        None, description="Maximum concurrent requests (None for unlimited)"
+    )
+    requests_per_minute: Optional[int] = Field(
+        None, description="Requests-per-minute budget (None for unlimited)"
+    )
+    tokens_per_minute: Optional[int] = Field(
+        None, description="Estimated tokens-per-minute budget (None for unlimited)"
+    )
+    coalesce_requests: bool = Field(
+        False,
+        description="Share identical in-flight requests sent with temperature 0",
+    )
+    stream_usage: bool = Field(
+        True,
+        description="Request exact token usage in streamed responses (stream_options.include_usage)",
+    )
+    max_request_images: Optional[int] = Field(
+        5,
+        description="Attach only the images of this many most recent messages (None for all)",
+    )
+
+
+class ResilienceSettings(BaseModel):
+    """Circuit breaker and retry policy for LLM calls"""
+
+    failure_threshold: int = Field(
+        5, description="Consecutive endpoint failures before the circuit opens"
+    )
+    recovery_timeout: float = Field(
+        30.0, description="Seconds an open circuit waits before allowing a trial call"
+    )
+    half_open_max_calls: int = Field(
+        1, description="Concurrent trial calls allowed while the circuit is half-open"
+    )
+    max_attempts: int = Field(6, description="Maximum attempts per LLM call")
+    max_wait: float = Field(
+        60.0, description="Upper bound for exponential backoff between attempts"
+    )
+    max_retry_after: float = Field(
+        120.0,
+        description="Give up instead of retrying when Retry-After asks for longer than this",
+    )
+    retry_budget_ratio: float = Field(
+        0.2, description="Retries allowed per request made, shared across the process"
+    )
+    retry_budget_min_per_second: float = Field(
+        1.0, description="Retries always allowed per second regardless of traffic"
+    )
 
 
 class ProxySettings(BaseModel):
@@ -58,6 +132,71 @@ class SearchSettings(BaseModel):
         default="us",
         description="Country code for search results (e.g., us, cn, uk)",
     )
+    strategy: str = Field(
+        default="sequential",
+        description="'sequential' tries engines one after another, 'hedged' races them",
+    )
+    hedge_delay: float = Field(
+        default=1.0,
+        description="Seconds before the next engine joins a hedged search (0 starts all at once)",
+    )
+    merge_results: bool = Field(
+        default=False,
+        description="Merge hedged results from several engines, deduplicated by URL",
+    )
+    merge_window: float = Field(
+        default=1.0,
+        description="Seconds to wait for other running engines after the first result when merging",
+    )
+    adaptive_order: bool = Field(
+        default=True,
+        description="Reorder engines by observed latency and failure rate",
+    )
+    cache_ttl: float = Field(
+        default=300,
+        description="Seconds a search response is reused for the same query (0 disables the cache)",
+    )
+    cache_stale_ttl: float = Field(
+        default=3600,
+        description="Seconds past the TTL a response is still served while it is refreshed",
+    )
+    cache_max_entries: int = Field(
+        default=512, description="Search responses kept in memory"
+    )
+    cache_path: Optional[str] = Field(
+        default=None,
+        description="SQLite file for a persistent cache tier (relative to the project root)",
+    )
+    cache_max_disk_entries: int = Field(
+        default=10000, description="Search responses kept in the SQLite tier"
+    )
+
+
+class FetchSettings(BaseModel):
+    """Shared HTTP client used to fetch web pages"""
+
+    max_connections: int = Field(100, description="Open connections across all hosts")
+    max_connections_per_host: int = Field(
+        6, description="Concurrent requests to a single host"
+    )
+    http2: bool = Field(True, description="Use HTTP/2 when the h2 package is installed")
+    timeout: float = Field(10.0, description="Default request timeout in seconds")
+    max_bytes: int = Field(
+        2 * 1024 * 1024,
+        description="Stop reading a response body after this many bytes",
+    )
+    user_agent: str = Field(
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+        description="User-Agent header sent with every request",
+    )
+    extractor: str = Field(
+        "auto",
+        description="HTML to text extractor: auto, selectolax, lxml, html.parser or bs4",
+    )
+    extract_processes: int = Field(
+        0,
+        description="Worker processes for extracting large pages (0 uses a thread)",
+    )
 
 
 class RunflowSettings(BaseModel):
@@ -171,6 +310,36 @@ class MCPSettings(BaseModel):
             raise ValueError(f"Failed to load MCP server config: {e}")
 
 
+class LLMCacheSettings(BaseModel):
+    """Record/replay cache for LLM responses"""
+
+    mode: str = Field(
+        "off", description="off, record (read-through and store) or replay (cache only)"
+    )
+    directory: Optional[str] = Field(
+        None, description="Cache directory (defaults to cache/llm in the project root)"
+    )
+    max_size_mb: float = Field(
+        512, description="Disk budget; least recently used responses are evicted"
+    )
+
+
+class PageCacheSettings(BaseModel):
+    """Disk cache of fetched pages shared by WebSearch and Crawl4aiTool"""
+
+    enabled: bool = Field(True, description="Reuse pages the web tools fetched before")
+    directory: Optional[str] = Field(
+        None,
+        description="Cache directory (defaults to cache/pages in the project root)",
+    )
+    ttl: float = Field(
+        3600, description="Seconds a page is used without checking the site again"
+    )
+    max_size_mb: float = Field(
+        256, description="Disk budget; least recently used pages are evicted"
+    )
+
+
 class AppConfig(BaseModel):
     llm: Dict[str, LLMSettings]
     sandbox: Optional[SandboxSettings] = Field(
@@ -189,6 +358,18 @@ class AppConfig(BaseModel):
     daytona_config: Optional[DaytonaSettings] = Field(
         None, description="Daytona configuration"
     )
+    resilience_config: Optional[ResilienceSettings] = Field(
+        None, description="LLM circuit breaker and retry configuration"
+    )
+    llm_cache_config: Optional[LLMCacheSettings] = Field(
+        None, description="LLM record/replay cache configuration"
+    )
+    fetch_config: Optional[FetchSettings] = Field(
+        None, description="Web page fetching configuration"
+    )
+    page_cache_config: Optional[PageCacheSettings] = Field(
+        None, description="Fetched page cache configuration"
+    )
 
     class Config:
         arbitrary_types_allowed = True
@@ -246,6 +427,14 @@ class Config:
             "temperature": base_llm.get("temperature", 1.0),
             "api_type": base_llm.get("api_type", ""),
             "api_version": base_llm.get("api_version", ""),
+            "endpoints": base_llm.get("endpoints", []),
+            "hedge_after": base_llm.get("hedge_after"),
+            "max_concurrency": base_llm.get("max_concurrency"),
+            "requests_per_minute": base_llm.get("requests_per_minute"),
+            "tokens_per_minute": base_llm.get("tokens_per_minute"),
+            "coalesce_requests": base_llm.get("coalesce_requests", False),
+            "stream_usage": base_llm.get("stream_usage", True),
+            "max_request_images": base_llm.get("max_request_images", 5),
         }
 
         # handle browser config.
@@ -310,11 +499,37 @@ class Config:
             run_flow_settings = RunflowSettings(**run_flow_config)
         else:
             run_flow_settings = RunflowSettings()
+
+        resilience_config = raw_config.get("resilience")
+        if resilience_config:
+            resilience_settings = ResilienceSettings(**resilience_config)
+        else:
+            resilience_settings = ResilienceSettings()
+
+        llm_cache_config = raw_config.get("llm_cache")
+        if llm_cache_config:
+            llm_cache_settings = LLMCacheSettings(**llm_cache_config)
+        else:
+            llm_cache_settings = LLMCacheSettings()
+
+        fetch_config = raw_config.get("fetch")
+        if fetch_config:
+            fetch_settings = FetchSettings(**fetch_config)
+        else:
+            fetch_settings = FetchSettings()
+
+        page_cache_config = raw_config.get("page_cache")
+        if page_cache_config:
+            page_cache_settings = PageCacheSettings(**page_cache_config)
+        else:
+            page_cache_settings = PageCacheSettings()
+
         config_dict = {
             "llm": {
                 "default": default_settings,
                 **{
-                    name: {**default_settings, **override_config}
+                    # Endpoints belong to a logical model, so they are not inherited
+                    name: {**default_settings, "endpoints": [], **override_config}
                     for name, override_config in llm_overrides.items()
                 },
             },
@@ -324,6 +539,10 @@ class Config:
             "mcp_config": mcp_settings,
             "run_flow_config": run_flow_settings,
             "daytona_config": daytona_settings,
+            "resilience_config": resilience_settings,
+            "llm_cache_config": llm_cache_settings,
+            "fetch_config": fetch_settings,
+            "page_cache_config": page_cache_settings,
         }
 
         self._config = AppConfig(**config_dict)
@@ -358,6 +577,26 @@ class Config:
         """Get the Run Flow configuration"""
         return self._config.run_flow_config
 
+    @property
+    def resilience(self) -> ResilienceSettings:
+        """Get the LLM circuit breaker and retry configuration"""
+        return self._config.resilience_config
+
+    @property
+    def llm_cache(self) -> LLMCacheSettings:
+        """Get the LLM record/replay cache configuration"""
+        return self._config.llm_cache_config
+
+    @property
+    def fetch(self) -> FetchSettings:
+        """Get the web page fetching configuration"""
+        return self._config.fetch_config
+
+    @property
+    def page_cache(self) -> PageCacheSettings:
+        """Get the fetched page cache configuration"""
+        return self._config.page_cache_config
+
     @property
     def workspace_root(self) -> Path:
         """Get the workspace root directory"""
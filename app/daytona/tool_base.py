@@ -7,7 +7,7 @@ from pydantic import Field
 
 from app.config import config
 from app.daytona.sandbox import create_sandbox, start_supervisord_session
-from app.tool.base import BaseTool
+from app.tool.base import BaseTool, ToolConcurrency
 from app.utils.files_utils import clean_path
 from app.utils.logger import logger
 
@@ -67,6 +67,7 @@ class SandboxToolsBase(BaseTool):
     _sandbox_id: Optional[str] = None
     _sandbox_pass: Optional[str] = None
     workspace_path: str = Field(default="/workspace", exclude=True)
+    concurrency: ToolConcurrency = ToolConcurrency.SANDBOX_EXCLUSIVE
     _sessions: dict[str, str] = {}
 
     class Config:
@@ -11,3 +11,41 @@ class JelilianAIProError(Exception):
 
 class TokenLimitExceeded(JelilianAIProError):
     """Exception raised when the token limit is exceeded"""
+
+
+class CircuitOpenError(JelilianAIProError):
+    """Exception raised when a call is rejected by an open circuit breaker"""
+
+    def __init__(self, endpoint: str, retry_after: float = 0.0):
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+        super().__init__(
+            f"Circuit breaker for {endpoint} is open, retry after {retry_after:.1f}s"
+        )
+
+
+class LLMCacheMiss(JelilianAIProError):
+    """Exception raised in replay-only mode when a request was never recorded"""
+
+    def __init__(self, key: str):
+        self.key = key
+        super().__init__(f"No recorded LLM response for request {key}")
+
+
+class StreamInterrupted(JelilianAIProError):
+    """Exception raised when a streamed LLM response fails after part of it was
+    delivered to callbacks; retrying would deliver (or execute) it twice"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+        super().__init__(f"LLM stream interrupted after partial output: {error}")
+
+
+class SharedStreamCancelled(JelilianAIProError):
+    """Exception raised to consumers of a coalesced stream when the call reading
+    it from the API was cancelled mid-read"""
+
+    def __init__(self):
+        super().__init__(
+            "Shared LLM stream ended early: the request reading it was cancelled"
+        )
@@ -0,0 +1,238 @@
+import asyncio
+import re
+import time
+from enum import Enum
+from typing import Any, Callable, List, Optional
+
+from pydantic import BaseModel, Field
+
+from app.agent.base import BaseAgent, shared_agent_resources
+from app.flow.base import BaseFlow
+from app.llm import LLM, TokenUsage, track_usage
+from app.logger import logger
+from app.metrics import metrics
+from app.schema import Message
+
+
+class JudgeMode(str, Enum):
+    """How the ensemble turns several results into one"""
+
+    PICK = "pick"  # The judge chooses the best result
+    MERGE = "merge"  # The judge combines the results into one answer
+
+
+class EnsembleCandidate(BaseModel):
+    """One agent's attempt at the ensemble task"""
+
+    agent: str
+    status: str = "pending"  # ok, rejected, error, timeout, cancelled
+    result: Optional[str] = None
+    seconds: Optional[float] = None
+    usage: TokenUsage = Field(default_factory=TokenUsage)
+
+
+class EnsembleReport(BaseModel):
+    """Cost and latency accounting for one ensemble run"""
+
+    candidates: List[EnsembleCandidate] = Field(default_factory=list)
+    selected: Optional[str] = Field(None, description="Agent whose result was used")
+    decided_by: str = Field(
+        "", description="validator, judge, only_result or no_result"
+    )
+    seconds: float = 0.0
+    judge_usage: TokenUsage = Field(default_factory=TokenUsage)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.judge_usage.total_tokens + sum(
+            c.usage.total_tokens for c in self.candidates
+        )
+
+    @property
+    def extra_tokens(self) -> int:
+        """Tokens spent beyond the selected candidate: the price of the ensemble"""
+        selected = next((c for c in self.candidates if c.agent == self.selected), None)
+        return self.total_tokens - (selected.usage.total_tokens if selected else 0)
+
+
+class EnsembleFlow(BaseFlow):
+    """A flow that runs the same task on several agents in parallel.
+
+    Every agent (e.g. the same agent backed by different models) gets the
+    same input. With a validator, the first result that passes it wins and
+    the other agents are cancelled, which cuts tail latency on flaky tasks.
+    Otherwise the judge LLM picks the best result or merges them.
+    """
+
+    llm: LLM = Field(default_factory=lambda: LLM())
+    judge_mode: JudgeMode = JudgeMode.PICK
+    validator: Optional[Callable[[str], Any]] = Field(
+        None, description="Returns True (or awaits to True) for an acceptable result"
+    )
+    agent_timeout: Optional[float] = Field(
+        None, description="Seconds before a slow agent is given up on"
+    )
+    last_report: Optional[EnsembleReport] = None
+
+    async def execute(self, input_text: str) -> str:
+        """Run all agents on the input and return the selected or merged result."""
+        report = EnsembleReport()
+        self.last_report = report
+        started = time.monotonic()
+        try:
+            async with shared_agent_resources():
+                result = await self._run_ensemble(input_text, report)
+        except Exception as e:
+            logger.error(f"Error in EnsembleFlow: {str(e)}")
+            result = f"Execution failed: {str(e)}"
+        finally:
+            report.seconds = time.monotonic() - started
+            self._record_metrics(report)
+        return result
+
+    async def _run_ensemble(self, input_text: str, report: EnsembleReport) -> str:
+        candidates = {key: EnsembleCandidate(agent=key) for key in self.agents}
+        report.candidates = list(candidates.values())
+        tasks = {
+            asyncio.create_task(
+                self._run_candidate(self.agents[key], input_text, candidate)
+            ): key
+            for key, candidate in candidates.items()
+        }
+
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                candidate = await next_done
+                if candidate.status == "ok" and self.validator is not None:
+                    if await self._validate(candidate.result):
+                        report.selected = candidate.agent
+                        report.decided_by = "validator"
+                        return candidate.result
+                    candidate.status = "rejected"
+        finally:
+            for task, key in tasks.items():
+                if not task.done():
+                    task.cancel()
+                    candidates[key].status = "cancelled"
+
+        # Results the validator rejected are never shown to the judge
+        finished = [c for c in report.candidates if c.status == "ok"]
+        if not finished:
+            report.decided_by = "no_result"
+            errors = "; ".join(
+                f"{c.agent}: {c.result if c.status == 'error' else c.status}"
+                for c in report.candidates
+            )
+            return f"Execution failed: no agent produced a result ({errors})"
+        if len(finished) == 1:
+            report.selected = finished[0].agent
+            report.decided_by = "only_result"
+            return finished[0].result
+
+        report.decided_by = "judge"
+        with track_usage() as judge_usage:
+            result = await self._judge(input_text, finished, report)
+        report.judge_usage = judge_usage
+        return result
+
+    async def _run_candidate(
+        self, agent: BaseAgent, input_text: str, candidate: EnsembleCandidate
+    ) -> EnsembleCandidate:
+        """Run one agent, recording its result, status, latency and token usage."""
+        started = time.monotonic()
+        with track_usage() as usage:
+            candidate.usage = usage
+            try:
+                candidate.result = await asyncio.wait_for(
+                    agent.run(input_text), self.agent_timeout
+                )
+                candidate.status = "ok"
+            except asyncio.TimeoutError:
+                candidate.status = "timeout"
+            except asyncio.CancelledError:
+                candidate.status = "cancelled"
+                raise
+            except Exception as e:
+                logger.warning(f"Ensemble agent {candidate.agent} failed: {e}")
+                candidate.status = "error"
+                candidate.result = str(e)
+            finally:
+                candidate.seconds = time.monotonic() - started
+                if candidate.status != "ok":
+                    # Interrupted mid-act: leave the agent with a valid conversation
+                    agent.memory.drop_incomplete_turn()
+        return candidate
+
+    async def _validate(self, result: str) -> bool:
+        try:
+            verdict = self.validator(result)
+            if asyncio.iscoroutine(verdict):
+                verdict = await verdict
+            return bool(verdict)
+        except Exception as e:
+            logger.warning(f"Ensemble validator failed: {e}")
+            return False
+
+    async def _judge(
+        self,
+        input_text: str,
+        candidates: List[EnsembleCandidate],
+        report: EnsembleReport,
+    ) -> str:
+        """Ask the flow's LLM to pick the best candidate or merge them."""
+        listing = "\n\n".join(
+            f"[{i}] Result from {c.agent}:\n{c.result}"
+            for i, c in enumerate(candidates)
+        )
+        if self.judge_mode == JudgeMode.MERGE:
+            instruction = (
+                "Merge these results into a single, complete and correct answer. "
+                "Keep what they agree on, resolve disagreements, and drop mistakes. "
+                "Reply with the merged answer only."
+            )
+        else:
+            instruction = (
+                "Pick the best result: the most correct, complete and relevant one. "
+                "Reply with its number only, e.g. [0]."
+            )
+        try:
+            response = await self.llm.ask(
+                messages=[
+                    Message.user_message(
+                        f"Task:\n{input_text}\n\nCandidate results:\n\n{listing}\n\n{instruction}"
+                    )
+                ],
+                system_msgs=[
+                    Message.system_message(
+                        "You are a judge comparing several attempts at the same task."
+                    )
+                ],
+                stream=False,
+            )
+        except Exception as e:
+            logger.error(f"Ensemble judge failed, using the first result: {e}")
+            report.selected = candidates[0].agent
+            return candidates[0].result
+
+        if self.judge_mode == JudgeMode.MERGE:
+            return response
+
+        match = re.search(r"\d+", response or "")
+        index = int(match.group()) if match else 0
+        if not 0 <= index < len(candidates):
+            index = 0
+        report.selected = candidates[index].agent
+        return candidates[index].result
+
+    @staticmethod
+    def _record_metrics(report: EnsembleReport) -> None:
+        metrics.observe("ensemble_flow_seconds", report.seconds)
+        metrics.incr("ensemble_tokens_total", report.total_tokens)
+        metrics.incr("ensemble_extra_tokens_total", report.extra_tokens)
+        for candidate in report.candidates:
+            metrics.incr("ensemble_candidates_total", status=candidate.status)
+        logger.info(
+            f"Ensemble finished in {report.seconds:.1f}s via {report.decided_by or 'error'}: "
+            f"selected {report.selected}, {report.total_tokens} tokens "
+            f"({report.extra_tokens} beyond the selected result)"
+        )
@@ -1,16 +1,27 @@
+import asyncio
 import json
 import time
+import uuid
 from enum import Enum
 from typing import Dict, List, Optional, Union
 
 from pydantic import Field
 
-from app.agent.base import BaseAgent
+from app.agent.base import BaseAgent, shared_agent_resources
+from app.config import config
 from app.flow.base import BaseFlow
 from app.llm import LLM
 from app.logger import logger
+from app.metrics import metrics
+from app.rate_limiter import Priority, llm_priority
 from app.schema import AgentState, Message, ToolChoice
 from app.tool import PlanningTool
+from app.tool.planning import PlanStep
+
+
+def _default_planning_tool() -> PlanningTool:
+    """Planning tool that saves plans in the workspace so flows can resume"""
+    return PlanningTool(storage_dir=str(config.workspace_root / "plans"))
 
 
 class PlanStepStatus(str, Enum):
@@ -46,10 +57,19 @@ class PlanningFlow(BaseFlow):
     """A flow that manages planning and execution of tasks using agents."""
 
     llm: LLM = Field(default_factory=lambda: LLM())
-    planning_tool: PlanningTool = Field(default_factory=PlanningTool)
+    planning_tool: PlanningTool = Field(default_factory=_default_planning_tool)
     executor_keys: List[str] = Field(default_factory=list)
-    active_plan_id: str = Field(default_factory=lambda: f"plan_{int(time.time())}")
+    active_plan_id: str = Field(default_factory=lambda: f"plan_{uuid.uuid4().hex}")
+    resume: bool = Field(
+        default=False,
+        description="Continue the saved plan with active_plan_id if it has unfinished steps (on by default when plan_id is given)",
+    )
     current_step_index: Optional[int] = None
+    max_parallel_steps: int = Field(
+        default=3, description="Maximum plan steps executed at the same time"
+    )
+    # Step results by index, shared with dependent steps
+    step_results: Dict[int, str] = Field(default_factory=dict)
 
     def __init__(
         self, agents: Union[BaseAgent, List[BaseAgent], Dict[str, BaseAgent]], **data
@@ -58,14 +78,14 @@ class PlanningFlow(BaseFlow):
         if "executors" in data:
             data["executor_keys"] = data.pop("executors")
 
-        # Set plan ID if provided
+        # Set plan ID if provided, an explicit ID resumes its saved plan
         if "plan_id" in data:
             data["active_plan_id"] = data.pop("plan_id")
+            data.setdefault("resume", True)
 
         # Initialize the planning tool if not provided
         if "planning_tool" not in data:
-            planning_tool = PlanningTool()
-            data["planning_tool"] = planning_tool
+            data["planning_tool"] = _default_planning_tool()
 
         # Call parent's init with the processed data
         super().__init__(agents, **data)
@@ -97,42 +117,95 @@ class PlanningFlow(BaseFlow):
             if not self.primary_agent:
                 raise ValueError("No primary agent available")
 
+            # Resume a saved plan with this ID, e.g. after a crash
+            saved_plan = self.planning_tool.get_plan(self.active_plan_id)
+            if self.resume and saved_plan is not None and saved_plan.cursor is not None:
+                logger.info(f"Resuming saved plan {self.active_plan_id}")
             # Create initial plan if input provided
-            if input_text:
+            elif input_text:
+                if saved_plan is not None:
+                    # Finished (or not to be resumed): start over with a new plan
+                    await self.planning_tool.execute(
+                        command="delete", plan_id=self.active_plan_id
+                    )
                 await self._create_initial_plan(input_text)
 
                 # Verify plan was created successfully
-                if self.active_plan_id not in self.planning_tool.plans:
+                if self.planning_tool.get_plan(self.active_plan_id) is None:
                     logger.error(
                         f"Plan creation failed. Plan ID {self.active_plan_id} not found in planning tool."
                     )
                     return f"Failed to create plan for: {input_text}"
 
-            result = ""
-            while True:
-                # Get current step to execute
-                self.current_step_index, step_info = await self._get_current_step_info()
-
-                # Exit if no more steps or plan completed
-                if self.current_step_index is None:
+            started = time.monotonic()
+            # Executors keep browsers, MCP sessions and the sandbox warm
+            # between steps and are cleaned up once when the plan is done.
+            # Plan steps are unattended work and queue behind interactive chat.
+            with llm_priority(Priority.BACKGROUND):
+                async with shared_agent_resources():
+                    result = await self._execute_plan()
                     result += await self._finalize_plan()
-                    break
-
-                # Execute current step with appropriate agent
-                step_type = step_info.get("type") if step_info else None
-                executor = self.get_executor(step_type)
-                step_result = await self._execute_step(executor, step_info)
-                result += step_result + "\n"
-
-                # Check if agent wants to terminate
-                if hasattr(executor, "state") and executor.state == AgentState.FINISHED:
-                    break
-
+            self._discard_finished_plan()
+            elapsed = time.monotonic() - started
+            metrics.observe("planning_flow_seconds", elapsed)
+            logger.info(f"Plan {self.active_plan_id} finished in {elapsed:.1f}s")
             return result
         except Exception as e:
             logger.error(f"Error in PlanningFlow: {str(e)}")
             return f"Execution failed: {str(e)}"
 
+    def _discard_finished_plan(self) -> None:
+        """Delete the saved copy of a plan without active steps, there is nothing to resume"""
+        plan = self.planning_tool.get_plan(self.active_plan_id)
+        if plan is not None and plan.cursor is None:
+            self.planning_tool.discard_saved_plan(self.active_plan_id)
+
+    async def _execute_plan(self) -> str:
+        """Run plan steps as their dependencies complete, several at a time.
+
+        Each running step has its own executor agent, so steps only run in
+        parallel when enough executors are free.
+        """
+        running: Dict[asyncio.Task, tuple[int, str]] = {}
+        finished = False
+        try:
+            while True:
+                if not finished:
+                    ready = await self._get_ready_steps(
+                        {index for index, _ in running.values()}
+                    )
+                    for index, step in ready:
+                        if len(running) >= self.max_parallel_steps:
+                            break
+                        busy = {key for _, key in running.values()}
+                        executor_key = self._get_free_executor_key(step.type, busy)
+                        if executor_key is None:
+                            continue
+                        await self._mark_step(index, PlanStepStatus.IN_PROGRESS)
+                        task = asyncio.create_task(
+                            self._execute_step(self.agents[executor_key], step, index)
+                        )
+                        running[task] = (index, executor_key)
+
+                if not running:
+                    break
+
+                done, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    index, executor_key = running.pop(task)
+                    self.step_results[index] = task.result()
+                    # Check if agent wants to terminate
+                    executor = self.agents[executor_key]
+                    if getattr(executor, "state", None) == AgentState.FINISHED:
+                        finished = True
+        finally:
+            for task in running:
+                task.cancel()
+
+        return "".join(f"{self.step_results[i]}\n" for i in sorted(self.step_results))
+
     async def _create_initial_plan(self, request: str) -> None:
         """Create an initial plan based on the request using the flow's LLM and PlanningTool."""
         logger.info(f"Creating initial plan with ID: {self.active_plan_id}")
@@ -158,6 +231,12 @@ class PlanningFlow(BaseFlow):
                 f"The infomation of them are below: {json.dumps(agents_description)}\n"
                 "When creating steps in the planning tool, please specify the agent names using the format '[agent_name]'."
             )
+        if self.max_parallel_steps > 1:
+            system_message_content += (
+                "\nIndependent steps can run in parallel. When some steps do not need "
+                "each other's results, set `step_dependencies` to list, for each step, "
+                "the indices of the steps it needs."
+            )
 
         # Create a system message for plan creation
         system_message = Message.system_message(system_message_content)
@@ -210,198 +289,134 @@ class PlanningFlow(BaseFlow):
             }
         )
 
-    async def _get_current_step_info(self) -> tuple[Optional[int], Optional[dict]]:
+    async def _get_ready_steps(
+        self, running: Optional[set] = None
+    ) -> List[tuple[int, PlanStep]]:
         """
-        Parse the current plan to identify the first non-completed step's index and info.
-        Returns (None, None) if no active step is found.
+        Return (index, step) for every active step whose dependencies are completed.
+        Sequential plans run in order: only the step at the cursor can be ready.
         """
-        if (
-            not self.active_plan_id
-            or self.active_plan_id not in self.planning_tool.plans
-        ):
+        plan = self.planning_tool.get_plan(self.active_plan_id)
+        if plan is None:
             logger.error(f"Plan with ID {self.active_plan_id} not found")
-            return None, None
-
-        try:
-            # Direct access to plan data from planning tool storage
-            plan_data = self.planning_tool.plans[self.active_plan_id]
-            steps = plan_data.get("steps", [])
-            step_statuses = plan_data.get("step_statuses", [])
-
-            # Find first non-completed step
-            for i, step in enumerate(steps):
-                if i >= len(step_statuses):
-                    status = PlanStepStatus.NOT_STARTED.value
-                else:
-                    status = step_statuses[i]
-
-                if status in PlanStepStatus.get_active_statuses():
-                    # Extract step type/category if available
-                    step_info = {"text": step}
-
-                    # Try to extract step type from the text (e.g., [SEARCH] or [CODE])
-                    import re
-
-                    type_match = re.search(r"\[([A-Z_]+)\]", step)
-                    if type_match:
-                        step_info["type"] = type_match.group(1).lower()
-
-                    # Mark current step as in_progress
-                    try:
-                        await self.planning_tool.execute(
-                            command="mark_step",
-                            plan_id=self.active_plan_id,
-                            step_index=i,
-                            step_status=PlanStepStatus.IN_PROGRESS.value,
-                        )
-                    except Exception as e:
-                        logger.warning(f"Error marking step as in_progress: {e}")
-                        # Update step status directly if needed
-                        if i < len(step_statuses):
-                            step_statuses[i] = PlanStepStatus.IN_PROGRESS.value
-                        else:
-                            while len(step_statuses) < i:
-                                step_statuses.append(PlanStepStatus.NOT_STARTED.value)
-                            step_statuses.append(PlanStepStatus.IN_PROGRESS.value)
-
-                        plan_data["step_statuses"] = step_statuses
-
-                    return i, step_info
-
-            return None, None  # No active step found
+            return []
+        if plan.cursor is None:
+            return []
+        running = running or set()
+        completed = PlanStepStatus.COMPLETED.value
+
+        if plan.sequential:
+            index = plan.cursor
+            return [] if index in running else [(index, plan.steps[index])]
+
+        ready = []
+        for index in range(plan.cursor, len(plan.steps)):
+            step = plan.steps[index]
+            if (
+                step.status in PlanStepStatus.get_active_statuses()
+                and index not in running
+                and all(
+                    plan.steps[dep].status == completed for dep in step.dependencies
+                )
+            ):
+                ready.append((index, step))
+        return ready
 
-        except Exception as e:
-            logger.warning(f"Error finding current step index: {e}")
-            return None, None
+    def _get_free_executor_key(
+        self, step_type: Optional[str], busy: set
+    ) -> Optional[str]:
+        """Key of an idle executor for the step type, or None if all are busy"""
+        if step_type and step_type in self.agents:
+            return None if step_type in busy else step_type
+        for key in self.executor_keys:
+            if key in self.agents and key not in busy:
+                return key
+        if self.primary_agent_key not in busy and not any(
+            key in self.agents for key in self.executor_keys
+        ):
+            return self.primary_agent_key
+        return None
 
-    async def _execute_step(self, executor: BaseAgent, step_info: dict) -> str:
-        """Execute the current step with the specified agent using agent.run()."""
+    async def _execute_step(
+        self, executor: BaseAgent, step: PlanStep, step_index: int
+    ) -> str:
+        """Execute one step with the specified agent using agent.run()."""
         # Prepare context for the agent with current plan status
         plan_status = await self._get_plan_text()
-        step_text = step_info.get("text", f"Step {self.current_step_index}")
+        step_text = step.text
+
+        # Results of the steps this one depends on
+        prerequisite_results = "".join(
+            f"\n        Step {dep}: {self.step_results[dep][-2000:]}"
+            for dep in step.dependencies
+            if dep in self.step_results
+        )
+        prerequisites = (
+            f"""
+        RESULTS OF PREREQUISITE STEPS:{prerequisite_results}
+"""
+            if prerequisite_results
+            else ""
+        )
 
         # Create a prompt for the agent to execute the current step
         step_prompt = f"""
         CURRENT PLAN STATUS:
         {plan_status}
-
+{prerequisites}
         YOUR CURRENT TASK:
-        You are now working on step {self.current_step_index}: "{step_text}"
+        You are now working on step {step_index}: "{step_text}"
 
         Please only execute this current step using the appropriate tools. When you're done, provide a summary of what you accomplished.
         """
 
         # Use agent.run() to execute the step
+        self.current_step_index = step_index
+        started = time.monotonic()
         try:
             step_result = await executor.run(step_prompt)
 
             # Mark the step as completed after successful execution
-            await self._mark_step_completed()
+            await self._mark_step(step_index, PlanStepStatus.COMPLETED)
 
             return step_result
         except Exception as e:
-            logger.error(f"Error executing step {self.current_step_index}: {e}")
-            return f"Error executing step {self.current_step_index}: {str(e)}"
-
-    async def _mark_step_completed(self) -> None:
-        """Mark the current step as completed."""
-        if self.current_step_index is None:
-            return
-
+            logger.error(f"Error executing step {step_index}: {e}")
+            # Blocked steps hold back their dependents instead of being retried
+            await self._mark_step(step_index, PlanStepStatus.BLOCKED, notes=str(e))
+            return f"Error executing step {step_index}: {str(e)}"
+        finally:
+            metrics.observe("planning_step_seconds", time.monotonic() - started)
+
+    async def _mark_step(
+        self, step_index: int, status: PlanStepStatus, notes: Optional[str] = None
+    ) -> None:
+        """Set the status of a step in the active plan."""
         try:
-            # Mark the step as completed
             await self.planning_tool.execute(
                 command="mark_step",
                 plan_id=self.active_plan_id,
-                step_index=self.current_step_index,
-                step_status=PlanStepStatus.COMPLETED.value,
+                step_index=step_index,
+                step_status=status.value,
+                step_notes=notes,
             )
             logger.info(
-                f"Marked step {self.current_step_index} as completed in plan {self.active_plan_id}"
+                f"Marked step {step_index} as {status.value} in plan {self.active_plan_id}"
             )
         except Exception as e:
             logger.warning(f"Failed to update plan status: {e}")
             # Update step status directly in planning tool storage
-            if self.active_plan_id in self.planning_tool.plans:
-                plan_data = self.planning_tool.plans[self.active_plan_id]
-                step_statuses = plan_data.get("step_statuses", [])
-
-                # Ensure the step_statuses list is long enough
-                while len(step_statuses) <= self.current_step_index:
-                    step_statuses.append(PlanStepStatus.NOT_STARTED.value)
-
-                # Update the status
-                step_statuses[self.current_step_index] = PlanStepStatus.COMPLETED.value
-                plan_data["step_statuses"] = step_statuses
+            plan = self.planning_tool.get_plan(self.active_plan_id)
+            if plan is not None and 0 <= step_index < len(plan.steps):
+                plan.mark(step_index, status.value, notes)
 
     async def _get_plan_text(self) -> str:
-        """Get the current plan as formatted text."""
-        try:
-            result = await self.planning_tool.execute(
-                command="get", plan_id=self.active_plan_id
-            )
-            return result.output if hasattr(result, "output") else str(result)
-        except Exception as e:
-            logger.error(f"Error getting plan: {e}")
-            return self._generate_plan_text_from_storage()
-
-    def _generate_plan_text_from_storage(self) -> str:
-        """Generate plan text directly from storage if the planning tool fails."""
-        try:
-            if self.active_plan_id not in self.planning_tool.plans:
-                return f"Error: Plan with ID {self.active_plan_id} not found"
-
-            plan_data = self.planning_tool.plans[self.active_plan_id]
-            title = plan_data.get("title", "Untitled Plan")
-            steps = plan_data.get("steps", [])
-            step_statuses = plan_data.get("step_statuses", [])
-            step_notes = plan_data.get("step_notes", [])
-
-            # Ensure step_statuses and step_notes match the number of steps
-            while len(step_statuses) < len(steps):
-                step_statuses.append(PlanStepStatus.NOT_STARTED.value)
-            while len(step_notes) < len(steps):
-                step_notes.append("")
-
-            # Count steps by status
-            status_counts = {status: 0 for status in PlanStepStatus.get_all_statuses()}
-
-            for status in step_statuses:
-                if status in status_counts:
-                    status_counts[status] += 1
-
-            completed = status_counts[PlanStepStatus.COMPLETED.value]
-            total = len(steps)
-            progress = (completed / total) * 100 if total > 0 else 0
-
-            plan_text = f"Plan: {title} (ID: {self.active_plan_id})\n"
-            plan_text += "=" * len(plan_text) + "\n\n"
-
-            plan_text += (
-                f"Progress: {completed}/{total} steps completed ({progress:.1f}%)\n"
-            )
-            plan_text += f"Status: {status_counts[PlanStepStatus.COMPLETED.value]} completed, {status_counts[PlanStepStatus.IN_PROGRESS.value]} in progress, "
-            plan_text += f"{status_counts[PlanStepStatus.BLOCKED.value]} blocked, {status_counts[PlanStepStatus.NOT_STARTED.value]} not started\n\n"
-            plan_text += "Steps:\n"
-
-            status_marks = PlanStepStatus.get_status_marks()
-
-            for i, (step, status, notes) in enumerate(
-                zip(steps, step_statuses, step_notes)
-            ):
-                # Use status marks to indicate step status
-                status_mark = status_marks.get(
-                    status, status_marks[PlanStepStatus.NOT_STARTED.value]
-                )
-
-                plan_text += f"{i}. {status_mark} {step}\n"
-                if notes:
-                    plan_text += f"   Notes: {notes}\n"
-
-            return plan_text
-        except Exception as e:
-            logger.error(f"Error generating plan text from storage: {e}")
-            return f"Error: Unable to retrieve plan with ID {self.active_plan_id}"
+        """Get the current plan as formatted text (cached by the plan until it changes)."""
+        plan = self.planning_tool.get_plan(self.active_plan_id)
+        if plan is None:
+            logger.error(f"Error getting plan: {self.active_plan_id} not found")
+            return f"Error: Plan with ID {self.active_plan_id} not found"
+        return plan.render()
 
     async def _finalize_plan(self) -> str:
         """Finalize the plan and provide a summary using the flow's LLM directly."""
@@ -0,0 +1,402 @@
+"""HTML to plain text extraction for fetched pages.
+
+Extractors turn a page into whitespace-normalized text of at most
+``max_chars`` characters, skipping scripts, navigation and other
+boilerplate. They stop walking the document once the budget is filled.
+
+Available extractors:
+    selectolax: lexbor-based parser (pip install selectolax), fastest
+    html.parser: streaming standard library parser that builds no tree and
+        stops reading at the budget, usually faster than lxml here
+    lxml: libxml2-based parser, full parse plus XPath boilerplate removal
+    bs4: BeautifulSoup with html.parser, the original behaviour
+
+"auto" uses selectolax when it is installed, html.parser otherwise.
+"""
+
+import asyncio
+import re
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.config import config
+from app.logger import logger
+from app.metrics import metrics
+
+
+DEFAULT_MAX_CHARS = 10000
+
+# Elements that never hold main content
+BOILERPLATE_TAGS = (
+    "script",
+    "style",
+    "noscript",
+    "template",
+    "svg",
+    "iframe",
+    "header",
+    "footer",
+    "nav",
+    "aside",
+    "form",
+)
+# Containers of the main content, never dropped whatever their classes say
+CONTENT_TAGS = ("html", "body", "main", "article")
+# Words in class / id names of navigation, banners and widgets. A marker must
+# be a whole class token or a "-" / "_" separated part of one: "share-bar"
+# and "site_menu" match, "sharedaddy" and "menubar" do not
+BOILERPLATE_MARKERS = (
+    "cookie",
+    "consent",
+    "sidebar",
+    "breadcrumb",
+    "breadcrumbs",
+    "advert",
+    "advertisement",
+    "newsletter",
+    "social",
+    "share",
+    "popup",
+    "modal",
+    "navbar",
+    "menu",
+)
+# Leading words of state classes ("has-sidebar", "is-modal-open") that describe
+# the element rather than name a widget
+_STATE_PREFIXES = ("has", "is", "with", "no")
+
+_BOILERPLATE_TOKEN = re.compile(
+    r"(?:^|[-_])(?:%s)(?:$|[-_])" % "|".join(BOILERPLATE_MARKERS), re.IGNORECASE
+)
+_VOID_TAGS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "source",
+    "track",
+    "wbr",
+}
+# Pages at least this large are extracted off the event loop
+OFFLOAD_THRESHOLD = 64 * 1024
+
+
+class TextBudget:
+    """Collects whitespace-normalized words until max_chars is reached"""
+
+    def __init__(self, max_chars: int = DEFAULT_MAX_CHARS):
+        self.max_chars = max_chars
+        self.words: List[str] = []
+        self.size = 0
+
+    def add(self, text: str) -> bool:
+        """Add a text fragment, returning True once the budget is full"""
+        for word in text.split():
+            self.words.append(word)
+            self.size += len(word) + 1
+            if self.size > self.max_chars:
+                return True
+        return False
+
+    def text(self) -> Optional[str]:
+        text = " ".join(self.words)[: self.max_chars]
+        return text or None
+
+
+class HtmlExtractor(ABC):
+    """Turns an HTML document into plain text"""
+
+    name: str = ""
+
+    @abstractmethod
+    def extract(self, html: str, max_chars: int = DEFAULT_MAX_CHARS) -> Optional[str]:
+        """Return the page text, at most max_chars long, or None if it has none"""
+
+
+class _BudgetReached(Exception):
+    pass
+
+
+class _StreamingTextParser(HTMLParser):
+    def __init__(self, budget: TextBudget):
+        super().__init__(convert_charrefs=True)
+        self.budget = budget
+        self.skip_tag: Optional[str] = None
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]):
+        if self.skip_tag is not None:
+            if tag == self.skip_tag:
+                self.skip_depth += 1
+            return
+        if tag in _VOID_TAGS:
+            return
+        if (
+            tag in BOILERPLATE_TAGS
+            or tag == "title"
+            or (tag not in CONTENT_TAGS and _has_boilerplate_attr(attrs))
+        ):
+            self.skip_tag = tag
+            self.skip_depth = 1
+
+    def handle_endtag(self, tag: str):
+        if tag == self.skip_tag:
+            self.skip_depth -= 1
+            if self.skip_depth == 0:
+                self.skip_tag = None
+
+    def handle_data(self, data: str):
+        if self.skip_tag is None and self.budget.add(data):
+            raise _BudgetReached
+
+
+def _has_boilerplate_attr(attrs: List[Tuple[str, Optional[str]]]) -> bool:
+    return any(
+        name in ("class", "id") and value and is_boilerplate(value)
+        for name, value in attrs
+    )
+
+
+def is_boilerplate(names: str) -> bool:
+    """Whether a class attribute (or id) names a navigation or widget element"""
+    for token in names.split():
+        if token.lower().split("-")[0].split("_")[0] in _STATE_PREFIXES:
+            continue
+        if _BOILERPLATE_TOKEN.search(token):
+            return True
+    return False
+
+
+class StreamingExtractor(HtmlExtractor):
+    """Standard library parser fed in chunks; stops reading once the budget is full"""
+
+    name = "html.parser"
+    CHUNK_SIZE = 32 * 1024
+
+    def extract(self, html: str, max_chars: int = DEFAULT_MAX_CHARS) -> Optional[str]:
+        budget = TextBudget(max_chars)
+        parser = _StreamingTextParser(budget)
+        try:
+            for start in range(0, len(html), self.CHUNK_SIZE):
+                parser.feed(html[start : start + self.CHUNK_SIZE])
+            parser.close()
+        except _BudgetReached:
+            pass
+        return budget.text()
+
+
+_LOWER = "translate({}, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')"
+_LOWER_CLASS = _LOWER.format("@class")
+_LOWER_ID = _LOWER.format("@id")
+
+
+class LxmlExtractor(HtmlExtractor):
+    name = "lxml"
+
+    _XPATH = " | ".join([f"//{tag}" for tag in BOILERPLATE_TAGS] + ["//comment()"])
+    # Candidates only, markers are matched by is_boilerplate
+    _MARKER_XPATH = " | ".join(
+        f"//*[contains({_LOWER_CLASS}, '{marker}')"
+        f" or contains({_LOWER_ID}, '{marker}')]"
+        for marker in BOILERPLATE_MARKERS
+    )
+
+    def __init__(self):
+        from lxml import html as lxml_html
+
+        self._parse = lxml_html.document_fromstring
+
+    def extract(self, html: str, max_chars: int = DEFAULT_MAX_CHARS) -> Optional[str]:
+        tree = self._parse(html)
+        elements = tree.xpath(self._XPATH) + [
+            element
+            for element in tree.xpath(self._MARKER_XPATH)
+            if element.tag not in CONTENT_TAGS
+            and is_boilerplate(
+                f"{element.get('class') or ''} {element.get('id') or ''}"
+            )
+        ]
+        for element in elements:
+            # drop_tree keeps the tail text that follows the element
+            if element.getparent() is not None:
+                element.drop_tree()
+        body = tree.find("body")
+        budget = TextBudget(max_chars)
+        for text in (body if body is not None else tree).itertext():
+            if budget.add(text):
+                break
+        return budget.text()
+
+
+class SelectolaxExtractor(HtmlExtractor):
+    name = "selectolax"
+
+    # Candidates only, markers are matched by is_boilerplate
+    _SELECTOR = ", ".join(
+        list(BOILERPLATE_TAGS)
+        + [f"[class*={marker} i], [id*={marker} i]" for marker in BOILERPLATE_MARKERS]
+    )
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+
+        self._parser = LexborHTMLParser
+
+    def extract(self, html: str, max_chars: int = DEFAULT_MAX_CHARS) -> Optional[str]:
+        tree = self._parser(html)
+        root = tree.body or tree.root
+        if root is None:
+            return None
+        # Pick the outermost matches before touching the tree: decomposing a
+        # node frees its descendants, including nested matches
+        outermost, ids = [], set()
+        for node in root.css(self._SELECTOR):
+            if node.tag not in BOILERPLATE_TAGS and (
+                node.tag in CONTENT_TAGS
+                or not is_boilerplate(
+                    f"{node.attributes.get('class') or ''} "
+                    f"{node.attributes.get('id') or ''}"
+                )
+            ):
+                continue
+            parent = node.parent
+            while parent is not None and parent.mem_id not in ids:
+                parent = parent.parent
+            if parent is None:
+                outermost.append(node)
+            ids.add(node.mem_id)
+        for node in outermost:
+            node.decompose()
+        budget = TextBudget(max_chars)
+        for node in root.traverse(include_text=True):
+            if node.is_text_node and budget.add(node.text_content or ""):
+                break
+        return budget.text()
+
+
+class BeautifulSoupExtractor(HtmlExtractor):
+    """The original BeautifulSoup extraction, kept for comparison"""
+
+    name = "bs4"
+
+    def extract(self, html: str, max_chars: int = DEFAULT_MAX_CHARS) -> Optional[str]:
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(html, "html.parser")
+        for element in soup(["script", "style", "header", "footer", "nav"]):
+            element.extract()
+        text = " ".join(soup.get_text(separator="\n", strip=True).split())
+        return text[:max_chars] if text else None
+
+
+EXTRACTORS = {
+    extractor.name: extractor
+    for extractor in (
+        SelectolaxExtractor,
+        LxmlExtractor,
+        StreamingExtractor,
+        BeautifulSoupExtractor,
+    )
+}
+_instances: Dict[str, HtmlExtractor] = {}
+
+
+def get_extractor(name: str = "auto") -> HtmlExtractor:
+    """Return the named extractor; "auto" picks the fastest installed one"""
+    names = [name] if name != "auto" else ["selectolax", "html.parser"]
+    for candidate in names:
+        if candidate in _instances:
+            return _instances[candidate]
+        if candidate not in EXTRACTORS:
+            raise ValueError(f"Unknown HTML extractor: {candidate}")
+        try:
+            _instances[candidate] = EXTRACTORS[candidate]()
+            return _instances[candidate]
+        except ImportError:
+            logger.debug(f"HTML extractor {candidate} is not installed")
+    logger.warning(f"HTML extractor {name} is not installed, using html.parser")
+    return get_extractor("html.parser")
+
+
+def extract_text(
+    html: str, max_chars: int = DEFAULT_MAX_CHARS, extractor: Optional[str] = None
+) -> Optional[str]:
+    """Extract page text, falling back to the streaming parser on parse errors"""
+    chosen = get_extractor(extractor or config.fetch.extractor)
+    try:
+        return chosen.extract(html, max_chars)
+    except Exception as e:
+        if chosen.name == StreamingExtractor.name:
+            raise
+        logger.debug(f"{chosen.name} failed to parse the page, using html.parser: {e}")
+        metrics.incr("html_extract_fallbacks_total", extractor=chosen.name)
+        return get_extractor("html.parser").extract(html, max_chars)
+
+
+def _extract_in_worker(args: Tuple[str, int, str]) -> Optional[str]:
+    html, max_chars, extractor = args
+    return extract_text(html, max_chars, extractor)
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_process_pool() -> Optional[ProcessPoolExecutor]:
+    global _process_pool
+    processes = config.fetch.extract_processes
+    if processes <= 0:
+        return None
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=processes)
+    return _process_pool
+
+
+async def extract_text_async(
+    html: str, max_chars: int = DEFAULT_MAX_CHARS
+) -> Optional[str]:
+    """Extract page text without blocking the event loop on large pages.
+
+    Large pages go to the process pool when [fetch] extract_processes is set,
+    otherwise to a worker thread.
+    """
+    if len(html) < OFFLOAD_THRESHOLD:
+        return extract_text(html, max_chars)
+    pool = _get_process_pool()
+    if pool is not None:
+        return await asyncio.get_running_loop().run_in_executor(
+            pool, _extract_in_worker, (html, max_chars, config.fetch.extractor)
+        )
+    return await asyncio.to_thread(extract_text, html, max_chars)
+
+
+def extract_many(
+    pages: Sequence[str],
+    max_chars: int = DEFAULT_MAX_CHARS,
+    processes: Optional[int] = None,
+) -> List[Optional[str]]:
+    """Extract text from many pages, spread over worker processes.
+
+    processes defaults to [fetch] extract_processes; 0 or 1 extracts in this
+    process.
+    """
+    if processes is None:
+        processes = config.fetch.extract_processes
+    extractor = config.fetch.extractor
+    if processes <= 1 or len(pages) < 2:
+        return [extract_text(html, max_chars, extractor) for html in pages]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(
+            pool.map(
+                _extract_in_worker,
+                [(html, max_chars, extractor) for html in pages],
+                chunksize=max(1, len(pages) // (processes * 4)),
+            )
+        )
@@ -0,0 +1,159 @@
+"""Shared pooled HTTP client for fetching web pages.
+
+Every page fetch goes through one ``httpx.AsyncClient`` so connections (and
+HTTP/2 sessions when ``h2`` is installed) are reused across tools and agents.
+Requests to a single host are capped, bodies are streamed and cut off at a
+byte budget, non-text responses are not downloaded, and callers can pass
+ETag / Last-Modified validators for conditional GETs.
+"""
+
+import asyncio
+import importlib.util
+import re
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import httpx
+from pydantic import BaseModel
+
+from app.config import FetchSettings, config
+from app.logger import logger
+from app.metrics import metrics
+
+
+TEXT_CONTENT_TYPES = ("text/", "application/xhtml", "application/xml", "+xml")
+
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?([\w.:-]+)""", re.IGNORECASE)
+
+
+class FetchResult(BaseModel):
+    """Outcome of fetching one URL"""
+
+    url: str
+    status_code: int
+    text: Optional[str] = None
+    content_type: str = ""
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    truncated: bool = False
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status_code == 304
+
+
+class HttpFetcher:
+    """Pooled async client with per-host concurrency limits"""
+
+    def __init__(self, settings: Optional[FetchSettings] = None):
+        self.settings = settings or config.fetch or FetchSettings()
+        self.http2 = self.settings.http2 and importlib.util.find_spec("h2") is not None
+        # Clients and semaphores belong to the event loop that created them
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._loop = loop
+            self._host_slots = {}
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                follow_redirects=True,
+                timeout=self.settings.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.settings.max_connections,
+                    max_keepalive_connections=self.settings.max_connections,
+                ),
+                headers={"User-Agent": self.settings.user_agent},
+            )
+        return self._client
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc.lower()
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = asyncio.Semaphore(self.settings.max_connections_per_host)
+            self._host_slots[host] = slot
+        return slot
+
+    async def fetch(
+        self,
+        url: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ) -> FetchResult:
+        """GET a URL, reading at most max_bytes of a text body.
+
+        With validators, an unchanged page comes back as a 304 result without
+        a body. Raises httpx.HTTPError on network errors and timeouts.
+        """
+        client = self._get_client()
+        max_bytes = max_bytes or self.settings.max_bytes
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        async with self._host_slot(url):
+            async with client.stream(
+                "GET", url, headers=headers, timeout=timeout or self.settings.timeout
+            ) as response:
+                content_type = response.headers.get("content-type", "")
+                result = FetchResult(
+                    url=str(response.url),
+                    status_code=response.status_code,
+                    content_type=content_type,
+                    etag=response.headers.get("etag"),
+                    last_modified=response.headers.get("last-modified"),
+                )
+                metrics.incr(
+                    "web_fetch_total",
+                    status=str(response.status_code),
+                    http_version=response.http_version,
+                )
+                if response.status_code != 200 or not self._is_text(content_type):
+                    return result
+
+                body = bytearray()
+                async for chunk in response.aiter_bytes():
+                    body.extend(chunk)
+                    if len(body) >= max_bytes:
+                        result.truncated = True
+                        break
+                metrics.incr("web_fetch_bytes_total", len(body))
+
+        result.text = self._decode(bytes(body[:max_bytes]), response.charset_encoding)
+        return result
+
+    @staticmethod
+    def _is_text(content_type: str) -> bool:
+        content_type = content_type.lower()
+        return not content_type or any(t in content_type for t in TEXT_CONTENT_TYPES)
+
+    @staticmethod
+    def _decode(body: bytes, charset: Optional[str]) -> str:
+        """Decode with the header charset, else a <meta charset>, else UTF-8"""
+        if not charset:
+            match = _META_CHARSET.search(body[:4096])
+            charset = match.group(1).decode("ascii") if match else "utf-8"
+        try:
+            return body.decode(charset, errors="replace")
+        except LookupError:
+            return body.decode("utf-8", errors="replace")
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            try:
+                await self._client.aclose()
+            except Exception as e:
+                logger.debug(f"Error closing HTTP client: {e}")
+            self._client = None
+
+
+# Shared by all tools that fetch web pages
+http_fetcher = HttpFetcher()
@@ -1,27 +1,34 @@
+import hashlib
+import inspect
+import json
 import math
-from typing import Dict, List, Optional, Union
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import tiktoken
-from openai import (
-    APIError,
-    AsyncAzureOpenAI,
-    AsyncOpenAI,
-    AuthenticationError,
-    OpenAIError,
-    RateLimitError,
-)
-from openai.types.chat import ChatCompletion, ChatCompletionMessage
-from tenacity import (
-    retry,
-    retry_if_exception_type,
-    stop_after_attempt,
-    wait_random_exponential,
+from openai import APIError, AuthenticationError, OpenAIError, RateLimitError
+from openai.types.chat import (
+    ChatCompletion,
+    ChatCompletionMessage,
+    ChatCompletionMessageToolCall,
 )
+from pydantic import BaseModel
 
-from app.bedrock import BedrockClient
+from app.circuit_breaker import llm_retry
 from app.config import LLMSettings, config
-from app.exceptions import TokenLimitExceeded
+from app.exceptions import (
+    CircuitOpenError,
+    LLMCacheMiss,
+    StreamInterrupted,
+    TokenLimitExceeded,
+)
+from app.llm_cache import LLMResponseCache
+from app.llm_router import LLMRouter
+from app.llm_stream import StreamSink
 from app.logger import logger  # Assuming a logger is set up in your app
+from app.rate_limiter import LLMRequestLimiter, RequestCoalescer
 from app.schema import (
     ROLE_VALUES,
     TOOL_CHOICE_TYPE,
@@ -171,6 +178,154 @@ class TokenCounter:
         return total_tokens
 
 
+class TokenUsage(BaseModel):
+    """Tokens used by the LLM calls made inside a ``track_usage`` block"""
+
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    requests: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+_usage_trackers: ContextVar[Tuple[TokenUsage, ...]] = ContextVar(
+    "llm_usage_trackers", default=()
+)
+
+
+@contextmanager
+def track_usage():
+    """Collect the token usage of every LLM call made in the current context.
+
+    Tasks created inside the block inherit the tracker, so a whole agent run
+    or a streamed chat request can be billed by the tokens it really used.
+
+    Example:
+        >>> with track_usage() as usage:
+        ...     await llm.ask(messages)
+        >>> usage.total_tokens
+    """
+    usage = TokenUsage()
+    token = _usage_trackers.set(_usage_trackers.get() + (usage,))
+    try:
+        yield usage
+    finally:
+        _usage_trackers.reset(token)
+
+
+async def _maybe_await(result: Any) -> None:
+    """Await the result of a callback if it is awaitable"""
+    if inspect.isawaitable(result):
+        await result
+
+
+class ToolCallStreamAssembler:
+    """Assemble a streamed chat completion into a single assistant message.
+
+    Content deltas are forwarded to ``on_content`` as they arrive. Tool call
+    deltas are accumulated by index; providers stream tool calls one after
+    another, so a tool call is complete as soon as a delta for a higher index
+    shows up (or the stream ends), at which point it is passed to
+    ``on_tool_call``.
+    """
+
+    def __init__(
+        self,
+        on_content: Optional[Callable[[str], Any]] = None,
+        on_tool_call: Optional[Callable[[ChatCompletionMessageToolCall], Any]] = None,
+        count_tokens: Optional[Callable[[str], int]] = None,
+    ):
+        self.on_content = on_content
+        self.on_tool_call = on_tool_call
+        self.count_tokens = count_tokens
+        # Completion tokens counted per delta, for streams without a usage frame
+        self.completion_tokens = 0
+        self.content_parts: List[str] = []
+        self.tool_calls: Dict[int, dict] = {}
+        self.finish_reason: Optional[str] = None
+        self.usage: Optional[Any] = None
+        # Whether any callback has been called, after which a retry would repeat it
+        self.delivered = False
+        self._emitted: set = set()
+
+    async def feed(self, chunk: Any) -> None:
+        """Consume one streamed chunk"""
+        if getattr(chunk, "usage", None):
+            # Final usage frame (stream_options.include_usage) has no choices
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return
+        choice = chunk.choices[0]
+        delta = choice.delta
+
+        if delta.content:
+            self.content_parts.append(delta.content)
+            self._count(delta.content)
+            if self.on_content:
+                self.delivered = True
+                await _maybe_await(self.on_content(delta.content))
+
+        for tool_delta in getattr(delta, "tool_calls", None) or []:
+            index = tool_delta.index
+            # A new tool call index means every earlier call is complete
+            for done_index in sorted(self.tool_calls):
+                if done_index < index:
+                    await self._emit(done_index)
+
+            call = self.tool_calls.setdefault(
+                index, {"id": None, "name": "", "arguments": ""}
+            )
+            if tool_delta.id:
+                call["id"] = tool_delta.id
+            function = tool_delta.function
+            if function is not None:
+                if function.name:
+                    call["name"] += function.name
+                    self._count(function.name)
+                if function.arguments:
+                    call["arguments"] += function.arguments
+                    self._count(function.arguments)
+
+        if choice.finish_reason:
+            self.finish_reason = choice.finish_reason
+
+    def _count(self, text: str) -> None:
+        if self.count_tokens is not None:
+            self.completion_tokens += self.count_tokens(text)
+
+    async def finish(self) -> ChatCompletionMessage:
+        """Flush pending tool calls and build the final message"""
+        for index in sorted(self.tool_calls):
+            await self._emit(index)
+
+        tool_calls = [self._build_tool_call(i) for i in sorted(self.tool_calls)]
+        return ChatCompletionMessage(
+            role="assistant",
+            content="".join(self.content_parts) or None,
+            tool_calls=tool_calls or None,
+        )
+
+    async def _emit(self, index: int) -> None:
+        if index in self._emitted:
+            return
+        self._emitted.add(index)
+        if self.on_tool_call:
+            self.delivered = True
+            await _maybe_await(self.on_tool_call(self._build_tool_call(index)))
+
+    def _build_tool_call(self, index: int) -> ChatCompletionMessageToolCall:
+        call = self.tool_calls[index]
+        if not call["id"]:
+            call["id"] = f"call_{uuid.uuid4().hex[:24]}"
+        return ChatCompletionMessageToolCall(
+            id=call["id"],
+            type="function",
+            function={"name": call["name"], "arguments": call["arguments"]},
+        )
+
+
 class LLM:
     _instances: Dict[str, "LLM"] = {}
 
@@ -196,6 +351,8 @@ class LLM:
             self.api_key = llm_config.api_key
             self.api_version = llm_config.api_version
             self.base_url = llm_config.base_url
+            self.stream_usage = llm_config.stream_usage
+            self.max_request_images = llm_config.max_request_images
 
             # Add token counting related attributes
             self.total_input_tokens = 0
@@ -213,19 +370,75 @@ class LLM:
                 # If the model is not in tiktoken's presets, use cl100k_base as default
                 self.tokenizer = tiktoken.get_encoding("cl100k_base")
 
-            if self.api_type == "azure":
-                self.client = AsyncAzureOpenAI(
-                    base_url=self.base_url,
-                    api_key=self.api_key,
-                    api_version=self.api_version,
-                )
-            elif self.api_type == "aws":
-                self.client = BedrockClient()
-            else:
-                self.client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+            # Requests are routed across the primary endpoint and any
+            # configured equivalents; self.client is the primary's client
+            self.router = LLMRouter.from_settings(llm_config)
+            self.client = self.router.primary.client
+            self.circuit_breaker = self.router.primary.breaker
+
+            # Bound concurrent requests and RPM/TPM for everything sharing
+            # this instance, and share identical deterministic requests
+            self.limiter = LLMRequestLimiter(
+                config_name,
+                max_concurrency=llm_config.max_concurrency,
+                requests_per_minute=llm_config.requests_per_minute,
+                tokens_per_minute=llm_config.tokens_per_minute,
+            )
+            self.coalescer = (
+                RequestCoalescer(config_name) if llm_config.coalesce_requests else None
+            )
+
+            # Optional record/replay cache shared by ask, ask_with_images and ask_tool
+            self.cache = LLMResponseCache.from_settings()
 
             self.token_counter = TokenCounter(self.tokenizer)
 
+    def _cached_response(self, params: dict) -> Optional[dict]:
+        """Look up a recorded response; raises LLMCacheMiss in replay-only mode"""
+        return self.cache.lookup(params) if self.cache is not None else None
+
+    def _record_response(self, params: dict, response: dict) -> None:
+        """Record a response if the cache is in record mode"""
+        if self.cache is not None:
+            self.cache.store(params, response)
+
+    async def _create_completion(self, input_tokens: int = 0, **params):
+        """Call the chat completions API through the limiter, router and breakers.
+
+        Identical requests sent with temperature 0 while one is already in
+        flight share its response instead of hitting the API again.
+        """
+        if params.get("stream") and self.stream_usage and self.api_type != "aws":
+            # Ask for a final usage frame (Bedrock streams always include one)
+            params["stream_options"] = {"include_usage": True}
+        if self.coalescer is not None and params.get("temperature") == 0:
+            key = hashlib.sha256(
+                json.dumps(params, sort_keys=True, default=str).encode()
+            ).hexdigest()
+            return await self.coalescer.run(
+                key,
+                lambda: self._limited_create(input_tokens, params),
+                stream=bool(params.get("stream")),
+            )
+        return await self._limited_create(input_tokens, params)
+
+    async def _limited_create(self, input_tokens: int, params: dict):
+        """Wait for a limiter slot, then send the request through the router"""
+        await self.limiter.acquire(input_tokens)
+        try:
+            response = await self.router.create(**params)
+        except BaseException:
+            self.limiter.release()
+            raise
+
+        if params.get("stream"):
+            # The slot is held until the stream has been read to the end
+            return self.limiter.release_after(response)
+        self.limiter.release()
+        usage = getattr(response, "usage", None)
+        self.limiter.record_usage(getattr(usage, "completion_tokens", 0) or 0)
+        return response
+
     def count_tokens(self, text: str) -> int:
         """Calculate the number of tokens in a text"""
         if not text:
@@ -240,12 +453,41 @@ class LLM:
         # Only track tokens if max_input_tokens is set
         self.total_input_tokens += input_tokens
         self.total_completion_tokens += completion_tokens
+        for usage in _usage_trackers.get():
+            usage.prompt_tokens += input_tokens
+            usage.completion_tokens += completion_tokens
+            usage.requests += 1
         logger.info(
             f"Token usage: Input={input_tokens}, Completion={completion_tokens}, "
             f"Cumulative Input={self.total_input_tokens}, Cumulative Completion={self.total_completion_tokens}, "
             f"Total={input_tokens + completion_tokens}, Cumulative Total={self.total_input_tokens + self.total_completion_tokens}"
         )
 
+    def update_stream_token_count(
+        self,
+        estimated_input: int,
+        estimated_completion: int,
+        usage: Any = None,
+        response: Any = None,
+    ) -> None:
+        """Account a streamed call, preferring the provider's usage frame.
+
+        Without a usage frame (provider does not support include_usage) the
+        tiktoken estimates are used: the formatted prompt and the completion
+        counted chunk by chunk during the stream. A stream shared by coalesced
+        callers is charged to the rate limiter by one of them only.
+        """
+        if usage is not None and getattr(usage, "completion_tokens", None) is not None:
+            input_tokens = usage.prompt_tokens or estimated_input
+            completion_tokens = usage.completion_tokens
+        else:
+            input_tokens, completion_tokens = estimated_input, estimated_completion
+            logger.debug("No usage frame in stream, using estimated token counts")
+        self.update_token_count(input_tokens, completion_tokens)
+        claim_usage = getattr(response, "claim_usage", None)
+        if claim_usage is None or claim_usage():
+            self.limiter.record_usage(completion_tokens)
+
     def check_token_limit(self, input_tokens: int) -> bool:
         """Check if token limits are exceeded"""
         if self.max_input_tokens is not None:
@@ -265,7 +507,9 @@ class LLM:
 
     @staticmethod
     def format_messages(
-        messages: List[Union[dict, Message]], supports_images: bool = False
+        messages: List[Union[dict, Message]],
+        supports_images: bool = False,
+        max_images: Optional[int] = None,
     ) -> List[dict]:
         """
         Format messages for LLM by converting them to OpenAI message format.
@@ -273,6 +517,8 @@ class LLM:
         Args:
             messages: List of messages that can be either dict or Message objects
             supports_images: Flag indicating if the target model supports image inputs
+            max_images: Only attach the images of this many most recent messages
+                (None attaches all)
 
         Returns:
             List[dict]: List of formatted messages in OpenAI format
@@ -291,59 +537,39 @@ class LLM:
         """
         formatted_messages = []
 
-        for message in messages:
-            # Convert Message objects to dictionaries
+        # Older images are left out so their data is never loaded
+        image_budget = max_images if supports_images else 0
+        with_image = set()
+        for i in range(len(messages) - 1, -1, -1):
+            if image_budget is not None and len(with_image) >= image_budget:
+                break
+            message = messages[i]
+            if (
+                message.image_ref
+                if isinstance(message, Message)
+                else isinstance(message, dict) and message.get("base64_image")
+            ):
+                with_image.add(i)
+
+        for i, message in enumerate(messages):
+            include_image = supports_images and i in with_image
+            # Message objects cache their formatted form, so unchanged history
+            # (and its screenshots) is not re-serialized on every step
             if isinstance(message, Message):
-                message = message.to_dict()
-
-            if isinstance(message, dict):
+                message = message.to_request_dict(include_image)
+            elif isinstance(message, dict):
                 # If message is a dict, ensure it has required fields
                 if "role" not in message:
                     raise ValueError("Message dict must contain 'role' field")
-
-                # Process base64 images if present and model supports images
-                if supports_images and message.get("base64_image"):
-                    # Initialize or convert content to appropriate format
-                    if not message.get("content"):
-                        message["content"] = []
-                    elif isinstance(message["content"], str):
-                        message["content"] = [
-                            {"type": "text", "text": message["content"]}
-                        ]
-                    elif isinstance(message["content"], list):
-                        # Convert string items to proper text objects
-                        message["content"] = [
-                            (
-                                {"type": "text", "text": item}
-                                if isinstance(item, str)
-                                else item
-                            )
-                            for item in message["content"]
-                        ]
-
-                    # Add the image to content
-                    message["content"].append(
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{message['base64_image']}"
-                            },
-                        }
-                    )
-
-                    # Remove the base64_image field
-                    del message["base64_image"]
-                # If model doesn't support images but message has base64_image, handle gracefully
-                elif not supports_images and message.get("base64_image"):
-                    # Just remove the base64_image field and keep the text content
-                    del message["base64_image"]
-
-                if "content" in message or "tool_calls" in message:
-                    formatted_messages.append(message)
-                # else: do not include the message
+                # Build a new dict rather than mutating the caller's
+                message = Message.format_request_dict(message, include_image)
             else:
                 raise TypeError(f"Unsupported message type: {type(message)}")
 
+            if "content" in message or "tool_calls" in message:
+                formatted_messages.append(message)
+            # else: do not include the message
+
         # Validate all messages have required fields
         for msg in formatted_messages:
             if msg["role"] not in ROLE_VALUES:
@@ -351,19 +577,14 @@ class LLM:
 
         return formatted_messages
 
-    @retry(
-        wait=wait_random_exponential(min=1, max=60),
-        stop=stop_after_attempt(6),
-        retry=retry_if_exception_type(
-            (OpenAIError, Exception, ValueError)
-        ),  # Don't retry TokenLimitExceeded
-    )
+    @llm_retry()  # Fails fast on open circuits and never retries TokenLimitExceeded
     async def ask(
         self,
         messages: List[Union[dict, Message]],
         system_msgs: Optional[List[Union[dict, Message]]] = None,
         stream: bool = True,
         temperature: Optional[float] = None,
+        sink: Optional[StreamSink] = None,
     ) -> str:
         """
         Send a prompt to the LLM and get the response.
@@ -373,6 +594,8 @@ class LLM:
             system_msgs: Optional system messages to prepend
             stream (bool): Whether to stream the response
             temperature (float): Sampling temperature for the response
+            sink (StreamSink): Optional sink receiving content tokens as they
+                are streamed (use StdoutSink to print them)
 
         Returns:
             str: The generated response
@@ -381,6 +604,8 @@ class LLM:
             TokenLimitExceeded: If token limits are exceeded
             ValueError: If messages are invalid or response is empty
             OpenAIError: If API call fails after retries
+            StreamInterrupted: If the stream fails after tokens reached the
+                sink (not retried)
             Exception: For unexpected errors
         """
         try:
@@ -390,9 +615,13 @@ class LLM:
             # Format system and user messages with image support check
             if system_msgs:
                 system_msgs = self.format_messages(system_msgs, supports_images)
-                messages = system_msgs + self.format_messages(messages, supports_images)
+                messages = system_msgs + self.format_messages(
+                    messages, supports_images, self.max_request_images
+                )
             else:
-                messages = self.format_messages(messages, supports_images)
+                messages = self.format_messages(
+                    messages, supports_images, self.max_request_images
+                )
 
             # Calculate input token count
             input_tokens = self.count_message_tokens(messages)
@@ -416,10 +645,16 @@ class LLM:
                     temperature if temperature is not None else self.temperature
                 )
 
+            cached = self._cached_response(params)
+            if cached is not None:
+                if stream and sink is not None:
+                    await sink.send(cached["content"])
+                return cached["content"]
+
             if not stream:
                 # Non-streaming request
-                response = await self.client.chat.completions.create(
-                    **params, stream=False
+                response = await self._create_completion(
+                    input_tokens, **params, stream=False
                 )
 
                 if not response.choices or not response.choices[0].message.content:
@@ -430,37 +665,53 @@ class LLM:
                     response.usage.prompt_tokens, response.usage.completion_tokens
                 )
 
-                return response.choices[0].message.content
+                content = response.choices[0].message.content
+                self._record_response(params, {"content": content})
+                return content
 
-            # Streaming request, For streaming, update estimated token count before making the request
-            self.update_token_count(input_tokens)
-
-            response = await self.client.chat.completions.create(**params, stream=True)
+            # Streaming request
+            response = await self._create_completion(
+                input_tokens, **params, stream=True
+            )
 
             collected_messages = []
-            completion_text = ""
-            async for chunk in response:
-                chunk_message = chunk.choices[0].delta.content or ""
-                collected_messages.append(chunk_message)
-                completion_text += chunk_message
-                print(chunk_message, end="", flush=True)
-
-            print()  # Newline after streaming
+            usage = None
+            # Fallback for providers that send no usage frame, counted as
+            # the chunks arrive so the full text is never encoded again
+            completion_tokens = 0
+            try:
+                async for chunk in response:
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    chunk_message = chunk.choices[0].delta.content or ""
+                    if not chunk_message:
+                        continue
+                    collected_messages.append(chunk_message)
+                    completion_tokens += self.count_tokens(chunk_message)
+                    if sink is not None:
+                        await sink.send(chunk_message)
+            except Exception as e:
+                if sink is not None and collected_messages:
+                    # The sink already showed part of the answer, a retry
+                    # would send it again
+                    raise StreamInterrupted(e) from e
+                raise
+
             full_response = "".join(collected_messages).strip()
             if not full_response:
                 raise ValueError("Empty response from streaming LLM")
 
-            # estimate completion tokens for streaming response
-            completion_tokens = self.count_tokens(completion_text)
-            logger.info(
-                f"Estimated completion tokens for streaming response: {completion_tokens}"
+            self.update_stream_token_count(
+                input_tokens, completion_tokens, usage, response
             )
-            self.total_completion_tokens += completion_tokens
 
+            self._record_response(params, {"content": full_response})
             return full_response
 
-        except TokenLimitExceeded:
-            # Re-raise token limit errors without logging
+        except (TokenLimitExceeded, CircuitOpenError, LLMCacheMiss):
+            # Re-raise token limit, open-circuit and cache-miss errors without logging
             raise
         except ValueError:
             logger.exception(f"Validation error")
@@ -478,13 +729,7 @@ class LLM:
             logger.exception(f"Unexpected error in ask")
             raise
 
-    @retry(
-        wait=wait_random_exponential(min=1, max=60),
-        stop=stop_after_attempt(6),
-        retry=retry_if_exception_type(
-            (OpenAIError, Exception, ValueError)
-        ),  # Don't retry TokenLimitExceeded
-    )
+    @llm_retry()  # Fails fast on open circuits and never retries TokenLimitExceeded
     async def ask_with_images(
         self,
         messages: List[Union[dict, Message]],
@@ -492,6 +737,7 @@ class LLM:
         system_msgs: Optional[List[Union[dict, Message]]] = None,
         stream: bool = False,
         temperature: Optional[float] = None,
+        sink: Optional[StreamSink] = None,
     ) -> str:
         """
         Send a prompt with images to the LLM and get the response.
@@ -502,6 +748,8 @@ class LLM:
             system_msgs: Optional system messages to prepend
             stream (bool): Whether to stream the response
             temperature (float): Sampling temperature for the response
+            sink (StreamSink): Optional sink receiving content tokens as they
+                are streamed (use StdoutSink to print them)
 
         Returns:
             str: The generated response
@@ -510,6 +758,8 @@ class LLM:
             TokenLimitExceeded: If token limits are exceeded
             ValueError: If messages are invalid or response is empty
             OpenAIError: If API call fails after retries
+            StreamInterrupted: If the stream fails after tokens reached the
+                sink (not retried)
             Exception: For unexpected errors
         """
         try:
@@ -521,7 +771,9 @@ class LLM:
                 )
 
             # Format messages with image support
-            formatted_messages = self.format_messages(messages, supports_images=True)
+            formatted_messages = self.format_messages(
+                messages, supports_images=True, max_images=self.max_request_images
+            )
 
             # Ensure the last message is from the user to attach images
             if not formatted_messages or formatted_messages[-1]["role"] != "user":
@@ -529,15 +781,17 @@ class LLM:
                     "The last message must be from the user to attach images"
                 )
 
-            # Process the last user message to include images
-            last_message = formatted_messages[-1]
+            # Process the last user message to include images. Formatted
+            # messages may be shared with the Message cache, so copy first.
+            last_message = dict(formatted_messages[-1])
+            formatted_messages[-1] = last_message
 
             # Convert content to multimodal format if needed
             content = last_message["content"]
             multimodal_content = (
                 [{"type": "text", "text": content}]
                 if isinstance(content, str)
-                else content
+                else list(content)
                 if isinstance(content, list)
                 else []
             )
@@ -588,35 +842,67 @@ class LLM:
                     temperature if temperature is not None else self.temperature
                 )
 
+            cached = self._cached_response(params)
+            if cached is not None:
+                if stream and sink is not None:
+                    await sink.send(cached["content"])
+                return cached["content"]
+
             # Handle non-streaming request
             if not stream:
-                response = await self.client.chat.completions.create(**params)
+                response = await self._create_completion(input_tokens, **params)
 
                 if not response.choices or not response.choices[0].message.content:
                     raise ValueError("Empty or invalid response from LLM")
 
-                self.update_token_count(response.usage.prompt_tokens)
-                return response.choices[0].message.content
+                self.update_token_count(
+                    response.usage.prompt_tokens, response.usage.completion_tokens
+                )
+                content = response.choices[0].message.content
+                self._record_response(params, {"content": content})
+                return content
 
             # Handle streaming request
-            self.update_token_count(input_tokens)
-            response = await self.client.chat.completions.create(**params)
+            response = await self._create_completion(input_tokens, **params)
 
             collected_messages = []
-            async for chunk in response:
-                chunk_message = chunk.choices[0].delta.content or ""
-                collected_messages.append(chunk_message)
-                print(chunk_message, end="", flush=True)
+            usage = None
+            # Fallback for providers that send no usage frame, counted as
+            # the chunks arrive so the full text is never encoded again
+            completion_tokens = 0
+            try:
+                async for chunk in response:
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    chunk_message = chunk.choices[0].delta.content or ""
+                    if not chunk_message:
+                        continue
+                    collected_messages.append(chunk_message)
+                    completion_tokens += self.count_tokens(chunk_message)
+                    if sink is not None:
+                        await sink.send(chunk_message)
+            except Exception as e:
+                if sink is not None and collected_messages:
+                    # The sink already showed part of the answer, a retry
+                    # would send it again
+                    raise StreamInterrupted(e) from e
+                raise
 
-            print()  # Newline after streaming
             full_response = "".join(collected_messages).strip()
 
             if not full_response:
                 raise ValueError("Empty response from streaming LLM")
 
+            self.update_stream_token_count(
+                input_tokens, completion_tokens, usage, response
+            )
+
+            self._record_response(params, {"content": full_response})
             return full_response
 
-        except TokenLimitExceeded:
+        except (TokenLimitExceeded, CircuitOpenError, LLMCacheMiss):
             raise
         except ValueError as ve:
             logger.error(f"Validation error in ask_with_images: {ve}")
@@ -634,13 +920,7 @@ class LLM:
             logger.error(f"Unexpected error in ask_with_images: {e}")
             raise
 
-    @retry(
-        wait=wait_random_exponential(min=1, max=60),
-        stop=stop_after_attempt(6),
-        retry=retry_if_exception_type(
-            (OpenAIError, Exception, ValueError)
-        ),  # Don't retry TokenLimitExceeded
-    )
+    @llm_retry()  # Fails fast on open circuits and never retries TokenLimitExceeded
     async def ask_tool(
         self,
         messages: List[Union[dict, Message]],
@@ -649,6 +929,9 @@ class LLM:
         tools: Optional[List[dict]] = None,
         tool_choice: TOOL_CHOICE_TYPE = ToolChoice.AUTO,  # type: ignore
         temperature: Optional[float] = None,
+        stream: bool = False,
+        on_content: Optional[Callable[[str], Any]] = None,
+        on_tool_call: Optional[Callable[[ChatCompletionMessageToolCall], Any]] = None,
         **kwargs,
     ) -> ChatCompletionMessage | None:
         """
@@ -661,6 +944,12 @@ class LLM:
             tools: List of tools to use
             tool_choice: Tool choice strategy
             temperature: Sampling temperature for the response
+            stream: Whether to stream the response and assemble tool calls incrementally
+            on_content: Optional callback (sync or async) receiving content tokens
+                as they are streamed
+            on_tool_call: Optional callback (sync or async) receiving each tool
+                call as soon as its arguments are complete, before the rest of
+                the message has arrived
             **kwargs: Additional completion arguments
 
         Returns:
@@ -670,6 +959,8 @@ class LLM:
             TokenLimitExceeded: If token limits are exceeded
             ValueError: If tools, tool_choice, or messages are invalid
             OpenAIError: If API call fails after retries
+            StreamInterrupted: If the stream fails after a callback was called
+                (not retried)
             Exception: For unexpected errors
         """
         try:
@@ -683,9 +974,13 @@ class LLM:
             # Format messages
             if system_msgs:
                 system_msgs = self.format_messages(system_msgs, supports_images)
-                messages = system_msgs + self.format_messages(messages, supports_images)
+                messages = system_msgs + self.format_messages(
+                    messages, supports_images, self.max_request_images
+                )
             else:
-                messages = self.format_messages(messages, supports_images)
+                messages = self.format_messages(
+                    messages, supports_images, self.max_request_images
+                )
 
             # Calculate input token count
             input_tokens = self.count_message_tokens(messages)
@@ -728,9 +1023,49 @@ class LLM:
                     temperature if temperature is not None else self.temperature
                 )
 
-            params["stream"] = False  # Always use non-streaming for tool requests
-            response: ChatCompletion = await self.client.chat.completions.create(
-                **params
+            cached = self._cached_response(params)
+            if cached is not None:
+                message = ChatCompletionMessage.model_validate(cached["message"])
+                if stream:
+                    # Replay the callbacks a live stream would have made
+                    if on_content and message.content:
+                        await _maybe_await(on_content(message.content))
+                    if on_tool_call:
+                        for call in message.tool_calls or []:
+                            await _maybe_await(on_tool_call(call))
+                return message
+
+            if stream:
+                # Streaming request
+                params["stream"] = True
+                response = await self._create_completion(input_tokens, **params)
+
+                assembler = ToolCallStreamAssembler(
+                    on_content, on_tool_call, count_tokens=self.count_tokens
+                )
+                try:
+                    async for chunk in response:
+                        await assembler.feed(chunk)
+                    message = await assembler.finish()
+                except Exception as e:
+                    if assembler.delivered:
+                        # Streamed tool calls may already be running, a retry
+                        # would run them again
+                        raise StreamInterrupted(e) from e
+                    raise
+
+                if not message.content and not message.tool_calls:
+                    raise ValueError("Empty response from streaming LLM")
+
+                self.update_stream_token_count(
+                    input_tokens, assembler.completion_tokens, assembler.usage, response
+                )
+                self._record_response(params, {"message": message.model_dump()})
+                return message
+
+            params["stream"] = False
+            response: ChatCompletion = await self._create_completion(
+                input_tokens, **params
             )
 
             # Check if response is valid
@@ -744,10 +1079,12 @@ class LLM:
                 response.usage.prompt_tokens, response.usage.completion_tokens
             )
 
-            return response.choices[0].message
+            message = response.choices[0].message
+            self._record_response(params, {"message": message.model_dump()})
+            return message
 
-        except TokenLimitExceeded:
-            # Re-raise token limit errors without logging
+        except (TokenLimitExceeded, CircuitOpenError, LLMCacheMiss):
+            # Re-raise token limit, open-circuit and cache-miss errors without logging
             raise
         except ValueError as ve:
             logger.error(f"Validation error in ask_tool: {ve}")
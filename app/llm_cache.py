@@ -0,0 +1,158 @@
+"""Content-addressed record/replay cache for LLM responses.
+
+Responses are stored on disk under a hash of the request (model, formatted
+messages, tools, tool_choice and temperature), so repeated agent runs,
+evals and planning prompts can be answered without network calls.
+
+Modes:
+    off: the cache is not used.
+    record: cached responses are replayed, misses go to the API and are stored.
+    replay: only cached responses are served, a miss raises LLMCacheMiss.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.config import LLMCacheSettings, config
+from app.exceptions import LLMCacheMiss
+from app.logger import logger
+from app.metrics import metrics
+
+
+# Request fields that determine the response
+CACHE_KEY_FIELDS = ("model", "messages", "tools", "tool_choice", "temperature")
+
+
+class LLMCacheMode(str, Enum):
+    OFF = "off"
+    RECORD = "record"
+    REPLAY = "replay"
+
+
+def cache_key(params: Dict[str, Any]) -> str:
+    """Hash the response-determining fields of a chat completion request"""
+    payload = {field: params.get(field) for field in CACHE_KEY_FIELDS}
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Disk-backed response store with least-recently-used eviction"""
+
+    def __init__(
+        self,
+        directory: Path,
+        mode: LLMCacheMode = LLMCacheMode.RECORD,
+        max_size_mb: float = 512,
+    ):
+        self.directory = Path(directory)
+        self.mode = LLMCacheMode(mode)
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        # key -> file size, least recently used first
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._load_index()
+
+    @classmethod
+    def from_settings(
+        cls, settings: Optional[LLMCacheSettings] = None
+    ) -> Optional["LLMResponseCache"]:
+        """Create the cache described by the settings, or None when it is off"""
+        settings = settings or config.llm_cache or LLMCacheSettings()
+        if LLMCacheMode(settings.mode) == LLMCacheMode.OFF:
+            return None
+        directory = (
+            Path(settings.directory)
+            if settings.directory
+            else config.root_path / "cache" / "llm"
+        )
+        return cls(directory, settings.mode, settings.max_size_mb)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _load_index(self) -> None:
+        if not self.directory.exists():
+            return
+        entries = []
+        for path in self.directory.glob("*/*.json"):
+            stat = path.stat()
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._size += size
+
+    def lookup(self, params: Dict[str, Any]) -> Optional[dict]:
+        """Return the recorded response for a request, if any.
+
+        Raises:
+            LLMCacheMiss: In replay mode when the request was never recorded
+        """
+        if self.mode == LLMCacheMode.OFF:
+            return None
+        key = cache_key(params)
+        path = self._path(key)
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+
+        if entry is None:
+            metrics.incr("llm_cache_misses_total", mode=self.mode.value)
+            if self.mode == LLMCacheMode.REPLAY:
+                raise LLMCacheMiss(key)
+            return None
+
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+        try:
+            # mtime doubles as the last-used time when the index is rebuilt
+            os.utime(path)
+        except OSError:
+            pass
+        metrics.incr("llm_cache_hits_total", mode=self.mode.value)
+        return entry["response"]
+
+    def store(self, params: Dict[str, Any], response: dict) -> None:
+        """Record a response (only in record mode)"""
+        if self.mode != LLMCacheMode.RECORD:
+            return
+        key = cache_key(params)
+        path = self._path(key)
+        data = json.dumps(
+            {"model": params.get("model"), "response": response},
+            ensure_ascii=False,
+            default=str,
+        ).encode("utf-8")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to record LLM response {key}: {e}")
+            return
+
+        with self._lock:
+            self._size += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._size > self.max_size and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._size -= size
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+            metrics.incr("llm_cache_evictions_total")
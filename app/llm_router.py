@@ -0,0 +1,253 @@
+"""Latency-aware routing across equivalent LLM endpoints.
+
+A logical model can be served by several endpoints (e.g. the same model on
+Azure and on a compatible proxy). ``LLMRouter`` tracks an EWMA of latency and
+error rate for each endpoint, sends every request to the endpoint with the
+lowest expected latency, fails over to the next one on endpoint failures
+(5xx, timeouts, rate limits, open circuits) and can optionally hedge a slow
+request by racing it against the next-best endpoint.
+"""
+
+import asyncio
+import random
+import time
+from typing import Any, List, Optional
+
+from openai import AsyncAzureOpenAI, AsyncOpenAI
+
+from app.bedrock import BedrockClient
+from app.circuit_breaker import (
+    CircuitBreaker,
+    CircuitState,
+    get_retry_after,
+    is_endpoint_failure,
+    retry_budget,
+)
+from app.config import LLMSettings
+from app.exceptions import CircuitOpenError
+from app.logger import logger
+from app.metrics import metrics
+
+
+def create_client(
+    api_type: str, base_url: str, api_key: str, api_version: Optional[str] = None
+):
+    """Create the chat completions client for an endpoint"""
+    if api_type == "azure":
+        return AsyncAzureOpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            api_version=api_version,
+        )
+    elif api_type == "aws":
+        return BedrockClient()
+    return AsyncOpenAI(api_key=api_key, base_url=base_url)
+
+
+def should_failover(error: BaseException) -> bool:
+    """Whether another endpoint may succeed where this one failed"""
+    return isinstance(error, CircuitOpenError) or is_endpoint_failure(error)
+
+
+class RoutedEndpoint:
+    """An endpoint with its client, breaker and observed health"""
+
+    # Weight of the newest sample in the moving averages
+    EWMA_ALPHA = 0.3
+
+    def __init__(self, name: str, model: str, client: Any):
+        self.name = name
+        self.model = model
+        self.client = client
+        self.breaker = CircuitBreaker.for_endpoint(name)
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self.inflight = 0
+
+    @property
+    def available(self) -> bool:
+        return self.breaker.state != CircuitState.OPEN
+
+    def expected_latency(self) -> float:
+        """Latency adjusted for load and error rate; unmeasured endpoints score 0"""
+        latency = self.latency_ewma or 0.0
+        return latency * (1 + self.inflight) / max(0.05, 1 - self.error_ewma)
+
+    def _record(self, latency: Optional[float], failed: bool) -> None:
+        alpha = self.EWMA_ALPHA
+        if latency is not None:
+            self.latency_ewma = (
+                latency
+                if self.latency_ewma is None
+                else alpha * latency + (1 - alpha) * self.latency_ewma
+            )
+        self.error_ewma = alpha * float(failed) + (1 - alpha) * self.error_ewma
+
+    async def create(self, **params):
+        """Call this endpoint through its circuit breaker"""
+        self.breaker.before_call()
+        retry_budget.record_request()
+        self.inflight += 1
+        start = time.monotonic()
+        try:
+            response = await self.client.chat.completions.create(
+                **{**params, "model": self.model}
+            )
+        except Exception as e:
+            if is_endpoint_failure(e):
+                self.breaker.record_failure(get_retry_after(e))
+                self._record(None, failed=True)
+                metrics.incr("llm_endpoint_errors_total", endpoint=self.name)
+            else:
+                # The endpoint answered, the request itself was at fault
+                self.breaker.record_success()
+            raise
+        except BaseException:
+            # Cancelled (lost a hedge race, timed out, client went away): says
+            # nothing about endpoint health, but hand back a half-open slot
+            self.breaker.release()
+            raise
+        finally:
+            self.inflight -= 1
+
+        latency = time.monotonic() - start
+        self.breaker.record_success()
+        self._record(latency, failed=False)
+        metrics.observe("llm_endpoint_latency_seconds", latency, endpoint=self.name)
+        return response
+
+
+class LLMRouter:
+    """Route chat completion requests across equivalent endpoints"""
+
+    # Share of requests sent to a random healthy endpoint to keep its stats fresh
+    EXPLORE_PROBABILITY = 0.05
+
+    def __init__(
+        self, endpoints: List[RoutedEndpoint], hedge_after: Optional[float] = None
+    ):
+        if not endpoints:
+            raise ValueError("LLMRouter needs at least one endpoint")
+        self.endpoints = endpoints
+        self.hedge_after = hedge_after
+
+    @classmethod
+    def from_settings(cls, settings: LLMSettings) -> "LLMRouter":
+        """Build a router for the primary endpoint plus any configured equivalents"""
+        endpoints = [
+            RoutedEndpoint(
+                name=f"{settings.api_type or 'openai'}:{settings.base_url}",
+                model=settings.model,
+                client=create_client(
+                    settings.api_type,
+                    settings.base_url,
+                    settings.api_key,
+                    settings.api_version,
+                ),
+            )
+        ]
+        for endpoint in settings.endpoints:
+            api_type = endpoint.api_type or settings.api_type
+            endpoints.append(
+                RoutedEndpoint(
+                    name=endpoint.name or f"{api_type or 'openai'}:{endpoint.base_url}",
+                    model=endpoint.model or settings.model,
+                    client=create_client(
+                        api_type,
+                        endpoint.base_url,
+                        endpoint.api_key,
+                        endpoint.api_version or settings.api_version,
+                    ),
+                )
+            )
+        return cls(endpoints, hedge_after=settings.hedge_after)
+
+    @property
+    def primary(self) -> RoutedEndpoint:
+        return self.endpoints[0]
+
+    def ranked(self) -> List[RoutedEndpoint]:
+        """Available endpoints, best first"""
+        available = [e for e in self.endpoints if e.available]
+        ranked = sorted(available, key=lambda e: e.expected_latency())
+        if len(ranked) > 1 and random.random() < self.EXPLORE_PROBABILITY:
+            explore = random.choice(ranked[1:])
+            ranked.remove(explore)
+            ranked.insert(0, explore)
+        return ranked
+
+    async def create(self, **params):
+        """Send a chat completion request, failing over between endpoints"""
+        candidates = self.ranked()
+        if not candidates:
+            # Every circuit is open: fail fast with the soonest recovery
+            retry_after = min(
+                e.breaker.snapshot()["retry_after"] for e in self.endpoints
+            )
+            raise CircuitOpenError(
+                ",".join(e.name for e in self.endpoints), retry_after
+            )
+
+        last_error: Optional[BaseException] = None
+        # Endpoints already called, including backups started by a hedge
+        tried: List[RoutedEndpoint] = []
+        untried = candidates
+        while untried:
+            endpoint = untried[0]
+            backup = untried[1] if len(untried) > 1 else None
+            tried.append(endpoint)
+            try:
+                if self.hedge_after is not None and backup:
+                    return await self._hedged_create(endpoint, backup, params, tried)
+                return await endpoint.create(**params)
+            except Exception as e:
+                if not should_failover(e):
+                    raise
+                last_error = e
+            untried = [e for e in candidates if e not in tried]
+            if untried:
+                logger.warning(
+                    f"LLM endpoint {endpoint.name} failed ({type(last_error).__name__}), "
+                    f"failing over to {untried[0].name}"
+                )
+                metrics.incr("llm_router_failovers_total", endpoint=endpoint.name)
+        raise last_error
+
+    async def _hedged_create(
+        self,
+        primary: RoutedEndpoint,
+        backup: RoutedEndpoint,
+        params: dict,
+        tried: List[RoutedEndpoint],
+    ):
+        """Race the backup endpoint against the primary once hedge_after elapses.
+
+        The backup is added to tried when it is started.
+        """
+        primary_task = asyncio.create_task(primary.create(**params))
+        done, _ = await asyncio.wait({primary_task}, timeout=self.hedge_after)
+        if done:
+            return primary_task.result()
+
+        metrics.incr("llm_router_hedges_total", endpoint=primary.name)
+        tried.append(backup)
+        backup_task = asyncio.create_task(backup.create(**params))
+        pending = {primary_task, backup_task}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup_task:
+                            metrics.incr(
+                                "llm_router_hedge_wins_total", endpoint=backup.name
+                            )
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,97 @@
+"""Sinks that receive streamed LLM tokens.
+
+``LLM.ask`` and ``LLM.ask_with_images`` hand each streamed content token to
+an optional sink instead of writing it to stdout. Consumers pick the sink
+that fits: a queue to iterate tokens from another task, a callback, an SSE
+bridge for HTTP responses, or ``StdoutSink`` for debugging in a terminal.
+
+Example:
+    >>> sink = SSESink()
+    >>> task = asyncio.create_task(
+    ...     stream_to_sink(llm.ask(messages, stream=True, sink=sink), sink)
+    ... )
+    >>> async for event in sink.events():
+    ...     yield event
+    >>> answer = await task
+"""
+
+import asyncio
+import json
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+
+class StreamSink(ABC):
+    """Receives content tokens as they are streamed"""
+
+    @abstractmethod
+    async def send(self, token: str) -> None:
+        """Handle one streamed token"""
+
+    async def close(self) -> None:
+        """Called once the stream has ended (successfully or not)"""
+
+
+class StdoutSink(StreamSink):
+    """Print tokens to stdout, for debugging only"""
+
+    async def send(self, token: str) -> None:
+        print(token, end="", flush=True)
+
+    async def close(self) -> None:
+        print()
+
+
+class CallbackSink(StreamSink):
+    """Forward tokens to a sync or async callback"""
+
+    def __init__(self, callback: Callable[[str], Any]):
+        self.callback = callback
+
+    async def send(self, token: str) -> None:
+        result = self.callback(token)
+        if asyncio.iscoroutine(result):
+            await result
+
+
+class QueueSink(StreamSink):
+    """Put tokens on an asyncio queue; iterate the sink to read them back"""
+
+    _END = object()
+
+    def __init__(self, maxsize: int = 0):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    async def send(self, token: str) -> None:
+        await self.queue.put(token)
+
+    async def close(self) -> None:
+        await self.queue.put(self._END)
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        while True:
+            token = await self.queue.get()
+            if token is self._END:
+                return
+            yield token
+
+
+class SSESink(QueueSink):
+    """Bridge tokens to Server-Sent Events for a streaming HTTP response"""
+
+    async def events(self, field: str = "content") -> AsyncIterator[str]:
+        """Yield ``data: {"<field>": token}`` events until the stream ends"""
+        async for token in self:
+            yield f"data: {json.dumps({field: token}, ensure_ascii=False)}\n\n"
+
+
+async def stream_to_sink(request: Awaitable[T], sink: Optional[StreamSink]) -> T:
+    """Await a streaming LLM call and close its sink when it finishes or fails"""
+    try:
+        return await request
+    finally:
+        if sink is not None:
+            await sink.close()
@@ -0,0 +1,207 @@
+"""Disk cache of fetched web pages shared by the web tools.
+
+WebSearch stores the extracted text of pages it fetches and Crawl4aiTool
+stores the markdown it crawls, both under a hash of the URL, so a page an
+agent revisits is not downloaded (or rendered) again. Entries are fresh for
+``ttl`` seconds; after that WebSearch revalidates them with the stored
+ETag / Last-Modified, and an unchanged page costs a 304 instead of a
+download. The directory is kept under a size budget, least recently used
+pages are evicted first.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel, Field
+
+from app.config import PageCacheSettings, config
+from app.logger import logger
+from app.metrics import metrics
+
+
+class CachedPage(BaseModel):
+    """What the web tools know about one URL"""
+
+    url: str
+    text: Optional[str] = Field(None, description="Extracted plain text (WebSearch)")
+    markdown: Optional[str] = Field(None, description="Crawled markdown (Crawl4aiTool)")
+    title: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = Field(default_factory=time.time)
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+def page_key(url: str) -> str:
+    return hashlib.sha256(url.strip().encode("utf-8")).hexdigest()
+
+
+class PageCache:
+    """Disk-backed page store with TTL freshness and least-recently-used eviction"""
+
+    def __init__(self, directory: Path, ttl: float = 3600, max_size_mb: float = 256):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        # key -> file size, least recently used first
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._load_index()
+
+    @classmethod
+    def from_settings(
+        cls, settings: Optional[PageCacheSettings] = None
+    ) -> Optional["PageCache"]:
+        """Create the cache described by the settings, or None when it is off"""
+        settings = settings or config.page_cache or PageCacheSettings()
+        if not settings.enabled:
+            return None
+        directory = (
+            Path(settings.directory)
+            if settings.directory
+            else config.root_path / "cache" / "pages"
+        )
+        return cls(directory, settings.ttl, settings.max_size_mb)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _load_index(self) -> None:
+        if not self.directory.exists():
+            return
+        entries = []
+        for path in self.directory.glob("*/*.json"):
+            stat = path.stat()
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._size += size
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        return page.age() < self.ttl
+
+    def get(
+        self, url: str, tool: str = "", content: Optional[str] = None
+    ) -> Optional[CachedPage]:
+        """Return the stored page for a URL, fresh or not, and count the lookup.
+
+        With content ("text" or "markdown"), pages without it count as misses.
+        """
+        key = page_key(url)
+        path = self._path(key)
+        page = self._read(path)
+        if page is None or (content and not getattr(page, content)):
+            metrics.incr("page_cache_lookups_total", tool=tool, result="miss")
+            return None
+
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+        try:
+            # mtime doubles as the last-used time when the index is rebuilt
+            os.utime(path)
+        except OSError:
+            pass
+        result = "hit" if self.is_fresh(page) else "stale"
+        metrics.incr("page_cache_lookups_total", tool=tool, result=result)
+        return page
+
+    @staticmethod
+    def _read(path: Path) -> Optional[CachedPage]:
+        try:
+            return CachedPage.model_validate_json(path.read_bytes())
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url: str, **fields: Any) -> CachedPage:
+        """Store what a tool learned about a URL, keeping fields other tools stored"""
+        key = page_key(url)
+        path = self._path(key)
+        try:
+            existing = json.loads(path.read_bytes())
+        except (OSError, ValueError):
+            existing = {}
+        if existing and not self._same_version(existing, fields):
+            # The other tool's content may describe an older version of the page
+            existing = {
+                name: value
+                for name, value in existing.items()
+                if name not in ("text", "markdown", "title", "etag", "last_modified")
+            }
+        metadata = {**existing.get("metadata", {}), **fields.pop("metadata", {})}
+        page = CachedPage(
+            **{
+                **existing,
+                **fields,
+                "url": url,
+                "metadata": metadata,
+                "fetched_at": time.time(),
+            }
+        )
+        data = page.model_dump_json().encode("utf-8")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to cache page {url}: {e}")
+            return page
+
+        with self._lock:
+            self._size += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._evict()
+        metrics.set_gauge("page_cache_bytes", self._size)
+        return page
+
+    @staticmethod
+    def _same_version(existing: Dict[str, Any], fields: Dict[str, Any]) -> bool:
+        """Whether validators show the stored page and the new one are the same"""
+        validators = [
+            name
+            for name in ("etag", "last_modified")
+            if fields.get(name) and existing.get(name)
+        ]
+        return bool(validators) and all(
+            fields[name] == existing[name] for name in validators
+        )
+
+    def touch(self, url: str) -> None:
+        """Mark a stored page as just revalidated (e.g. after a 304)"""
+        page = self._read(self._path(page_key(url)))
+        if page is not None:
+            self.put(url, **page.model_dump(exclude={"url", "fetched_at"}))
+
+    def _evict(self) -> None:
+        while self._size > self.max_size and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._size -= size
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+            metrics.incr("page_cache_evictions_total")
+
+
+_page_cache: Optional[PageCache] = None
+_page_cache_loaded = False
+
+
+def get_page_cache() -> Optional[PageCache]:
+    """The process-wide page cache, or None when it is disabled"""
+    global _page_cache, _page_cache_loaded
+    if not _page_cache_loaded:
+        _page_cache = PageCache.from_settings()
+        _page_cache_loaded = True
+    return _page_cache
@@ -0,0 +1,311 @@
+"""Concurrency limiting, rate budgeting and request coalescing for LLM calls.
+
+Every ``LLM`` instance owns an ``LLMRequestLimiter`` that bounds in-flight
+requests and enforces requests-per-minute and tokens-per-minute budgets
+with token buckets. Waiting requests are granted strictly by priority, so
+interactive chat goes ahead of queued background work. ``RequestCoalescer``
+lets identical deterministic requests that are in flight at the same time
+share a single upstream call.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.exceptions import SharedStreamCancelled
+from app.logger import logger
+from app.metrics import metrics
+
+
+class Priority(IntEnum):
+    """Request priorities, lower values are served first"""
+
+    INTERACTIVE = 0
+    DEFAULT = 1
+    BACKGROUND = 2
+
+
+_current_priority: ContextVar[Priority] = ContextVar(
+    "llm_priority", default=Priority.DEFAULT
+)
+
+
+@contextmanager
+def llm_priority(priority: Priority):
+    """Run the LLM calls made inside the block at the given priority.
+
+    Example:
+        >>> with llm_priority(Priority.INTERACTIVE):
+        ...     answer = await llm.ask(messages)
+    """
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority() -> Priority:
+    """Priority for LLM calls made in the current context"""
+    return _current_priority.get()
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``per_minute`` tokens per minute"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self._last = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` tokens are available (0 if they are now)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        """Take tokens; the balance may go negative to record actual usage"""
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class LLMRequestLimiter:
+    """Bound concurrent LLM requests and enforce RPM/TPM budgets by priority"""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: Optional[int] = None,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.request_bucket = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.token_bucket = (
+            TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        )
+        self.active = 0
+        self._waiters: List[Tuple[int, int, float, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_concurrency or self.request_bucket or self.token_bucket)
+
+    async def acquire(
+        self, tokens: int = 0, priority: Optional[Priority] = None
+    ) -> None:
+        """Wait for a slot; ``tokens`` is the estimated token cost of the request"""
+        if not self.enabled:
+            return
+        priority = current_priority() if priority is None else priority
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            self._waiters, (int(priority), next(self._sequence), tokens, future)
+        )
+        metrics.set_gauge("llm_queue_depth", len(self._waiters), llm=self.name)
+        self._dispatch()
+
+        start = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just before the cancellation landed, give it back
+                self.release()
+            else:
+                self._waiters = [w for w in self._waiters if w[3] is not future]
+                heapq.heapify(self._waiters)
+            raise
+        finally:
+            metrics.set_gauge("llm_queue_depth", len(self._waiters), llm=self.name)
+
+        waited = time.monotonic() - start
+        metrics.observe(
+            "llm_queue_wait_seconds", waited, llm=self.name, priority=priority.name
+        )
+        if waited > 1:
+            logger.debug(f"LLM request waited {waited:.1f}s for a {self.name} slot")
+
+    def release(self) -> None:
+        """Return a slot taken by ``acquire``"""
+        if not self.enabled:
+            return
+        self.active = max(0, self.active - 1)
+        metrics.set_gauge("llm_active_requests", self.active, llm=self.name)
+        self._dispatch()
+
+    def record_usage(self, extra_tokens: int) -> None:
+        """Charge tokens that were not part of the estimate (e.g. completion tokens)"""
+        if self.token_bucket and extra_tokens > 0:
+            self.token_bucket.consume(extra_tokens)
+
+    def release_after(self, stream: Any) -> Any:
+        """Hold the slot until a streamed response has been fully consumed"""
+        if not self.enabled:
+            return stream
+
+        async def iterate():
+            try:
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                self.release()
+
+        return iterate()
+
+    def _dispatch(self) -> None:
+        """Grant slots to waiters in priority order while budgets allow"""
+        while self._waiters:
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.max_concurrency and self.active >= self.max_concurrency:
+                return
+
+            delay = max(
+                self.request_bucket.wait_time(1) if self.request_bucket else 0.0,
+                self.token_bucket.wait_time(tokens) if self.token_bucket else 0.0,
+            )
+            if delay > 0:
+                # Head-of-line waits so lower priorities can't starve it
+                self._schedule_dispatch(future.get_loop(), delay)
+                return
+
+            heapq.heappop(self._waiters)
+            if self.request_bucket:
+                self.request_bucket.consume(1)
+            if self.token_bucket:
+                self.token_bucket.consume(tokens)
+            self.active += 1
+            metrics.set_gauge("llm_active_requests", self.active, llm=self.name)
+            future.set_result(None)
+
+    def _schedule_dispatch(self, loop: asyncio.AbstractEventLoop, delay: float):
+        if self._timer is not None and not self._timer.cancelled():
+            self._timer.cancel()
+        self._timer = loop.call_later(delay, self._dispatch)
+
+
+class SharedStream:
+    """Replay one upstream stream to any number of consumers"""
+
+    def __init__(self, stream: Any, on_done: Optional[Callable[[], None]] = None):
+        self._upstream = stream.__aiter__()
+        self._buffer: List[Any] = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._lock = asyncio.Lock()
+        self._on_done = on_done
+        self._usage_claimed = False
+
+    def claim_usage(self) -> bool:
+        """True for the first caller only, so the stream is charged to rate limits once"""
+        claimed, self._usage_claimed = self._usage_claimed, True
+        return not claimed
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        index = 0
+        while True:
+            if index < len(self._buffer):
+                yield self._buffer[index]
+                index += 1
+                continue
+            if self._done:
+                if self._error:
+                    raise self._error
+                return
+            async with self._lock:
+                if index < len(self._buffer) or self._done:
+                    continue
+                try:
+                    self._buffer.append(await self._upstream.__anext__())
+                except StopAsyncIteration:
+                    self._finish()
+                except Exception as e:
+                    self._error = e
+                    self._finish()
+                except BaseException:
+                    # Cancelled while reading: the upstream iterator is closed,
+                    # fail the other consumers instead of ending their streams
+                    self._error = SharedStreamCancelled()
+                    self._finish()
+                    raise
+
+    def _finish(self) -> None:
+        self._done = True
+        if self._on_done:
+            self._on_done()
+
+
+class _LeaderCancelled(Exception):
+    """The caller running a coalesced request was cancelled before it finished"""
+
+
+class RequestCoalescer:
+    """Share identical in-flight requests between callers"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def run(
+        self, key: str, factory: Callable[[], Awaitable[Any]], stream: bool = False
+    ) -> Any:
+        """Return the in-flight result for ``key`` or start it with ``factory``"""
+        while key in self._inflight:
+            metrics.incr("llm_coalesced_requests_total", llm=self.name)
+            try:
+                return await asyncio.shield(self._inflight[key])
+            except _LeaderCancelled:
+                # The cancellation belongs to the leader, not to us: run the
+                # request again (the first follower back becomes the leader)
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await factory()
+        except BaseException as e:
+            self._forget(key, future)
+            if not future.done():
+                future.set_exception(
+                    e if isinstance(e, Exception) else _LeaderCancelled()
+                )
+                # Mark retrieved so an unobserved failure is not reported
+                future.exception()
+            raise
+
+        if stream:
+            # Streams stay joinable until the last chunk has been read
+            result = SharedStream(result, on_done=lambda: self._forget(key, future))
+        else:
+            self._forget(key, future)
+        future.set_result(result)
+        return result
+
+    def _forget(self, key: str, future: asyncio.Future) -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
@@ -1,7 +1,11 @@
+import json
+from collections import deque
 from enum import Enum
-from typing import Any, List, Literal, Optional, Union
+from typing import Any, Deque, Dict, List, Literal, Optional, Tuple, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr, model_validator
+
+from app.blob_store import image_store
 
 
 class Role(str, Enum):
@@ -59,7 +63,30 @@ class Message(BaseModel):
     tool_calls: Optional[List[ToolCall]] = Field(default=None)
     name: Optional[str] = Field(default=None)
     tool_call_id: Optional[str] = Field(default=None)
-    base64_image: Optional[str] = Field(default=None)
+    # Key of the base64 image in the image store; see the base64_image property
+    image_ref: Optional[str] = Field(default=None)
+
+    @model_validator(mode="before")
+    @classmethod
+    def _store_image(cls, data: Any) -> Any:
+        """Move a ``base64_image`` argument out of line into the image store"""
+        if isinstance(data, dict) and "base64_image" in data:
+            data = dict(data)
+            base64_image = data.pop("base64_image")
+            if base64_image:
+                data["image_ref"] = image_store.put(base64_image)
+        return data
+
+    @property
+    def base64_image(self) -> Optional[str]:
+        """The image data, read back from the image store"""
+        if not self.image_ref:
+            return None
+        try:
+            return image_store.get(self.image_ref)
+        except KeyError:
+            # An old screenshot evicted from the store's disk budget
+            return None
 
     def __add__(self, other) -> List["Message"]:
         """支持 Message + list 或 Message + Message 的操作"""
@@ -81,21 +108,90 @@ class Message(BaseModel):
                 f"unsupported operand type(s) for +: '{type(other).__name__}' and '{type(self).__name__}'"
             )
 
+    # Serialized forms, rebuilt only after a field is reassigned
+    _dict_cache: Optional[dict] = PrivateAttr(default=None)
+    _request_cache: Dict[bool, dict] = PrivateAttr(default_factory=dict)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name == "base64_image":
+            name, value = "image_ref", image_store.put(value) if value else None
+        super().__setattr__(name, value)
+        if name in type(self).model_fields:
+            self._dict_cache = None
+            self._request_cache.clear()
+
+    def _base_dict(self) -> dict:
+        """Cached dict form without the image, so no image data is pinned"""
+        if self._dict_cache is None:
+            message = {"role": self.role}
+            if self.content is not None:
+                message["content"] = self.content
+            if self.tool_calls is not None:
+                message["tool_calls"] = [
+                    tool_call.model_dump() for tool_call in self.tool_calls
+                ]
+            if self.name is not None:
+                message["name"] = self.name
+            if self.tool_call_id is not None:
+                message["tool_call_id"] = self.tool_call_id
+            self._dict_cache = message
+        return self._dict_cache
+
     def to_dict(self) -> dict:
         """Convert message to dictionary format"""
-        message = {"role": self.role}
-        if self.content is not None:
-            message["content"] = self.content
-        if self.tool_calls is not None:
-            message["tool_calls"] = [tool_call.dict() for tool_call in self.tool_calls]
-        if self.name is not None:
-            message["name"] = self.name
-        if self.tool_call_id is not None:
-            message["tool_call_id"] = self.tool_call_id
-        if self.base64_image is not None:
+        message = dict(self._base_dict())
+        if self.image_ref is not None:
             message["base64_image"] = self.base64_image
         return message
 
+    def to_request_dict(self, supports_images: bool = False) -> dict:
+        """API form of this message (see ``format_request_dict``), cached.
+
+        The image is materialized only when ``supports_images`` is set; asking
+        for the text-only form also releases a cached form holding the image.
+        The returned dict is shared between calls and must not be mutated.
+        """
+        include_image = supports_images and self.image_ref is not None
+        if not include_image:
+            self._request_cache.pop(True, None)
+        formatted = self._request_cache.get(include_image)
+        if formatted is None:
+            message = self._base_dict()
+            if include_image:
+                message = {**message, "base64_image": self.base64_image}
+            formatted = self.format_request_dict(message, supports_images)
+            self._request_cache[include_image] = formatted
+        return formatted
+
+    @staticmethod
+    def format_request_dict(message: dict, supports_images: bool = False) -> dict:
+        """Turn ``base64_image`` into an image content part without mutating ``message``"""
+        if "base64_image" not in message:
+            return message
+        base64_image = message["base64_image"]
+        formatted = {k: v for k, v in message.items() if k != "base64_image"}
+        if not (supports_images and base64_image):
+            return formatted
+
+        content = message.get("content")
+        if not content:
+            parts = []
+        elif isinstance(content, str):
+            parts = [{"type": "text", "text": content}]
+        else:
+            parts = [
+                {"type": "text", "text": item} if isinstance(item, str) else item
+                for item in content
+            ]
+        parts.append(
+            {
+                "type": "image_url",
+                "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"},
+            }
+        )
+        formatted["content"] = parts
+        return formatted
+
     @classmethod
     def user_message(
         cls, content: str, base64_image: Optional[str] = None
@@ -156,27 +252,280 @@ class Message(BaseModel):
         )
 
 
+# Rough token estimates used for memory budgeting (no tokenizer in this layer)
+CHARS_PER_TOKEN = 3
+IMAGE_TOKENS = 1000
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_message_tokens(message: Message) -> int:
+    """Cheap, conservative token estimate for a message"""
+    chars = len(message.content or "")
+    for call in message.tool_calls or []:
+        chars += len(call.function.name) + len(call.function.arguments or "")
+    tokens = MESSAGE_OVERHEAD_TOKENS + chars // CHARS_PER_TOKEN
+    if message.image_ref:
+        tokens += IMAGE_TOKENS
+    return tokens
+
+
 class Memory(BaseModel):
     messages: List[Message] = Field(default_factory=list)
     max_messages: int = Field(default=100)
+    max_tokens: Optional[int] = Field(
+        default=64000,
+        description="Token budget for the stored conversation (None disables compaction)",
+    )
+    keep_recent: int = Field(
+        default=6, description="Most recent messages that are never elided"
+    )
+    elided_observation_chars: int = Field(
+        default=300, description="Characters kept from an elided old observation"
+    )
+    response_window: int = Field(
+        default=20,
+        description="Recent assistant responses a new one is compared with for loop detection",
+    )
+    _pinned: List[Message] = PrivateAttr(default_factory=list)
+    # Running estimate_message_tokens total of messages, so compaction
+    # doesn't re-sum the whole conversation
+    _tokens: int = PrivateAttr(default=0)
+    # Signatures of the last response_window assistant responses and their
+    # occurrences, for loop detection
+    _recent_responses: Deque[Tuple[str, int]] = PrivateAttr(default_factory=deque)
+    _response_counts: Dict[Tuple[str, int], int] = PrivateAttr(default_factory=dict)
+    _last_response_repeats: int = PrivateAttr(default=0)
+
+    def model_post_init(self, __context) -> None:
+        self.reindex()
+
+    def reindex(self) -> None:
+        """Recount tokens and re-index responses after the message list was replaced"""
+        self._tokens = sum(estimate_message_tokens(m) for m in self.messages)
+        self._recent_responses.clear()
+        self._response_counts.clear()
+        self._last_response_repeats = 0
+        for message in self.messages:
+            self._index_response(message)
+
+    @property
+    def tokens(self) -> int:
+        """Estimated tokens of the stored conversation"""
+        return self._tokens
 
     def add_message(self, message: Message) -> None:
         """Add a message to memory"""
         self.messages.append(message)
-        # Optional: Implement message limit
-        if len(self.messages) > self.max_messages:
-            self.messages = self.messages[-self.max_messages :]
+        self._tokens += estimate_message_tokens(message)
+        self._index_response(message)
+        self.compact()
 
     def add_messages(self, messages: List[Message]) -> None:
         """Add multiple messages to memory"""
         self.messages.extend(messages)
-        # Optional: Implement message limit
+        for message in messages:
+            self._tokens += estimate_message_tokens(message)
+            self._index_response(message)
+        self.compact()
+
+    @property
+    def last_response_repeats(self) -> int:
+        """How often the latest assistant response was given in the recent window"""
+        return self._last_response_repeats
+
+    @staticmethod
+    def _response_signature(message: Message) -> Optional[Tuple[str, int]]:
+        """Hash of what an assistant message does: its tool calls, else its text"""
+        if message.tool_calls:
+            calls = []
+            for call in message.tool_calls:
+                try:
+                    # Normalize so key order and whitespace don't hide a repeat
+                    args = json.dumps(
+                        json.loads(call.function.arguments or "{}"), sort_keys=True
+                    )
+                except (TypeError, ValueError):
+                    args = call.function.arguments
+                calls.append((call.function.name, args))
+            return "tools", hash(tuple(calls))
+        if message.content:
+            return "content", hash(message.content)
+        return None
+
+    def _index_response(self, message: Message) -> None:
+        if message.role != Role.ASSISTANT:
+            return
+        signature = self._response_signature(message)
+        if signature is None:
+            return
+        repeats = self._response_counts.get(signature, 0)
+        self._response_counts[signature] = repeats + 1
+        self._last_response_repeats = repeats
+        self._recent_responses.append(signature)
+        while len(self._recent_responses) > self.response_window:
+            oldest = self._recent_responses.popleft()
+            self._response_counts[oldest] -= 1
+            if not self._response_counts[oldest]:
+                del self._response_counts[oldest]
+
+    def pin(self, message: Message) -> None:
+        """Never elide or drop this message (e.g. the current task or plan)"""
+        self._pinned.append(message)
+
+    def clear_pins(self) -> None:
+        """Let previously pinned messages be compacted again"""
+        self._pinned.clear()
+
+    def compact(self) -> None:
+        """Keep memory within max_messages and the token budget.
+
+        Tool calls and their results are kept or dropped together so the
+        conversation stays valid. Within the token budget, the cheapest loss
+        comes first: stale screenshots, then the bodies of old observations,
+        then whole old turns. System messages, the initial request and the
+        most recent messages are always kept.
+        """
         if len(self.messages) > self.max_messages:
-            self.messages = self.messages[-self.max_messages :]
+            self._drop_oldest_turns(
+                lambda count, tokens: count > self.max_messages, keep_recent=1
+            )
+
+        if self.max_tokens is None or self._tokens <= self.max_tokens:
+            return
+
+        candidates = self._compactable_indices()
+        total = self._tokens
+        # 1. Drop screenshots, oldest first
+        for i in candidates:
+            if total <= self.max_tokens:
+                break
+            message = self.messages[i]
+            if message.image_ref:
+                total -= IMAGE_TOKENS
+                message.image_ref = None
+
+        # 2. Elide old observations and long prompts, oldest first
+        for i in candidates:
+            if total <= self.max_tokens:
+                break
+            message = self.messages[i]
+            if message.role not in (Role.TOOL, Role.USER) or not message.content:
+                continue
+            elided = self._elide(message.content)
+            if elided == message.content:
+                # Short or already elided
+                continue
+            before = estimate_message_tokens(message)
+            message.content = elided
+            total -= before - estimate_message_tokens(message)
+        self._tokens = total
+
+        # 3. Drop whole turns, oldest first
+        if total > self.max_tokens:
+            self._drop_oldest_turns(
+                lambda count, tokens: tokens > self.max_tokens,
+                keep_recent=self.keep_recent,
+            )
+
+    def _elide(self, content: str) -> str:
+        keep = self.elided_observation_chars
+        if len(content) <= keep * 2:
+            return content
+        return f"{content[:keep]}\n... [{len(content) - keep} characters elided from an old observation]"
+
+    def _pinned_indices(self) -> set:
+        """System messages, the initial request and explicitly pinned messages"""
+        pinned_ids = {id(m) for m in self._pinned}
+        pinned = {
+            i
+            for i, m in enumerate(self.messages)
+            if m.role == Role.SYSTEM or id(m) in pinned_ids
+        }
+        first_user = next(
+            (i for i, m in enumerate(self.messages) if m.role == Role.USER), None
+        )
+        if first_user is not None:
+            pinned.add(first_user)
+        return pinned
+
+    def _compactable_indices(self) -> List[int]:
+        """Indices of messages that may be shrunk, oldest first"""
+        pinned = self._pinned_indices()
+        recent_start = max(0, len(self.messages) - self.keep_recent)
+        return [i for i in range(recent_start) if i not in pinned]
+
+    def _turns(self) -> List[List[int]]:
+        """Group message indices so a tool call and its results form one unit"""
+        turns: List[List[int]] = []
+        open_calls: set = set()
+        for i, message in enumerate(self.messages):
+            if message.role == Role.TOOL and message.tool_call_id in open_calls:
+                turns[-1].append(i)
+                continue
+            turns.append([i])
+            open_calls = {call.id for call in message.tool_calls or []}
+        return turns
+
+    def _drop_oldest_turns(self, over_limit, keep_recent: int) -> None:
+        """Drop the oldest unpinned turns (and orphaned tool results) while
+        over_limit(messages left, tokens left) holds, in one pass"""
+        pinned = self._pinned_indices()
+        recent_start = max(0, len(self.messages) - keep_recent)
+        count, tokens = len(self.messages), self._tokens
+        drop = set()
+        for turn in self._turns():
+            if not over_limit(count, tokens) or turn[-1] >= recent_start:
+                break
+            if pinned.intersection(turn):
+                continue
+            drop.update(turn)
+            count -= len(turn)
+            tokens -= sum(estimate_message_tokens(self.messages[i]) for i in turn)
+        if drop:
+            self.messages = [m for i, m in enumerate(self.messages) if i not in drop]
+            self._tokens = tokens
+        self._drop_orphaned_tool_results()
+
+    def _drop_orphaned_tool_results(self) -> None:
+        """Remove tool results whose tool call is no longer in memory"""
+        call_ids = {
+            call.id for message in self.messages for call in message.tool_calls or []
+        }
+        kept = []
+        for m in self.messages:
+            if m.role != Role.TOOL or m.tool_call_id in call_ids:
+                kept.append(m)
+            else:
+                self._tokens -= estimate_message_tokens(m)
+        self.messages = kept
+
+    def drop_incomplete_turn(self) -> bool:
+        """Remove a trailing tool call turn that has results missing.
+
+        An agent interrupted while acting leaves one behind, and providers
+        reject a conversation with unanswered tool calls.
+        """
+        if not self.messages:
+            return False
+        start = self._turns()[-1][0]
+        tool_calls = self.messages[start].tool_calls
+        if not tool_calls:
+            return False
+        answered = {m.tool_call_id for m in self.messages[start + 1 :]}
+        if all(call.id in answered for call in tool_calls):
+            return False
+        self._tokens -= sum(estimate_message_tokens(m) for m in self.messages[start:])
+        del self.messages[start:]
+        return True
 
     def clear(self) -> None:
         """Clear all messages"""
         self.messages.clear()
+        self._tokens = 0
+        self._pinned.clear()
+        self._recent_responses.clear()
+        self._response_counts.clear()
+        self._last_response_repeats = 0
 
     def get_recent_messages(self, n: int) -> List[Message]:
         """Get n most recent messages"""
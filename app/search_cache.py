@@ -0,0 +1,218 @@
+"""TTL cache for web search responses.
+
+Agents repeat the same queries within a run and across runs. Responses are
+kept in an in-memory LRU and, optionally, in a SQLite file that survives
+restarts. Entries are fresh for ``ttl`` seconds; for ``stale_ttl`` seconds
+after that they are still served while a background search refreshes them
+(stale-while-revalidate). Concurrent misses for the same key share one search.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.config import SearchSettings, config
+from app.logger import logger
+from app.metrics import metrics
+
+
+def normalize_query(query: str) -> str:
+    """Fold case, whitespace and trailing punctuation that do not change results"""
+    return re.sub(r"\s+", " ", query).strip().rstrip("?!.。？！ ").casefold()
+
+
+class SearchCache:
+    """Two-tier TTL cache with stale-while-revalidate.
+
+    Values are kept as objects in memory. The disk tier stores what
+    ``encode`` returns as JSON and rebuilds the object with ``decode``.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        stale_ttl: float = 0.0,
+        max_entries: int = 512,
+        path: Optional[Path] = None,
+        max_disk_entries: int = 10000,
+        encode: Callable[[Any], dict] = lambda value: value,
+        decode: Callable[[dict], Any] = lambda data: data,
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.encode = encode
+        self.decode = decode
+        self._lock = threading.Lock()
+        # key -> (stored_at, value), least recently used first
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        # Searches running for a key, shared by concurrent misses and refreshes
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._open(Path(path))
+
+    @classmethod
+    def from_settings(
+        cls, settings: Optional[SearchSettings] = None, **kwargs
+    ) -> Optional["SearchCache"]:
+        """Create the cache described by the settings, or None when it is off"""
+        settings = settings or config.search_config or SearchSettings()
+        if settings.cache_ttl <= 0:
+            return None
+        path = None
+        if settings.cache_path:
+            path = Path(settings.cache_path)
+            if not path.is_absolute():
+                path = config.root_path / path
+        return cls(
+            ttl=settings.cache_ttl,
+            stale_ttl=settings.cache_stale_ttl,
+            max_entries=settings.cache_max_entries,
+            path=path,
+            max_disk_entries=settings.cache_max_disk_entries,
+            **kwargs,
+        )
+
+    @staticmethod
+    def key_for(query: str, *params: Any) -> str:
+        """Key a search by its normalized query and the parameters that shape results"""
+        payload = json.dumps([normalize_query(query), *params], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _open(self, path: Path) -> None:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache "
+                "(key TEXT PRIMARY KEY, stored_at REAL NOT NULL, value TEXT NOT NULL)"
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Search cache disk tier disabled, cannot open {path}: {e}")
+            self._db = None
+
+    async def get(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = lambda value: True,
+    ) -> Any:
+        """Return the cached value for a key, or fetch, store and return it.
+
+        Stale values are returned at once and refreshed in the background.
+        Only values accepted by ``cacheable`` are stored.
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            stored_at, value, tier = entry
+            age = time.time() - stored_at
+            if age < self.ttl:
+                metrics.incr("search_cache_hits_total", tier=tier, state="fresh")
+                return value
+            if age < self.ttl + self.stale_ttl:
+                metrics.incr("search_cache_hits_total", tier=tier, state="stale")
+                if key not in self._inflight:
+                    metrics.incr("search_cache_revalidations_total")
+                    self._start_fetch(key, fetch, cacheable)
+                return value
+
+        metrics.incr("search_cache_misses_total")
+        task = self._inflight.get(key) or self._start_fetch(key, fetch, cacheable)
+        # A cancelled caller must not cancel the search other callers wait on
+        return await asyncio.shield(task)
+
+    def _start_fetch(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool],
+    ) -> asyncio.Task:
+        async def fetch_and_store():
+            try:
+                value = await fetch()
+                if cacheable(value):
+                    self.store(key, value)
+                return value
+            finally:
+                self._inflight.pop(key, None)
+
+        def log_failure(task: asyncio.Task) -> None:
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning(f"Search cache fetch failed: {task.exception()}")
+
+        task = asyncio.create_task(fetch_and_store())
+        task.add_done_callback(log_failure)
+        self._inflight[key] = task
+        return task
+
+    def _lookup(self, key: str) -> Optional[Tuple[float, Any, str]]:
+        """Return (stored_at, value, tier) from memory or disk, if present"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry[0], entry[1], "memory"
+            if self._db is None:
+                return None
+            try:
+                row = self._db.execute(
+                    "SELECT stored_at, value FROM search_cache WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"Search cache read failed: {e}")
+                return None
+        if row is None:
+            return None
+        try:
+            value = self.decode(json.loads(row[1]))
+        except Exception as e:
+            logger.warning(f"Dropping unreadable search cache entry {key[:12]}: {e}")
+            return None
+        with self._lock:
+            self._remember(key, row[0], value)
+        return row[0], value, "disk"
+
+    def store(self, key: str, value: Any) -> None:
+        """Store a value in memory and, when enabled, on disk"""
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, stored_at, value)
+            if self._db is None:
+                return
+            try:
+                data = json.dumps(self.encode(value), ensure_ascii=False, default=str)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO search_cache (key, stored_at, value) "
+                    "VALUES (?, ?, ?)",
+                    (key, stored_at, data),
+                )
+                # Keep the newest entries within the disk budget
+                self._db.execute(
+                    "DELETE FROM search_cache WHERE key IN (SELECT key FROM search_cache "
+                    "ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_disk_entries,),
+                )
+                self._db.commit()
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                logger.warning(f"Search cache write failed: {e}")
+
+    def _remember(self, key: str, stored_at: float, value: Any) -> None:
+        """Keep an entry in the memory tier (lock held)"""
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            metrics.incr("search_cache_evictions_total")
+
+    def __len__(self) -> int:
+        return len(self._memory)
@@ -1,5 +1,6 @@
 import json
 from abc import ABC, abstractmethod
+from enum import Enum
 from typing import Any, Dict, Optional, Union
 
 from pydantic import BaseModel, Field
@@ -35,6 +36,17 @@ from app.utils.logger import logger
 #         }
 
 
+class ToolConcurrency(str, Enum):
+    """How a call to a tool may overlap with other tool calls of the same step."""
+
+    # No side effects: runs alongside any call except side-effecting ones
+    READ_ONLY = "read_only"
+    # Needs the sandbox to itself: serialized with other sandbox calls only
+    SANDBOX_EXCLUSIVE = "sandbox_exclusive"
+    # Runs alone, after every earlier call of the step has finished
+    SIDE_EFFECTING = "side_effecting"
+
+
 class ToolResult(BaseModel):
     """Represents the result of a tool execution."""
 
@@ -88,12 +100,15 @@ class BaseTool(ABC, BaseModel):
         name (str): Tool name
         description (str): Tool description
         parameters (dict): Tool parameters schema
+        concurrency (ToolConcurrency): Whether calls may run in parallel with
+            other tool calls of the same step
         _schemas (Dict[str, List[ToolSchema]]): Registered method schemas
     """
 
     name: str
     description: str
     parameters: Optional[dict] = None
+    concurrency: ToolConcurrency = ToolConcurrency.SIDE_EFFECTING
     # _schemas: Dict[str, List[ToolSchema]] = {}
 
     class Config:
@@ -121,6 +136,13 @@ class BaseTool(ABC, BaseModel):
     async def execute(self, **kwargs) -> Any:
         """Execute the tool with given parameters."""
 
+    def concurrency_for(self, **kwargs) -> ToolConcurrency:
+        """Concurrency class of a call with the given arguments.
+
+        Override for tools whose safety depends on the command (e.g. view vs edit).
+        """
+        return self.concurrency
+
     def to_param(self) -> Dict:
         """Convert tool to function call format.
 
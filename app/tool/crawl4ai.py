@@ -6,11 +6,119 @@ providing fast, precise, and AI-ready data extraction with clean Markdown genera
 """
 
 import asyncio
-from typing import List, Union
+import time
+from typing import AsyncIterator, Dict, List, Optional, Union
 from urllib.parse import urlparse
 
 from app.logger import logger
-from app.tool.base import BaseTool, ToolResult
+from app.metrics import metrics
+from app.page_cache import CachedPage, PageCache, get_page_cache
+from app.tool.base import BaseTool, ToolConcurrency, ToolResult
+
+
+class CrawlerPool:
+    """One headless browser shared by every crawl in the process.
+
+    The browser is launched on first use and kept open between tool calls,
+    so a crawl costs page loads only. It is closed after idle_timeout seconds
+    without crawls, and replaced when a whole batch fails, which is what a
+    crashed browser looks like. Crawls still running on a replaced browser
+    finish on it; it is closed once the last of them releases it.
+    """
+
+    def __init__(self, idle_timeout: float = 300):
+        self.idle_timeout = idle_timeout
+        self._crawler = None
+        # The browser belongs to the event loop that launched it
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._active = 0
+        # Crawls using each browser, and replaced browsers still in use, by id()
+        self._users: Dict[int, int] = {}
+        self._retired: Dict[int, object] = {}
+        self._last_used = 0.0
+        self._idle_handle: Optional[asyncio.TimerHandle] = None
+
+    async def acquire(self, crawler_class, browser_config):
+        """Return the shared crawler, launching it if needed"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            if self._crawler is not None:
+                logger.warning("Event loop changed, launching a new crawler browser")
+            self._loop, self._lock, self._crawler = loop, asyncio.Lock(), None
+            self._active, self._users, self._retired = 0, {}, {}
+        async with self._lock:
+            if self._crawler is None:
+                started = time.monotonic()
+                crawler = crawler_class(config=browser_config)
+                await crawler.start()
+                self._crawler = crawler
+                metrics.incr("crawl4ai_browser_launches_total")
+                logger.info(
+                    f"🕷️ Crawler browser started in {time.monotonic() - started:.2f}s"
+                )
+            self._active += 1
+            key = id(self._crawler)
+            self._users[key] = self._users.get(key, 0) + 1
+            return self._crawler
+
+    def release(self, crawler) -> None:
+        """Give back a crawler returned by acquire"""
+        self._active -= 1
+        self._last_used = time.monotonic()
+        key = id(crawler)
+        self._users[key] = self._users.get(key, 1) - 1
+        if self._users[key] <= 0:
+            del self._users[key]
+            retired = self._retired.pop(key, None)
+            if retired is not None:
+                asyncio.ensure_future(self._close_crawler(retired))
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+        self._idle_handle = self._loop.call_later(
+            self.idle_timeout,
+            lambda: asyncio.ensure_future(self._close_if_idle()),
+        )
+
+    async def _close_if_idle(self) -> None:
+        if (
+            self._active == 0
+            and time.monotonic() - self._last_used >= self.idle_timeout
+        ):
+            await self.close()
+
+    async def reset(self, crawler) -> None:
+        """Replace a broken crawler so the next crawl launches a fresh browser.
+
+        Crawls still using it keep it until they release it. Does nothing if
+        the crawler was already replaced.
+        """
+        if crawler is None or crawler is not self._crawler:
+            return
+        self._crawler = None
+        if self._users.get(id(crawler)):
+            self._retired[id(crawler)] = crawler
+        else:
+            await self._close_crawler(crawler)
+
+    async def close(self) -> None:
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+        crawler, self._crawler = self._crawler, None
+        if crawler is not None:
+            await self._close_crawler(crawler)
+
+    @staticmethod
+    async def _close_crawler(crawler) -> None:
+        try:
+            await crawler.close()
+        except Exception as e:
+            logger.warning(f"Error closing crawler browser: {e}")
+
+
+# Shared by all Crawl4aiTool instances
+crawler_pool = CrawlerPool()
 
 
 class Crawl4aiTool(BaseTool):
@@ -21,12 +129,13 @@ class Crawl4aiTool(BaseTool):
     """
 
     name: str = "crawl4ai"
+    concurrency: ToolConcurrency = ToolConcurrency.READ_ONLY
     description: str = """Web crawler that extracts clean, AI-ready content from web pages.
 
     Features:
     - Extracts clean markdown content optimized for LLMs
     - Handles JavaScript-heavy sites and dynamic content
-    - Supports multiple URLs in a single request
+    - Supports multiple URLs in a single request, crawled concurrently
     - Fast and reliable with built-in error handling
 
     Perfect for content analysis, research, and feeding web content to AI models."""
@@ -61,6 +170,7 @@ class Crawl4aiTool(BaseTool):
         },
         "required": ["urls"],
     }
+    max_concurrent_crawls: int = 10
 
     async def execute(
         self,
@@ -132,86 +242,56 @@ class Crawl4aiTool(BaseTool):
             successful_count = 0
             failed_count = 0
 
-            # Process each URL
-            async with AsyncWebCrawler(config=browser_config) as crawler:
+            # Pages crawled recently (by any tool) need no browser
+            cache = get_page_cache()
+            cached_results = {}
+            if cache is not None and not bypass_cache:
                 for url in valid_urls:
-                    try:
-                        logger.info(f"🕷️ Crawling URL: {url}")
-                        start_time = asyncio.get_event_loop().time()
-
-                        result = await crawler.arun(url=url, config=run_config)
-
-                        end_time = asyncio.get_event_loop().time()
-                        execution_time = end_time - start_time
-
-                        if result.success:
-                            # Count words in markdown
-                            word_count = 0
-                            if hasattr(result, "markdown") and result.markdown:
-                                word_count = len(result.markdown.split())
-
-                            # Count links
-                            links_count = 0
-                            if hasattr(result, "links") and result.links:
-                                internal_links = result.links.get("internal", [])
-                                external_links = result.links.get("external", [])
-                                links_count = len(internal_links) + len(external_links)
-
-                            # Count images
-                            images_count = 0
-                            if hasattr(result, "media") and result.media:
-                                images = result.media.get("images", [])
-                                images_count = len(images)
-
-                            results.append(
-                                {
-                                    "url": url,
-                                    "success": True,
-                                    "status_code": getattr(result, "status_code", 200),
-                                    "title": result.metadata.get("title")
-                                    if result.metadata
-                                    else None,
-                                    "markdown": result.markdown
-                                    if hasattr(result, "markdown")
-                                    else None,
-                                    "word_count": word_count,
-                                    "links_count": links_count,
-                                    "images_count": images_count,
-                                    "execution_time": execution_time,
-                                }
-                            )
-                            successful_count += 1
-                            logger.info(
-                                f"✅ Successfully crawled {url} in {execution_time:.2f}s"
-                            )
-
-                        else:
-                            results.append(
-                                {
-                                    "url": url,
-                                    "success": False,
-                                    "error_message": getattr(
-                                        result, "error_message", "Unknown error"
-                                    ),
-                                    "execution_time": execution_time,
-                                }
-                            )
-                            failed_count += 1
-                            logger.warning(f"❌ Failed to crawl {url}")
-
-                    except Exception as e:
-                        error_msg = f"Error crawling {url}: {str(e)}"
-                        logger.error(error_msg)
-                        results.append(
-                            {"url": url, "success": False, "error_message": error_msg}
-                        )
-                        failed_count += 1
+                    page = cache.get(url, tool="crawl4ai", content="markdown")
+                    if page is not None and cache.is_fresh(page):
+                        cached_results[url] = self._cached_result(page)
+            urls_to_crawl = list(
+                dict.fromkeys(url for url in valid_urls if url not in cached_results)
+            )
+
+            # Crawl the remaining URLs concurrently on the shared browser
+            started = time.monotonic()
+            crawled_results = {}
+            if urls_to_crawl:
+                async for result in self.crawl_stream(
+                    AsyncWebCrawler,
+                    browser_config,
+                    run_config,
+                    urls_to_crawl,
+                    cache,
+                ):
+                    crawled_results[result["url"]] = result
+            wall_time = time.monotonic() - started
+
+            for url in valid_urls:
+                result = cached_results.get(url) or crawled_results[url]
+                results.append(result)
+                if result["success"]:
+                    successful_count += 1
+                else:
+                    failed_count += 1
 
             # Format output
             output_lines = [f"🕷️ Crawl4AI Results Summary:"]
             output_lines.append(f"📊 Total URLs: {len(valid_urls)}")
             output_lines.append(f"✅ Successful: {successful_count}")
             output_lines.append(f"❌ Failed: {failed_count}")
+            url_times = [
+                result["execution_time"]
+                for result in crawled_results.values()
+                if result.get("execution_time") is not None
+            ]
+            if url_times:
+                output_lines.append(
+                    f"⏱️ Crawled {len(url_times)} URLs in {wall_time:.2f}s "
+                    f"(per URL: avg {sum(url_times) / len(url_times):.2f}s, "
+                    f"max {max(url_times):.2f}s, sum {sum(url_times):.2f}s)"
+                )
             output_lines.append("")
 
             for i, result in enumerate(results, 1):
@@ -235,7 +315,9 @@ class Crawl4aiTool(BaseTool):
                         f"   📊 Stats: {result.get('word_count', 0)} words, {result.get('links_count', 0)} links, {result.get('images_count', 0)} images"
                     )
 
-                    if result.get("execution_time"):
+                    if result.get("cached"):
+                        output_lines.append(f"   💾 Served from the page cache")
+                    elif result.get("execution_time"):
                         output_lines.append(
                             f"   ⏱️ Time: {result['execution_time']:.2f}s"
                         )
@@ -257,6 +339,149 @@ class Crawl4aiTool(BaseTool):
             logger.error(error_msg)
             return ToolResult(error=error_msg)
 
+    async def crawl_stream(
+        self,
+        crawler_class,
+        browser_config,
+        run_config,
+        urls: List[str],
+        cache: Optional[PageCache] = None,
+    ) -> AsyncIterator[dict]:
+        """Crawl URLs concurrently on the shared browser.
+
+        Yields each URL's result as soon as it is done, at most
+        max_concurrent_crawls pages at a time. Successful pages are stored in
+        the page cache.
+        """
+        crawler = await crawler_pool.acquire(crawler_class, browser_config)
+        slots = asyncio.Semaphore(max(1, self.max_concurrent_crawls))
+        tasks = [
+            asyncio.create_task(self._crawl_one(crawler, slots, url, run_config, cache))
+            for url in urls
+        ]
+        errors = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                if result.get("exception"):
+                    errors += 1
+                yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+            crawler_pool.release(crawler)
+        if errors == len(urls):
+            logger.warning("Every crawl failed, restarting the crawler browser")
+            await crawler_pool.reset(crawler)
+
+    async def _crawl_one(
+        self,
+        crawler,
+        slots: asyncio.Semaphore,
+        url: str,
+        run_config,
+        cache: Optional[PageCache],
+    ) -> dict:
+        async with slots:
+            start_time = time.monotonic()
+            try:
+                logger.info(f"🕷️ Crawling URL: {url}")
+                result = await crawler.arun(url=url, config=run_config)
+            except Exception as e:
+                error_msg = f"Error crawling {url}: {str(e)}"
+                logger.error(error_msg)
+                return {
+                    "url": url,
+                    "success": False,
+                    "exception": True,
+                    "error_message": error_msg,
+                }
+            finally:
+                execution_time = time.monotonic() - start_time
+                metrics.observe("crawl4ai_url_seconds", execution_time)
+
+        if result.success:
+            summary = self._success_result(url, result, execution_time)
+            if cache is not None:
+                self._store_in_cache(cache, url, result, summary)
+            logger.info(f"✅ Successfully crawled {url} in {execution_time:.2f}s")
+            return summary
+
+        logger.warning(f"❌ Failed to crawl {url}")
+        return {
+            "url": url,
+            "success": False,
+            "error_message": getattr(result, "error_message", "Unknown error"),
+            "execution_time": execution_time,
+        }
+
+    @staticmethod
+    def _success_result(url: str, result, execution_time: float) -> dict:
+        # Count words in markdown
+        word_count = 0
+        if hasattr(result, "markdown") and result.markdown:
+            word_count = len(result.markdown.split())
+
+        # Count links
+        links_count = 0
+        if hasattr(result, "links") and result.links:
+            internal_links = result.links.get("internal", [])
+            external_links = result.links.get("external", [])
+            links_count = len(internal_links) + len(external_links)
+
+        # Count images
+        images_count = 0
+        if hasattr(result, "media") and result.media:
+            images = result.media.get("images", [])
+            images_count = len(images)
+
+        return {
+            "url": url,
+            "success": True,
+            "status_code": getattr(result, "status_code", 200),
+            "title": result.metadata.get("title") if result.metadata else None,
+            "markdown": result.markdown if hasattr(result, "markdown") else None,
+            "word_count": word_count,
+            "links_count": links_count,
+            "images_count": images_count,
+            "execution_time": execution_time,
+        }
+
+    @staticmethod
+    def _store_in_cache(cache: PageCache, url: str, result, summary: dict) -> None:
+        if not summary.get("markdown"):
+            return
+        headers = {
+            name.lower(): value
+            for name, value in (getattr(result, "response_headers", None) or {}).items()
+        }
+        cache.put(
+            url,
+            markdown=str(summary["markdown"]),
+            title=summary.get("title"),
+            etag=headers.get("etag"),
+            last_modified=headers.get("last-modified"),
+            metadata={
+                "status_code": summary.get("status_code"),
+                "links_count": summary.get("links_count", 0),
+                "images_count": summary.get("images_count", 0),
+            },
+        )
+
+    @staticmethod
+    def _cached_result(page: CachedPage) -> dict:
+        return {
+            "url": page.url,
+            "success": True,
+            "cached": True,
+            "status_code": page.metadata.get("status_code", 200),
+            "title": page.title,
+            "markdown": page.markdown,
+            "word_count": len(page.markdown.split()),
+            "links_count": page.metadata.get("links_count", 0),
+            "images_count": page.metadata.get("images_count", 0),
+        }
+
     def _is_valid_url(self, url: str) -> bool:
         """Validate if a URL is properly formatted."""
         try:
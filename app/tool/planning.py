@@ -1,7 +1,13 @@
 # tool/planning.py
+import os
+import re
+from pathlib import Path
 from typing import Dict, List, Literal, Optional
 
+from pydantic import BaseModel, Field, PrivateAttr
+
 from app.exceptions import ToolError
+from app.logger import logger
 from app.tool.base import BaseTool, ToolResult
 
 
@@ -10,6 +16,133 @@ A planning tool that allows the agent to create and manage plans for solving com
 The tool provides functionality for creating plans, updating plan steps, and tracking progress.
 """
 
+STEP_STATUSES = ("not_started", "in_progress", "completed", "blocked")
+ACTIVE_STEP_STATUSES = ("not_started", "in_progress")
+_STATUS_MARKS = {
+    "not_started": "[ ]",
+    "in_progress": "[→]",
+    "completed": "[✓]",
+    "blocked": "[!]",
+}
+# Executor type tag in a step's text, e.g. [SEARCH] or [CODE]
+_STEP_TYPE_PATTERN = re.compile(r"\[([A-Z_]+)\]")
+
+
+class PlanStep(BaseModel):
+    """A single plan step and its progress"""
+
+    text: str
+    status: str = "not_started"
+    notes: str = ""
+    type: Optional[str] = Field(
+        None, description="Executor type parsed from a [TYPE] tag in the text"
+    )
+    dependencies: List[int] = Field(default_factory=list)
+
+    @classmethod
+    def from_text(cls, text: str, **kwargs) -> "PlanStep":
+        type_match = _STEP_TYPE_PATTERN.search(text)
+        step_type = type_match.group(1).lower() if type_match else None
+        return cls(text=text, type=step_type, **kwargs)
+
+    def render(self, index: int) -> str:
+        line = f"{index}. {_STATUS_MARKS.get(self.status, '[ ]')} {self.text}"
+        if self.dependencies:
+            line += f" (after {', '.join(str(dep) for dep in self.dependencies)})"
+        line += "\n"
+        if self.notes:
+            line += f"   Notes: {self.notes}\n"
+        return line
+
+
+class Plan(BaseModel):
+    """A plan with a cursor to its next active step and a cached rendering.
+
+    ``mark`` updates the status counts, the step's rendered line and the
+    cursor in place, so reading progress never rescans the plan.
+    """
+
+    plan_id: str
+    title: str
+    steps: List[PlanStep]
+    sequential: bool = Field(
+        True, description="No explicit dependencies: each step waits for the previous"
+    )
+
+    _cursor: int = PrivateAttr(default=0)
+    _counts: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _lines: List[str] = PrivateAttr(default_factory=list)
+    _text: Optional[str] = PrivateAttr(default=None)
+
+    def model_post_init(self, __context) -> None:
+        self.reindex()
+
+    def reindex(self) -> None:
+        """Recompute the cursor, counts and rendered lines after structural changes"""
+        self._counts = {status: 0 for status in STEP_STATUSES}
+        for step in self.steps:
+            self._counts[step.status] = self._counts.get(step.status, 0) + 1
+        self._lines = [step.render(i) for i, step in enumerate(self.steps)]
+        self._cursor = 0
+        self._advance_cursor()
+        self._text = None
+
+    def _advance_cursor(self) -> None:
+        while (
+            self._cursor < len(self.steps)
+            and self.steps[self._cursor].status not in ACTIVE_STEP_STATUSES
+        ):
+            self._cursor += 1
+
+    @property
+    def cursor(self) -> Optional[int]:
+        """Index of the first active (not started or in progress) step"""
+        return self._cursor if self._cursor < len(self.steps) else None
+
+    @property
+    def completed(self) -> int:
+        return self._counts.get("completed", 0)
+
+    def mark(
+        self, index: int, status: Optional[str] = None, notes: Optional[str] = None
+    ) -> None:
+        step = self.steps[index]
+        if status and status != step.status:
+            self._counts[step.status] -= 1
+            self._counts[status] = self._counts.get(status, 0) + 1
+            step.status = status
+            if status in ACTIVE_STEP_STATUSES:
+                self._cursor = min(self._cursor, index)
+            else:
+                self._advance_cursor()
+        if notes:
+            step.notes = notes
+        self._lines[index] = step.render(index)
+        self._text = None
+
+    def render(self) -> str:
+        """Format the plan for display, reusing the cached text when unchanged"""
+        if self._text is None:
+            header = f"Plan: {self.title} (ID: {self.plan_id})\n"
+            header += "=" * len(header) + "\n\n"
+
+            total_steps = len(self.steps)
+            counts = self._counts
+            header += f"Progress: {self.completed}/{total_steps} steps completed "
+            if total_steps > 0:
+                percentage = (self.completed / total_steps) * 100
+                header += f"({percentage:.1f}%)\n"
+            else:
+                header += "(0%)\n"
+
+            header += (
+                f"Status: {counts['completed']} completed, {counts['in_progress']} in progress, "
+                f"{counts['blocked']} blocked, {counts['not_started']} not started\n\n"
+            )
+            header += "Steps:\n"
+            self._text = header + "".join(self._lines)
+        return self._text
+
 
 class PlanningTool(BaseTool):
     """
@@ -48,6 +181,11 @@ class PlanningTool(BaseTool):
                 "type": "array",
                 "items": {"type": "string"},
             },
+            "step_dependencies": {
+                "description": "For each step, the indices (0-based) of the steps it depends on. Steps whose dependencies are completed may run in parallel. Optional for create and update commands; if omitted, steps run in order.",
+                "type": "array",
+                "items": {"type": "array", "items": {"type": "integer"}},
+            },
             "step_index": {
                 "description": "Index of the step to update (0-based). Required for mark_step command.",
                 "type": "integer",
@@ -66,7 +204,11 @@ class PlanningTool(BaseTool):
         "additionalProperties": False,
     }
 
-    plans: dict = {}  # Dictionary to store plans by plan_id
+    plans: Dict[str, Plan] = {}  # Dictionary to store plans by plan_id
+    storage_dir: Optional[str] = Field(
+        None,
+        description="Directory where plans are saved after every change so a flow can resume them",
+    )
     _current_plan_id: Optional[str] = None  # Track the current active plan
 
     async def execute(
@@ -78,6 +220,7 @@ class PlanningTool(BaseTool):
         plan_id: Optional[str] = None,
         title: Optional[str] = None,
         steps: Optional[List[str]] = None,
+        step_dependencies: Optional[List[List[int]]] = None,
         step_index: Optional[int] = None,
         step_status: Optional[
             Literal["not_started", "in_progress", "completed", "blocked"]
@@ -93,15 +236,16 @@ class PlanningTool(BaseTool):
         - plan_id: Unique identifier for the plan
         - title: Title for the plan (used with create command)
         - steps: List of steps for the plan (used with create command)
+        - step_dependencies: Indices each step depends on (used with create and update commands)
         - step_index: Index of the step to update (used with mark_step command)
         - step_status: Status to set for a step (used with mark_step command)
         - step_notes: Additional notes for a step (used with mark_step command)
         """
 
         if command == "create":
-            return self._create_plan(plan_id, title, steps)
+            return self._create_plan(plan_id, title, steps, step_dependencies)
         elif command == "update":
-            return self._update_plan(plan_id, title, steps)
+            return self._update_plan(plan_id, title, steps, step_dependencies)
         elif command == "list":
             return self._list_plans()
         elif command == "get":
@@ -117,14 +261,73 @@ class PlanningTool(BaseTool):
                 f"Unrecognized command: {command}. Allowed commands are: create, update, list, get, set_active, mark_step, delete"
             )
 
+    def get_plan(self, plan_id: str) -> Optional[Plan]:
+        """Return a plan, loading it from storage_dir if it is not in memory."""
+        plan = self.plans.get(plan_id)
+        if plan is None and self.storage_dir:
+            path = self._plan_path(plan_id)
+            if path.exists():
+                try:
+                    plan = Plan.model_validate_json(path.read_text(encoding="utf-8"))
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Failed to load plan {plan_id} from {path}: {e}")
+                    return None
+                self.plans[plan_id] = plan
+        return plan
+
+    def discard_saved_plan(self, plan_id: str) -> None:
+        """Delete the saved copy of a plan (e.g. once it is finished), keeping it in memory."""
+        if not self.storage_dir:
+            return
+        try:
+            self._plan_path(plan_id).unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"Failed to delete saved plan {plan_id}: {e}")
+
+    def _require_plan(self, plan_id: Optional[str]) -> Plan:
+        """Resolve plan_id (or the active plan) to a plan, raising if there is none."""
+        if not plan_id:
+            # If no plan_id is provided, use the current active plan
+            if not self._current_plan_id:
+                raise ToolError(
+                    "No active plan. Please specify a plan_id or set an active plan."
+                )
+            plan_id = self._current_plan_id
+
+        plan = self.get_plan(plan_id)
+        if plan is None:
+            raise ToolError(f"No plan found with ID: {plan_id}")
+        return plan
+
+    def _plan_path(self, plan_id: str) -> Path:
+        safe_id = re.sub(r"[^\w.-]", "_", plan_id)
+        return Path(self.storage_dir) / f"{safe_id}.json"
+
+    def _save(self, plan: Plan) -> None:
+        """Write the plan to storage_dir atomically, if persistence is enabled."""
+        if not self.storage_dir:
+            return
+        path = self._plan_path(plan.plan_id)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(plan.model_dump_json(), encoding="utf-8")
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to save plan {plan.plan_id} to {path}: {e}")
+
     def _create_plan(
-        self, plan_id: Optional[str], title: Optional[str], steps: Optional[List[str]]
+        self,
+        plan_id: Optional[str],
+        title: Optional[str],
+        steps: Optional[List[str]],
+        step_dependencies: Optional[List[List[int]]] = None,
     ) -> ToolResult:
         """Create a new plan with the given ID, title, and steps."""
         if not plan_id:
             raise ToolError("Parameter `plan_id` is required for command: create")
 
-        if plan_id in self.plans:
+        if self.get_plan(plan_id) is not None:
             raise ToolError(
                 f"A plan with ID '{plan_id}' already exists. Use 'update' to modify existing plans."
             )
@@ -141,36 +344,44 @@ class PlanningTool(BaseTool):
                 "Parameter `steps` must be a non-empty list of strings for command: create"
             )
 
-        # Create a new plan with initialized step statuses
-        plan = {
-            "plan_id": plan_id,
-            "title": title,
-            "steps": steps,
-            "step_statuses": ["not_started"] * len(steps),
-            "step_notes": [""] * len(steps),
-        }
+        dependencies = (
+            self._validate_dependencies(step_dependencies, len(steps))
+            if step_dependencies is not None
+            else [[] for _ in steps]
+        )
+        plan = Plan(
+            plan_id=plan_id,
+            title=title,
+            steps=[
+                PlanStep.from_text(step, dependencies=deps)
+                for step, deps in zip(steps, dependencies)
+            ],
+            sequential=step_dependencies is None,
+        )
 
         self.plans[plan_id] = plan
         self._current_plan_id = plan_id  # Set as active plan
+        self._save(plan)
 
         return ToolResult(
-            output=f"Plan created successfully with ID: {plan_id}\n\n{self._format_plan(plan)}"
+            output=f"Plan created successfully with ID: {plan_id}\n\n{plan.render()}"
         )
 
     def _update_plan(
-        self, plan_id: Optional[str], title: Optional[str], steps: Optional[List[str]]
+        self,
+        plan_id: Optional[str],
+        title: Optional[str],
+        steps: Optional[List[str]],
+        step_dependencies: Optional[List[List[int]]] = None,
     ) -> ToolResult:
         """Update an existing plan with new title or steps."""
         if not plan_id:
             raise ToolError("Parameter `plan_id` is required for command: update")
 
-        if plan_id not in self.plans:
-            raise ToolError(f"No plan found with ID: {plan_id}")
-
-        plan = self.plans[plan_id]
+        plan = self._require_plan(plan_id)
 
         if title:
-            plan["title"] = title
+            plan.title = title
 
         if steps:
             if not isinstance(steps, list) or not all(
@@ -180,32 +391,109 @@ class PlanningTool(BaseTool):
                     "Parameter `steps` must be a list of strings for command: update"
                 )
 
-            # Preserve existing step statuses for unchanged steps
-            old_steps = plan["steps"]
-            old_statuses = plan["step_statuses"]
-            old_notes = plan["step_notes"]
-
-            # Create new step statuses and notes
-            new_statuses = []
-            new_notes = []
-
-            for i, step in enumerate(steps):
-                # If the step exists at the same position in old steps, preserve status and notes
-                if i < len(old_steps) and step == old_steps[i]:
-                    new_statuses.append(old_statuses[i])
-                    new_notes.append(old_notes[i])
-                else:
-                    new_statuses.append("not_started")
-                    new_notes.append("")
+            # Preserve existing step statuses and notes for unchanged steps
+            old_steps = plan.steps
+            plan.steps = [
+                (
+                    PlanStep.from_text(
+                        step, status=old_steps[i].status, notes=old_steps[i].notes
+                    )
+                    if i < len(old_steps) and step == old_steps[i].text
+                    else PlanStep.from_text(step)
+                )
+                for i, step in enumerate(steps)
+            ]
+            if step_dependencies is None and not plan.sequential:
+                # Dependencies refer to step positions, which may have changed
+                step_dependencies = self._remap_dependencies(old_steps, plan.steps)
+
+        if step_dependencies is not None:
+            dependencies = self._validate_dependencies(
+                step_dependencies, len(plan.steps)
+            )
+            for step, deps in zip(plan.steps, dependencies):
+                step.dependencies = deps
+            plan.sequential = False
+        elif plan.sequential:
+            for step in plan.steps:
+                step.dependencies = []
 
-            plan["steps"] = steps
-            plan["step_statuses"] = new_statuses
-            plan["step_notes"] = new_notes
+        plan.reindex()
+        self._save(plan)
 
         return ToolResult(
-            output=f"Plan updated successfully: {plan_id}\n\n{self._format_plan(plan)}"
+            output=f"Plan updated successfully: {plan_id}\n\n{plan.render()}"
         )
 
+    @staticmethod
+    def _remap_dependencies(
+        old_steps: List[PlanStep], new_steps: List[PlanStep]
+    ) -> List[List[int]]:
+        """Carry dependencies over to the new step list, matching steps by text.
+
+        Dependencies on steps that were removed are dropped.
+        """
+        unmatched: Dict[str, List[int]] = {}
+        for i, step in enumerate(old_steps):
+            unmatched.setdefault(step.text, []).append(i)
+        new_index: Dict[int, int] = {}
+        for i, step in enumerate(new_steps):
+            if unmatched.get(step.text):
+                new_index[unmatched[step.text].pop(0)] = i
+        old_index = {new: old for old, new in new_index.items()}
+        return [
+            (
+                [
+                    new_index[dep]
+                    for dep in old_steps[old_index[i]].dependencies
+                    if dep in new_index
+                ]
+                if i in old_index
+                else []
+            )
+            for i in range(len(new_steps))
+        ]
+
+    @staticmethod
+    def _validate_dependencies(
+        step_dependencies: List[List[int]], num_steps: int
+    ) -> List[List[int]]:
+        """Check that dependencies reference existing steps and form no cycle"""
+        if (
+            not isinstance(step_dependencies, list)
+            or len(step_dependencies) > num_steps
+        ):
+            raise ToolError(
+                "Parameter `step_dependencies` must be a list with at most one entry per step"
+            )
+        dependencies = [list(deps or []) for deps in step_dependencies]
+        dependencies += [[] for _ in range(num_steps - len(dependencies))]
+        for i, deps in enumerate(dependencies):
+            for dep in deps:
+                if not isinstance(dep, int) or not 0 <= dep < num_steps or dep == i:
+                    raise ToolError(
+                        f"Invalid dependency {dep} for step {i}. Dependencies must be indices of other steps."
+                    )
+
+        # Kahn's algorithm: every step must become reachable
+        remaining = [len(set(deps)) for deps in dependencies]
+        dependents: Dict[int, List[int]] = {i: [] for i in range(num_steps)}
+        for i, deps in enumerate(dependencies):
+            for dep in set(deps):
+                dependents[dep].append(i)
+        ready = [i for i in range(num_steps) if remaining[i] == 0]
+        resolved = 0
+        while ready:
+            step = ready.pop()
+            resolved += 1
+            for dependent in dependents[step]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+        if resolved < num_steps:
+            raise ToolError("Parameter `step_dependencies` contains a cycle")
+        return dependencies
+
     def _list_plans(self) -> ToolResult:
         """List all available plans."""
         if not self.plans:
@@ -216,42 +504,24 @@ class PlanningTool(BaseTool):
         output = "Available plans:\n"
         for plan_id, plan in self.plans.items():
             current_marker = " (active)" if plan_id == self._current_plan_id else ""
-            completed = sum(
-                1 for status in plan["step_statuses"] if status == "completed"
-            )
-            total = len(plan["steps"])
-            progress = f"{completed}/{total} steps completed"
-            output += f"• {plan_id}{current_marker}: {plan['title']} - {progress}\n"
+            progress = f"{plan.completed}/{len(plan.steps)} steps completed"
+            output += f"• {plan_id}{current_marker}: {plan.title} - {progress}\n"
 
         return ToolResult(output=output)
 
     def _get_plan(self, plan_id: Optional[str]) -> ToolResult:
         """Get details of a specific plan."""
-        if not plan_id:
-            # If no plan_id is provided, use the current active plan
-            if not self._current_plan_id:
-                raise ToolError(
-                    "No active plan. Please specify a plan_id or set an active plan."
-                )
-            plan_id = self._current_plan_id
-
-        if plan_id not in self.plans:
-            raise ToolError(f"No plan found with ID: {plan_id}")
-
-        plan = self.plans[plan_id]
-        return ToolResult(output=self._format_plan(plan))
+        return ToolResult(output=self._require_plan(plan_id).render())
 
     def _set_active_plan(self, plan_id: Optional[str]) -> ToolResult:
         """Set a plan as the active plan."""
         if not plan_id:
             raise ToolError("Parameter `plan_id` is required for command: set_active")
 
-        if plan_id not in self.plans:
-            raise ToolError(f"No plan found with ID: {plan_id}")
-
+        plan = self._require_plan(plan_id)
         self._current_plan_id = plan_id
         return ToolResult(
-            output=f"Plan '{plan_id}' is now the active plan.\n\n{self._format_plan(self.plans[plan_id])}"
+            output=f"Plan '{plan_id}' is now the active plan.\n\n{plan.render()}"
         )
 
     def _mark_step(
@@ -262,45 +532,26 @@ class PlanningTool(BaseTool):
         step_notes: Optional[str],
     ) -> ToolResult:
         """Mark a step with a specific status and optional notes."""
-        if not plan_id:
-            # If no plan_id is provided, use the current active plan
-            if not self._current_plan_id:
-                raise ToolError(
-                    "No active plan. Please specify a plan_id or set an active plan."
-                )
-            plan_id = self._current_plan_id
-
-        if plan_id not in self.plans:
-            raise ToolError(f"No plan found with ID: {plan_id}")
+        plan = self._require_plan(plan_id)
 
         if step_index is None:
             raise ToolError("Parameter `step_index` is required for command: mark_step")
 
-        plan = self.plans[plan_id]
-
-        if step_index < 0 or step_index >= len(plan["steps"]):
+        if step_index < 0 or step_index >= len(plan.steps):
             raise ToolError(
-                f"Invalid step_index: {step_index}. Valid indices range from 0 to {len(plan['steps'])-1}."
+                f"Invalid step_index: {step_index}. Valid indices range from 0 to {len(plan.steps)-1}."
             )
 
-        if step_status and step_status not in [
-            "not_started",
-            "in_progress",
-            "completed",
-            "blocked",
-        ]:
+        if step_status and step_status not in STEP_STATUSES:
             raise ToolError(
                 f"Invalid step_status: {step_status}. Valid statuses are: not_started, in_progress, completed, blocked"
             )
 
-        if step_status:
-            plan["step_statuses"][step_index] = step_status
-
-        if step_notes:
-            plan["step_notes"][step_index] = step_notes
+        plan.mark(step_index, step_status, step_notes)
+        self._save(plan)
 
         return ToolResult(
-            output=f"Step {step_index} updated in plan '{plan_id}'.\n\n{self._format_plan(plan)}"
+            output=f"Step {step_index} updated in plan '{plan.plan_id}'.\n\n{plan.render()}"
         )
 
     def _delete_plan(self, plan_id: Optional[str]) -> ToolResult:
@@ -308,56 +559,13 @@ class PlanningTool(BaseTool):
         if not plan_id:
             raise ToolError("Parameter `plan_id` is required for command: delete")
 
-        if plan_id not in self.plans:
-            raise ToolError(f"No plan found with ID: {plan_id}")
-
+        self._require_plan(plan_id)
         del self.plans[plan_id]
+        if self.storage_dir:
+            self._plan_path(plan_id).unlink(missing_ok=True)
 
         # If the deleted plan was the active plan, clear the active plan
         if self._current_plan_id == plan_id:
             self._current_plan_id = None
 
         return ToolResult(output=f"Plan '{plan_id}' has been deleted.")
-
-    def _format_plan(self, plan: Dict) -> str:
-        """Format a plan for display."""
-        output = f"Plan: {plan['title']} (ID: {plan['plan_id']})\n"
-        output += "=" * len(output) + "\n\n"
-
-        # Calculate progress statistics
-        total_steps = len(plan["steps"])
-        completed = sum(1 for status in plan["step_statuses"] if status == "completed")
-        in_progress = sum(
-            1 for status in plan["step_statuses"] if status == "in_progress"
-        )
-        blocked = sum(1 for status in plan["step_statuses"] if status == "blocked")
-        not_started = sum(
-            1 for status in plan["step_statuses"] if status == "not_started"
-        )
-
-        output += f"Progress: {completed}/{total_steps} steps completed "
-        if total_steps > 0:
-            percentage = (completed / total_steps) * 100
-            output += f"({percentage:.1f}%)\n"
-        else:
-            output += "(0%)\n"
-
-        output += f"Status: {completed} completed, {in_progress} in progress, {blocked} blocked, {not_started} not started\n\n"
-        output += "Steps:\n"
-
-        # Add each step with its status and notes
-        for i, (step, status, notes) in enumerate(
-            zip(plan["steps"], plan["step_statuses"], plan["step_notes"])
-        ):
-            status_symbol = {
-                "not_started": "[ ]",
-                "in_progress": "[→]",
-                "completed": "[✓]",
-                "blocked": "[!]",
-            }.get(status, "[ ]")
-
-            output += f"{i}. {status_symbol} {step}\n"
-            if notes:
-                output += f"   Notes: {notes}\n"
-
-        return output
@@ -7,7 +7,7 @@ from typing import Any, DefaultDict, List, Literal, Optional, get_args
 from app.config import config
 from app.exceptions import ToolError
 from app.tool import BaseTool
-from app.tool.base import CLIResult, ToolResult
+from app.tool.base import CLIResult, ToolConcurrency, ToolResult
 from app.tool.file_operators import (
     FileOperator,
     LocalFileOperator,
@@ -111,6 +111,12 @@ class StrReplaceEditor(BaseTool):
             else self._local_operator
         )
 
+    def concurrency_for(self, command: str = None, **kwargs) -> ToolConcurrency:
+        """Views can run in parallel, edits must not overlap other calls."""
+        if command == "view":
+            return ToolConcurrency.READ_ONLY
+        return ToolConcurrency.SIDE_EFFECTING
+
     async def execute(
         self,
         *,
@@ -1,14 +1,19 @@
 import asyncio
+import time
+from collections import defaultdict
 from typing import Any, Dict, List, Optional
 
-import requests
-from bs4 import BeautifulSoup
 from pydantic import BaseModel, ConfigDict, Field, model_validator
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 from app.config import config
+from app.html_extract import extract_text_async
+from app.http_client import http_fetcher
 from app.logger import logger
-from app.tool.base import BaseTool, ToolResult
+from app.metrics import metrics
+from app.page_cache import get_page_cache
+from app.search_cache import SearchCache
+from app.tool.base import BaseTool, ToolConcurrency, ToolResult
 from app.tool.search import (
     BaiduSearchEngine,
     BingSearchEngine,
@@ -102,6 +107,54 @@ class SearchResponse(ToolResult):
         self.output = "\n".join(result_text)
         return self
 
+    @classmethod
+    def from_cache(cls, data: Dict[str, Any]) -> "SearchResponse":
+        """Rebuild a cached response as stored, without formatting it again."""
+        metadata = data.get("metadata")
+        return cls.model_construct(
+            **{
+                **data,
+                "results": [
+                    SearchResult.model_construct(**result)
+                    for result in data.get("results", [])
+                ],
+                "metadata": SearchMetadata.model_construct(**metadata)
+                if metadata
+                else None,
+            }
+        )
+
+
+class EngineHealth:
+    """Observed latency and failure rate of a search engine"""
+
+    # Weight of the newest sample in the moving averages
+    EWMA_ALPHA = 0.3
+
+    def __init__(self):
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+
+    def expected_latency(self) -> Optional[float]:
+        """Latency adjusted for failure rate, None until the engine was measured"""
+        if self.latency_ewma is None:
+            return None
+        return self.latency_ewma / max(0.05, 1 - self.error_ewma)
+
+    def record(self, latency: float, failed: bool) -> None:
+        # Failed attempts count too: the time was spent either way
+        alpha = self.EWMA_ALPHA
+        self.latency_ewma = (
+            latency
+            if self.latency_ewma is None
+            else alpha * latency + (1 - alpha) * self.latency_ewma
+        )
+        self.error_ewma = alpha * float(failed) + (1 - alpha) * self.error_ewma
+
+
+# Shared by all WebSearch instances so the engine order keeps adapting
+engine_health: Dict[str, EngineHealth] = defaultdict(EngineHealth)
+
 
 class WebContentFetcher:
     """Utility class for fetching web content."""
@@ -111,6 +164,9 @@ class WebContentFetcher:
         """
         Fetch and extract the main content from a webpage.
 
+        Pages are read through the shared page cache: fresh pages are served
+        from it, stale ones are revalidated with a conditional GET.
+
         Args:
             url: The URL to fetch content from
             timeout: Request timeout in seconds
@@ -118,45 +174,67 @@ class WebContentFetcher:
         Returns:
             Extracted text content or None if fetching fails
         """
-        headers = {
-            "WebSearch": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
+        cache = get_page_cache()
+        cached = cache.get(url, tool="web_search", content="text") if cache else None
+        if cached is not None and cache.is_fresh(cached):
+            return cached.text
 
         try:
-            # Use asyncio to run requests in a thread pool
-            response = await asyncio.get_event_loop().run_in_executor(
-                None, lambda: requests.get(url, headers=headers, timeout=timeout)
+            page = await http_fetcher.fetch(
+                url,
+                etag=cached.etag if cached else None,
+                last_modified=cached.last_modified if cached else None,
+                timeout=timeout,
+            )
+        except Exception as e:
+            logger.warning(f"Error fetching content from {url}: {e}")
+            return cached.text if cached else None
+
+        if page.not_modified and cached is not None:
+            metrics.incr("web_fetch_not_modified_total")
+            cache.touch(url)
+            return cached.text
+
+        if page.status_code != 200:
+            logger.warning(
+                f"Failed to fetch content from {url}: HTTP {page.status_code}"
             )
+            return None
+        if not page.text:
+            return None
 
-            if response.status_code != 200:
-                logger.warning(
-                    f"Failed to fetch content from {url}: HTTP {response.status_code}"
-                )
-                return None
+        try:
+            text = await extract_text_async(page.text)
+        except Exception as e:
+            logger.warning(f"Error extracting content from {url}: {e}")
+            return None
 
-            # Parse HTML with BeautifulSoup
-            soup = BeautifulSoup(response.text, "html.parser")
+        if text and cache is not None:
+            cache.put(url, text=text, etag=page.etag, last_modified=page.last_modified)
+        return text
 
-            # Remove script and style elements
-            for script in soup(["script", "style", "header", "footer", "nav"]):
-                script.extract()
 
-            # Get text content
-            text = soup.get_text(separator="\n", strip=True)
+_search_cache: Optional[SearchCache] = None
+_search_cache_loaded = False
 
-            # Clean up whitespace and limit size (100KB max)
-            text = " ".join(text.split())
-            return text[:10000] if text else None
 
-        except Exception as e:
-            logger.warning(f"Error fetching content from {url}: {e}")
-            return None
+def get_search_cache() -> Optional[SearchCache]:
+    """The process-wide search response cache, or None when it is disabled"""
+    global _search_cache, _search_cache_loaded
+    if not _search_cache_loaded:
+        _search_cache = SearchCache.from_settings(
+            encode=lambda response: response.model_dump(),
+            decode=SearchResponse.from_cache,
+        )
+        _search_cache_loaded = True
+    return _search_cache
 
 
 class WebSearch(BaseTool):
     """Search the web for information using various search engines."""
 
     name: str = "web_search"
+    concurrency: ToolConcurrency = ToolConcurrency.READ_ONLY
     description: str = """Search the web for real-time information about any topic.
     This tool returns comprehensive search results with relevant information, URLs, titles, and descriptions.
     If the primary search engine fails, it automatically falls back to alternative engines."""
@@ -219,18 +297,6 @@ class WebSearch(BaseTool):
         Returns:
             A structured response containing search results and metadata
         """
-        # Get settings from config
-        retry_delay = (
-            getattr(config.search_config, "retry_delay", 60)
-            if config.search_config
-            else 60
-        )
-        max_retries = (
-            getattr(config.search_config, "max_retries", 3)
-            if config.search_config
-            else 3
-        )
-
         # Use config values for lang and country if not specified
         if lang is None:
             lang = (
@@ -246,6 +312,37 @@ class WebSearch(BaseTool):
                 else "us"
             )
 
+        cache = get_search_cache()
+        if cache is None:
+            return await self._search(query, num_results, lang, country, fetch_content)
+
+        # Cached responses are shared, callers get a copy without re-formatting
+        response = await cache.get(
+            cache.key_for(query, num_results, lang, country, fetch_content),
+            lambda: self._search(query, num_results, lang, country, fetch_content),
+            cacheable=lambda response: not response.error,
+        )
+        return response.model_copy()
+
+    async def _search(
+        self,
+        query: str,
+        num_results: int,
+        lang: str,
+        country: str,
+        fetch_content: bool,
+    ) -> SearchResponse:
+        """Search with retries when every engine fails, without the cache."""
+        retry_delay = (
+            getattr(config.search_config, "retry_delay", 60)
+            if config.search_config
+            else 60
+        )
+        max_retries = (
+            getattr(config.search_config, "max_retries", 3)
+            if config.search_config
+            else 3
+        )
         search_params = {"lang": lang, "country": country}
 
         # Try searching with retries when all engines fail
@@ -290,18 +387,29 @@ class WebSearch(BaseTool):
     async def _try_all_engines(
         self, query: str, num_results: int, search_params: Dict[str, Any]
     ) -> List[SearchResult]:
-        """Try all search engines in the configured order."""
+        """Try all search engines, one after another or hedged per the config."""
         engine_order = self._get_engine_order()
-        failed_engines = []
+        settings = config.search_config
+        if settings and settings.strategy.lower() == "hedged":
+            return await self._race_engines(
+                engine_order,
+                query,
+                num_results,
+                search_params,
+                hedge_delay=settings.hedge_delay,
+                merge=settings.merge_results,
+                merge_window=settings.merge_window,
+            )
 
+        failed_engines = []
         for engine_name in engine_order:
-            engine = self._search_engine[engine_name]
             logger.info(f"🔎 Attempting search with {engine_name.capitalize()}...")
-            search_items = await self._perform_search_with_engine(
-                engine, query, num_results, search_params
+            search_items = await self._search_with_engine_name(
+                engine_name, query, num_results, search_params
             )
 
             if not search_items:
+                failed_engines.append(engine_name)
                 continue
 
             if failed_engines:
@@ -309,23 +417,158 @@ class WebSearch(BaseTool):
                     f"Search successful with {engine_name.capitalize()} after trying: {', '.join(failed_engines)}"
                 )
 
-            # Transform search items into structured results
-            return [
-                SearchResult(
-                    position=i + 1,
-                    url=item.url,
-                    title=item.title
-                    or f"Result {i+1}",  # Ensure we always have a title
-                    description=item.description or "",
-                    source=engine_name,
-                )
-                for i, item in enumerate(search_items)
-            ]
+            return self._to_results({engine_name: search_items}, num_results)
 
         if failed_engines:
             logger.error(f"All search engines failed: {', '.join(failed_engines)}")
         return []
 
+    async def _race_engines(
+        self,
+        engine_order: List[str],
+        query: str,
+        num_results: int,
+        search_params: Dict[str, Any],
+        hedge_delay: float,
+        merge: bool,
+        merge_window: float,
+    ) -> List[SearchResult]:
+        """Hedged search: start engines in order, staggered by hedge_delay.
+
+        The first engine with results wins and the others are cancelled. A
+        failed engine starts the next one right away. When merging, engines
+        already running get merge_window more seconds to add their results.
+        """
+        loop = asyncio.get_running_loop()
+        waiting = list(engine_order)
+        running: Dict[asyncio.Task, str] = {}
+        found: Dict[str, List[SearchItem]] = {}
+        merge_deadline: Optional[float] = None
+
+        def start_next() -> None:
+            engine_name = waiting.pop(0)
+            logger.info(f"🔎 Attempting search with {engine_name.capitalize()}...")
+            task = asyncio.create_task(
+                self._search_with_engine_name(
+                    engine_name, query, num_results, search_params
+                )
+            )
+            running[task] = engine_name
+
+        start_next()
+        while waiting and hedge_delay <= 0:
+            start_next()
+
+        try:
+            while running:
+                if merge_deadline is not None:
+                    timeout = max(0.0, merge_deadline - loop.time())
+                else:
+                    timeout = hedge_delay if waiting else None
+                done, _ = await asyncio.wait(
+                    running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if merge_deadline is not None:
+                        break
+                    start_next()
+                    continue
+
+                for task in done:
+                    engine_name = running.pop(task)
+                    if task.result():
+                        if not found:
+                            metrics.incr("search_hedge_wins_total", engine=engine_name)
+                        found[engine_name] = task.result()
+
+                if found:
+                    if not merge:
+                        break
+                    if merge_deadline is None:
+                        merge_deadline = loop.time() + merge_window
+                        waiting.clear()
+                elif waiting and not running:
+                    start_next()
+        finally:
+            for task in running:
+                task.cancel()
+
+        if not found:
+            logger.error(f"All search engines failed: {', '.join(engine_order)}")
+            return []
+        if len(found) > 1:
+            logger.info(f"Merged search results from: {', '.join(found)}")
+        return self._to_results(found, num_results)
+
+    @staticmethod
+    def _to_results(
+        found: Dict[str, List[SearchItem]], num_results: int
+    ) -> List[SearchResult]:
+        """Transform search items into structured results.
+
+        Results from several engines are interleaved by rank and deduplicated
+        by URL, keeping the first engine that returned each one.
+        """
+        if len(found) == 1:
+            engine_name, search_items = next(iter(found.items()))
+            ranked = [(engine_name, item) for item in search_items]
+        else:
+            ranked = []
+            seen = set()
+            depth = max(len(items) for items in found.values())
+            for rank in range(depth):
+                for engine_name, search_items in found.items():
+                    if rank >= len(search_items):
+                        continue
+                    item = search_items[rank]
+                    key = item.url.split("#")[0].rstrip("/").lower()
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    ranked.append((engine_name, item))
+            ranked = ranked[:num_results]
+
+        return [
+            SearchResult(
+                position=i + 1,
+                url=item.url,
+                title=item.title or f"Result {i+1}",  # Ensure we always have a title
+                description=item.description or "",
+                source=engine_name,
+            )
+            for i, (engine_name, item) in enumerate(ranked)
+        ]
+
+    async def _search_with_engine_name(
+        self,
+        engine_name: str,
+        query: str,
+        num_results: int,
+        search_params: Dict[str, Any],
+    ) -> List[SearchItem]:
+        """Search with one engine, recording its latency and health.
+
+        Returns an empty list when the engine fails or finds nothing.
+        """
+        start = time.monotonic()
+        try:
+            search_items = await self._perform_search_with_engine(
+                self._search_engine[engine_name], query, num_results, search_params
+            )
+        except asyncio.CancelledError:
+            # Lost a hedge race, says nothing about engine health
+            raise
+        except Exception as e:
+            logger.warning(f"Search with {engine_name.capitalize()} failed: {e}")
+            search_items = []
+
+        latency = time.monotonic() - start
+        engine_health[engine_name].record(latency, failed=not search_items)
+        metrics.observe("search_engine_latency_seconds", latency, engine=engine_name)
+        if not search_items:
+            metrics.incr("search_engine_errors_total", engine=engine_name)
+        return search_items
+
     async def _fetch_content_for_results(
         self, results: List[SearchResult]
     ) -> List[SearchResult]:
@@ -382,8 +625,33 @@ class WebSearch(BaseTool):
         )
         engine_order.extend([e for e in self._search_engine if e not in engine_order])
 
+        adaptive = (
+            getattr(config.search_config, "adaptive_order", True)
+            if config.search_config
+            else True
+        )
+        if adaptive:
+            engine_order = self._adapt_engine_order(engine_order)
+
         return engine_order
 
+    @staticmethod
+    def _adapt_engine_order(engine_order: List[str]) -> List[str]:
+        """Sort measured engines by expected latency within their own slots.
+
+        Engines without measurements keep their configured position, so the
+        preferred engine stays first until there is evidence against it.
+        """
+        measured = [
+            name
+            for name in engine_order
+            if engine_health[name].expected_latency() is not None
+        ]
+        ranked = iter(
+            sorted(measured, key=lambda name: engine_health[name].expected_latency())
+        )
+        return [next(ranked) if name in measured else name for name in engine_order]
+
     @retry(
         stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=10)
     )
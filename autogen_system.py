@@ -6,44 +6,109 @@
 
 import asyncio
 import json
-from typing import List, Dict, Any, Optional
+import time
+from collections import OrderedDict, deque
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable, Deque, Tuple
 from datetime import datetime
 
+# 单个智能体的默认超时时间（秒）
+AGENT_TIMEOUT = 60
+# 每个会话为每个智能体保留的对话轮数
+MAX_HISTORY_TURNS = 5
+# 会话状态上限：最多保留的会话数、空闲多久后过期（秒）
+MAX_SESSIONS = 1000
+SESSION_TTL = 3600
+# 未指定会话时使用的默认会话
+DEFAULT_SESSION = "default"
+
+
+class SessionStore:
+    """按用户/会话保存的有界状态：超过 max_sessions 时淘汰最久未使用的会话，
+    空闲超过 ttl 秒的会话在下次访问时过期"""
+
+    def __init__(self, factory: Callable[[], Any] = dict, max_sessions: int = MAX_SESSIONS,
+                 ttl: Optional[float] = SESSION_TTL):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        # session_id -> (最后访问时间, 状态)，按访问时间从旧到新排列
+        self._sessions: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, session_id: str) -> Any:
+        """获取会话状态，不存在时新建"""
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._sessions.pop(session_id, None)
+        state = entry[1] if entry else self.factory()
+        self._sessions[session_id] = (now, state)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return state
+
+    def discard(self, session_id: str) -> None:
+        """删除会话状态（如用户退出登录）"""
+        self._sessions.pop(session_id, None)
+
+    def _expire(self, now: float) -> None:
+        if self.ttl is None:
+            return
+        while self._sessions:
+            last_access, _ = next(iter(self._sessions.values()))
+            if now - last_access < self.ttl:
+                break
+            self._sessions.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
 class AutoGenAgent:
     """AutoGen智能体基类"""
     
-    def __init__(self, name: str, role: str, system_message: str):
+    def __init__(self, name: str, role: str, system_message: str, sessions: Optional[SessionStore] = None):
         self.name = name
         self.role = role
         self.system_message = system_message
-        self.conversation_history = []
+        # 各会话的对话历史（环形缓冲区），可与其他智能体共用同一个会话存储
+        self.sessions = sessions if sessions is not None else SessionStore()
     
-    async def generate_response(self, message: str, context: Dict = None) -> str:
-        """生成响应"""
-        try:
-            from app.llm import LLM
-            llm = LLM()
-            
-            # 构建上下文消息
-            messages = [{"role": "system", "content": self.system_message}]
-            
-            # 添加对话历史
-            for msg in self.conversation_history[-5:]:  # 保留最近5轮对话
-                messages.append(msg)
-            
-            # 添加当前消息
-            messages.append({"role": "user", "content": message})
-            
-            response = await llm.ask(messages)
-            
-            # 记录对话历史
-            self.conversation_history.append({"role": "user", "content": message})
-            self.conversation_history.append({"role": "assistant", "content": response})
-            
-            return response
-            
-        except Exception as e:
-            return f"智能体 {self.name} 响应错误: {str(e)}"
+    def get_history(self, session_id: Optional[str] = None) -> Deque[Dict[str, str]]:
+        """获取本智能体在某个会话中的对话历史（最多 MAX_HISTORY_TURNS 轮）"""
+        state = self.sessions.get(session_id or DEFAULT_SESSION)
+        history = state.get(self.name)
+        if history is None:
+            history = state[self.name] = deque(maxlen=MAX_HISTORY_TURNS * 2)
+        return history
+    
+    async def generate_response(self, message: str, context: Dict = None, sink=None,
+                                session_id: Optional[str] = None, priority=None) -> str:
+        """生成响应，传入 sink（app.llm_stream.StreamSink）时逐个token推送；
+        session_id 用于区分不同用户/会话的对话历史；
+        priority 为 LLM 排队优先级，默认按用户对话（INTERACTIVE）处理。
+        LLM调用失败时直接抛出异常，由调用方记为 error 状态（不计入法定人数）"""
+        from app.llm import LLM
+        from app.rate_limiter import Priority, llm_priority
+        llm = LLM()
+        
+        # 构建上下文消息
+        messages = [{"role": "system", "content": self.system_message}]
+        
+        # 添加对话历史（只保留最近几轮对话）
+        history = self.get_history(session_id)
+        messages.extend(history)
+        
+        # 添加当前消息
+        messages.append({"role": "user", "content": message})
+        
+        # 用户对话优先于后台任务排队
+        with llm_priority(Priority.INTERACTIVE if priority is None else priority):
+            response = await llm.ask(messages, sink=sink)
+        
+        # 记录对话历史
+        history.append({"role": "user", "content": message})
+        history.append({"role": "assistant", "content": response})
+        
+        return response
 
 class AutoGenOrchestrator:
     """AutoGen协调器 - 管理多智能体协作"""
@@ -51,6 +116,8 @@ class AutoGenOrchestrator:
     def __init__(self):
         self.agents = {}
         self.conversation_flow = []
+        # 所有智能体共用的会话存储，按用户/会话隔离且有界
+        self.sessions = SessionStore()
         self.setup_agents()
     
     def setup_agents(self):
@@ -66,7 +133,8 @@ class AutoGenOrchestrator:
 3. 提供专业的分析视角
 4. 为其他智能体提供分析基础
 
-请用专业、准确的语言回应，重点关注数据和事实。"""
+请用专业、准确的语言回应，重点关注数据和事实。""",
+            sessions=self.sessions
         )
         
         # 2. 创意师智能体
@@ -79,7 +147,8 @@ class AutoGenOrchestrator:
 3. 从创意角度优化建议
 4. 让复杂的概念变得易懂有趣
 
-请用生动、有创意的语言回应，注重用户体验和视觉效果。"""
+请用生动、有创意的语言回应，注重用户体验和视觉效果。""",
+            sessions=self.sessions
         )
         
         # 3. 技术专家智能体
@@ -92,7 +161,8 @@ class AutoGenOrchestrator:
 3. 优化系统架构和性能
 4. 解决技术难题
 
-请用准确、专业的技术语言回应，重点关注实现细节和最佳实践。"""
+请用准确、专业的技术语言回应，重点关注实现细节和最佳实践。""",
+            sessions=self.sessions
         )
         
         # 4. 产品经理智能体
@@ -105,7 +175,8 @@ class AutoGenOrchestrator:
 3. 提供产品化的解决方案
 4. 确保方案的可行性和用户价值
 
-请用清晰、实用的语言回应，重点关注用户价值和商业可行性。"""
+请用清晰、实用的语言回应，重点关注用户价值和商业可行性。""",
+            sessions=self.sessions
         )
         
         # 5. 协调者智能体
@@ -118,45 +189,76 @@ class AutoGenOrchestrator:
 3. 提供综合性的解决方案
 4. 确保回答的完整性和一致性
 
-请用综合、平衡的语言回应，整合所有智能体的优秀建议。"""
+请用综合、平衡的语言回应，整合所有智能体的优秀建议。""",
+            sessions=self.sessions
         )
     
-    async def process_with_multi_agents(self, user_message: str, selected_agents: List[str] = None) -> Dict[str, Any]:
-        """使用多智能体处理用户消息"""
-        
+    async def _run_agent(self, agent_name: str, user_message: str, timeout: Optional[float],
+                         sink=None, session_id: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+        """运行单个智能体，超时或出错时返回部分结果而不是抛出异常"""
+        agent = self.agents[agent_name]
+        started = time.monotonic()
+        try:
+            response = await asyncio.wait_for(
+                agent.generate_response(user_message, sink=sink, session_id=session_id), timeout
+            )
+            status = 'ok'
+        except asyncio.TimeoutError:
+            response = f"响应超时（超过 {timeout} 秒）"
+            status = 'timeout'
+        except Exception as e:
+            response = f"处理错误: {str(e)}"
+            status = 'error'
+        return agent_name, {
+            'agent': agent.name,
+            'role': agent.role,
+            'response': response,
+            'status': status,
+            'elapsed': round(time.monotonic() - started, 2)
+        }
+
+    async def stream_agent_responses(self, user_message: str, selected_agents: List[str] = None,
+                                     timeout: Optional[float] = AGENT_TIMEOUT,
+                                     session_id: Optional[str] = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """并发调用各智能体，按完成先后逐个返回 (智能体名, 结果)
+
+        提前结束迭代时，尚未完成的智能体会被取消。
+        """
         if selected_agents is None:
             selected_agents = ['analyst', 'creative', 'technical', 'product']
-        
-        # 第一阶段：各智能体独立分析
-        agent_responses = {}
-        
-        for agent_name in selected_agents:
-            if agent_name in self.agents:
-                agent = self.agents[agent_name]
-                try:
-                    response = await agent.generate_response(user_message)
-                    agent_responses[agent_name] = {
-                        'agent': agent.name,
-                        'role': agent.role,
-                        'response': response
-                    }
-                except Exception as e:
-                    agent_responses[agent_name] = {
-                        'agent': agent.name,
-                        'role': agent.role,
-                        'response': f"处理错误: {str(e)}"
-                    }
-        
-        # 第二阶段：协调者整合所有建议
-        coordinator = self.agents['coordinator']
-        
-        # 构建协调者的输入
+
+        tasks = [
+            asyncio.create_task(self._run_agent(agent_name, user_message, timeout, session_id=session_id))
+            for agent_name in selected_agents if agent_name in self.agents
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _skipped_response(self, agent_name: str) -> Dict[str, Any]:
+        """达到法定人数后被取消的智能体的占位结果"""
+        agent = self.agents[agent_name]
+        return {
+            'agent': agent.name,
+            'role': agent.role,
+            'response': "已跳过（协调者已根据其他智能体的结果开始整合）",
+            'status': 'skipped',
+            'elapsed': None
+        }
+
+    def _build_coordination_input(self, user_message: str, agent_responses: Dict[str, Dict[str, Any]]) -> str:
+        """构建协调者的输入"""
         coordination_input = f"""用户问题: {user_message}
 
 各智能体的分析结果：
 """
         
         for agent_name, response_data in agent_responses.items():
+            if response_data['status'] == 'skipped':
+                continue
             coordination_input += f"""
 {response_data['agent']} ({response_data['role']}):
 {response_data['response']}
@@ -165,21 +267,131 @@ class AutoGenOrchestrator:
         
         coordination_input += """
 请整合以上所有智能体的建议，提供一个综合、完整、实用的解决方案。"""
+        return coordination_input
+
+    async def stream_multi_agents(self, user_message: str, selected_agents: List[str] = None,
+                                  quorum: Optional[int] = None,
+                                  agent_timeout: Optional[float] = AGENT_TIMEOUT,
+                                  session_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """以事件流的形式运行多智能体协作，便于通过SSE实时推送
+
+        依次产生的事件（字典，type 字段区分）：
+        - agent_started: 智能体开始处理 (agent, name, role)
+        - agent_token: 智能体输出的一个token (agent, content)
+        - agent_done: 智能体完成 (agent, name, role, response, status, elapsed)
+          status 为 ok / timeout / error
+        - coordinator_token: 协调者输出的一个token (content)
+        - coordinator_done: 全部完成 (response, agent_responses, timestamp, agents_used)
+
+        session_id（如用户ID）用于隔离不同用户的对话历史。
+        各智能体并发运行；设置 quorum 后，只要有 quorum 个智能体成功回答，
+        协调者就立即开始整合，其余智能体会被取消。
+        """
+        from app.llm_stream import CallbackSink, QueueSink, stream_to_sink
+
+        if selected_agents is None:
+            selected_agents = ['analyst', 'creative', 'technical', 'product']
+        agent_names = [agent_name for agent_name in selected_agents if agent_name in self.agents]
+
+        # 第一阶段：各智能体并发独立分析，事件汇总到同一个队列
+        events: asyncio.Queue = asyncio.Queue()
+
+        async def run_agent(agent_name: str) -> None:
+            agent = self.agents[agent_name]
+            await events.put({'type': 'agent_started', 'agent': agent_name, 'name': agent.name, 'role': agent.role})
+            sink = CallbackSink(
+                lambda token: events.put({'type': 'agent_token', 'agent': agent_name, 'content': token})
+            )
+            _, response_data = await self._run_agent(agent_name, user_message, agent_timeout, sink, session_id)
+            await events.put({
+                'type': 'agent_done',
+                'agent': agent_name,
+                'name': response_data['agent'],
+                'role': response_data['role'],
+                'response': response_data['response'],
+                'status': response_data['status'],
+                'elapsed': response_data['elapsed']
+            })
+
+        agent_responses = {}
+        answered = 0
+        tasks = [asyncio.create_task(run_agent(agent_name)) for agent_name in agent_names]
+        try:
+            while len(agent_responses) < len(tasks):
+                event = await events.get()
+                yield event
+                if event['type'] != 'agent_done':
+                    continue
+                agent_responses[event['agent']] = {
+                    'agent': event['name'],
+                    'role': event['role'],
+                    'response': event['response'],
+                    'status': event['status'],
+                    'elapsed': event['elapsed']
+                }
+                if event['status'] == 'ok':
+                    answered += 1
+                if quorum is not None and answered >= quorum:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        # 按选择顺序排列，使协调者的输入保持稳定
+        agent_responses = {
+            agent_name: agent_responses.get(agent_name) or self._skipped_response(agent_name)
+            for agent_name in agent_names
+        }
         
+        # 第二阶段：协调者整合所有建议
+        coordinator = self.agents['coordinator']
+        coordination_input = self._build_coordination_input(user_message, agent_responses)
+        sink = QueueSink()
+        coordinator_task = asyncio.create_task(
+            stream_to_sink(
+                coordinator.generate_response(coordination_input, sink=sink, session_id=session_id), sink
+            )
+        )
         try:
-            final_response = await coordinator.generate_response(coordination_input)
+            async for token in sink:
+                yield {'type': 'coordinator_token', 'content': token}
+            final_response = await coordinator_task
         except Exception as e:
             final_response = f"协调整合时出现错误: {str(e)}"
+        finally:
+            # 客户端断开时停止生成
+            if not coordinator_task.done():
+                coordinator_task.cancel()
         
-        return {
+        yield {
+            'type': 'coordinator_done',
             'user_message': user_message,
             'agent_responses': agent_responses,
-            'final_response': final_response,
+            'response': final_response,
             'timestamp': datetime.now().isoformat(),
             'agents_used': selected_agents
         }
+
+    async def process_with_multi_agents(self, user_message: str, selected_agents: List[str] = None,
+                                        quorum: Optional[int] = None,
+                                        agent_timeout: Optional[float] = AGENT_TIMEOUT,
+                                        session_id: Optional[str] = None) -> Dict[str, Any]:
+        """使用多智能体处理用户消息，返回完整结果（流式版本见 stream_multi_agents）"""
+        result = {}
+        async for event in self.stream_multi_agents(user_message, selected_agents, quorum, agent_timeout, session_id):
+            if event['type'] == 'coordinator_done':
+                result = event
+        
+        return {
+            'user_message': user_message,
+            'agent_responses': result.get('agent_responses', {}),
+            'final_response': result.get('response', ''),
+            'timestamp': result.get('timestamp', datetime.now().isoformat()),
+            'agents_used': result.get('agents_used', selected_agents)
+        }
     
-    async def get_smart_recommendations(self, conversation_history: List[Dict]) -> List[str]:
+    async def get_smart_recommendations(self, conversation_history: List[Dict],
+                                        session_id: Optional[str] = None) -> List[str]:
         """基于对话历史生成智能推荐问题"""
         
         # 分析对话历史，生成相关推荐
@@ -205,8 +417,11 @@ class AutoGenOrchestrator:
 
 请只返回4个问题，每行一个，不要其他解释。"""
         
+        from app.rate_limiter import Priority
         try:
-            recommendations_text = await analyst.generate_response(recommendation_prompt)
+            # 推荐问题不是用户在等的回答，排在用户对话之后
+            recommendations_text = await analyst.generate_response(
+                recommendation_prompt, session_id=session_id, priority=Priority.BACKGROUND)
             recommendations = [line.strip() for line in recommendations_text.split('\n') if line.strip()]
             return recommendations[:4]  # 确保只返回4个
         except:
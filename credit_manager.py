@@ -5,11 +5,15 @@
 """
 
 import json
+import math
 import os
 from datetime import datetime, timedelta
 from typing import Dict, Optional
 
 class CreditManager:
+    # 每积分对应的token数（约2000 token的对话消耗10积分）
+    TOKENS_PER_CREDIT = 200
+
     def __init__(self, credits_file="user_credits.json"):
         self.credits_file = credits_file
         self.user_credits = {}
@@ -114,6 +118,29 @@ class CreditManager:
         
         return False
     
+    def calculate_token_cost(self, prompt_tokens: int, completion_tokens: int) -> int:
+        """按token用量计算积分消耗（折扣前）"""
+        total_tokens = prompt_tokens + completion_tokens
+        return max(1, math.ceil(total_tokens / self.TOKENS_PER_CREDIT))
+    
+    def use_token_credits(self, user_id: str, prompt_tokens: int, completion_tokens: int) -> int:
+        """按实际token用量扣除积分（自动应用折扣），余额不足时扣至0，返回实际扣除的积分"""
+        user_credit = self.get_user_credits(user_id)
+        if not user_credit:
+            return 0
+        
+        amount = self.calculate_token_cost(prompt_tokens, completion_tokens)
+        discount = user_credit.get('credit_discount', 0)
+        if discount > 0:
+            # 折扣后向上取整，保证每次对话至少扣1积分
+            amount = math.ceil(amount * (100 - discount) / 100)
+        # 回答已经生成，余额不足时只扣到0
+        amount = min(amount, user_credit['current_credits'])
+        user_credit['current_credits'] -= amount
+        user_credit['used_credits'] += amount
+        self.save_data()
+        return amount
+    
     def calculate_discounted_cost(self, user_id: str, amount: int) -> int:
         """计算折扣后的积分消耗"""
         user_credit = self.get_user_credits(user_id)
@@ -125,6 +152,13 @@ class CreditManager:
             return int(amount * (100 - discount) / 100)
         return amount
     
+    def get_agent_collaboration_limit(self, user_id: str) -> int:
+        """获取单次多智能体协作可调用的智能体数量（0 表示当前计划不支持）"""
+        user_credit = self.get_user_credits(user_id)
+        if not user_credit:
+            return 0
+        return user_credit.get('agent_collaboration', 0)
+    
     def daily_refresh_credits(self, user_id: str):
         """每日刷新积分"""
         user_credit = self.get_user_credits(user_id)
@@ -0,0 +1,80 @@
+"""Time a multi-step plan with per-run agent cleanup and with the resources
+kept warm by shared_agent_resources().
+
+The executor stands in for a browser or MCP agent: its tools take a while
+to set up on first use and are torn down by cleanup().
+
+Usage: python -m tests.bench_agent_resources [steps] [setup_seconds]
+"""
+
+import asyncio
+import sys
+import time
+
+from app.agent.base import BaseAgent, shared_agent_resources
+
+
+class WarmingAgent(BaseAgent):
+    """Sets its tools up on first use and tears them down in cleanup()"""
+
+    setup_seconds: float = 0.3
+    ready: bool = False
+    setups: int = 0
+    cleanups: int = 0
+    max_steps: int = 1
+
+    async def step(self) -> str:
+        if not self.ready:
+            await asyncio.sleep(self.setup_seconds)
+            self.ready = True
+            self.setups += 1
+        return "done"
+
+    async def cleanup(self) -> None:
+        self.ready = False
+        self.cleanups += 1
+
+    async def run(self, request=None) -> str:
+        # Same lifecycle as ToolCallAgent.run
+        try:
+            return await super().run(request)
+        finally:
+            if not self._defer_cleanup():
+                await self.cleanup()
+
+
+async def run_plan(agent: BaseAgent, steps: int) -> None:
+    for step in range(steps):
+        await agent.run(f"step {step}")
+
+
+async def main(steps: int = 5, setup_seconds: float = 0.3) -> None:
+    per_run = WarmingAgent(name="per-run", setup_seconds=setup_seconds)
+    start = time.perf_counter()
+    await run_plan(per_run, steps)
+    per_run_seconds = time.perf_counter() - start
+
+    shared = WarmingAgent(name="shared", setup_seconds=setup_seconds)
+    start = time.perf_counter()
+    async with shared_agent_resources():
+        await run_plan(shared, steps)
+    shared_seconds = time.perf_counter() - start
+
+    print(f"{steps}-step plan, {setup_seconds}s tool setup")
+    for label, agent, seconds in (
+        ("per-run cleanup", per_run, per_run_seconds),
+        ("shared_agent_resources", shared, shared_seconds),
+    ):
+        print(
+            f"{label:<24}{seconds:>8.2f}s  {agent.setups} setups  "
+            f"{agent.cleanups} cleanups"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            int(sys.argv[1]) if len(sys.argv) > 1 else 5,
+            float(sys.argv[2]) if len(sys.argv) > 2 else 0.3,
+        )
+    )
@@ -0,0 +1,43 @@
+"""Time the HTML extractors on the saved pages in fixtures/html.
+
+Usage: python -m tests.bench_html_extract [repeat]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+from app.html_extract import EXTRACTORS, get_extractor
+
+
+CORPUS = Path(__file__).parent / "fixtures" / "html"
+
+
+def main(repeat: int = 200) -> None:
+    pages = {
+        path.name: path.read_text(encoding="utf-8")
+        for path in sorted(CORPUS.glob("*.html"))
+    }
+    # Also a large page, where the budget and early termination matter
+    pages["wordpress_post.html x50"] = pages["wordpress_post.html"] * 50
+
+    print(f"{'extractor':<12}" + "".join(f"{name:>26}" for name in pages))
+    for name in EXTRACTORS:
+        try:
+            extractor = get_extractor(name)
+        except ImportError:
+            continue
+        if extractor.name != name:
+            # Not installed, get_extractor fell back to html.parser
+            continue
+        row = []
+        for html in pages.values():
+            start = time.perf_counter()
+            for _ in range(repeat):
+                extractor.extract(html)
+            row.append(f"{(time.perf_counter() - start) / repeat * 1000:.3f} ms")
+        print(f"{name:<12}" + "".join(f"{cell:>26}" for cell in row))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,72 @@
+"""Time and allocations of formatting an agent history for the LLM, with and
+without the per-message serialization cache.
+
+The uncached row formats the same history given as plain dicts, which are
+converted from scratch on every call; the cached rows use Message objects.
+
+Usage: python -m tests.bench_message_format [repeat]
+"""
+
+import base64
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, List
+
+from app.llm import LLM
+from app.schema import Message
+
+
+def history(steps: int = 50, image_bytes: int = 300_000) -> List[Message]:
+    """A browser agent run: a prompt and an observation per step, with a
+    screenshot on every other observation"""
+    messages = []
+    for step in range(steps):
+        image = base64.b64encode(os.urandom(image_bytes)).decode()
+        messages.append(Message.user_message(f"step {step} " * 20))
+        messages.append(
+            Message.tool_message(
+                "observation " * 200,
+                name="browser_use",
+                tool_call_id=f"call_{step}",
+                base64_image=image if step % 2 == 0 else None,
+            )
+        )
+    return messages
+
+
+def measure(call: Callable[[], object], repeat: int) -> str:
+    call()
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        call()
+    elapsed = (time.perf_counter() - start) / repeat
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return f"{elapsed * 1000:>10.3f} ms {peak / 1e6:>10.2f} MB"
+
+
+def main(repeat: int = 20) -> None:
+    messages = history()
+    dicts = [message.to_dict() for message in messages]
+
+    print(f"{'':<36}{'per call':>13}{'peak alloc':>14}")
+    rows = {
+        "format_messages, dicts (uncached)": lambda: LLM.format_messages(dicts, True),
+        "format_messages, Messages (cached)": lambda: LLM.format_messages(
+            messages, True
+        ),
+        "format_messages, last 5 images": lambda: LLM.format_messages(
+            messages, True, max_images=5
+        ),
+        "format_messages, text only": lambda: LLM.format_messages(messages),
+        "Message.to_dict": lambda: [message.to_dict() for message in messages],
+    }
+    for name, call in rows.items():
+        print(f"{name:<36}{measure(call, repeat)}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
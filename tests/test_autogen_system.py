@@ -0,0 +1,185 @@
+import asyncio
+import tracemalloc
+from types import SimpleNamespace
+from typing import Dict, List
+
+import pytest
+
+import autogen_system
+from app.llm import LLM
+from autogen_system import (
+    MAX_HISTORY_TURNS,
+    AutoGenAgent,
+    AutoGenOrchestrator,
+    SessionStore,
+)
+
+
+def chunk(content=None, usage=None):
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=content))]
+    return SimpleNamespace(choices=choices if content else [], usage=usage)
+
+
+class FakeCompletions:
+    """Streams a short answer per agent after that agent's delay"""
+
+    def __init__(self, orchestrator: AutoGenOrchestrator, delays: Dict[str, float]):
+        self.agents = {
+            agent.system_message: name for name, agent in orchestrator.agents.items()
+        }
+        self.delays = delays
+        self.started: List[str] = []
+        self.cancelled: List[str] = []
+
+    async def create(self, llm, input_tokens=0, **params):
+        agent = self.agents[params["messages"][0]["content"]]
+        self.started.append(agent)
+        try:
+            await asyncio.sleep(self.delays.get(agent, 0))
+        except asyncio.CancelledError:
+            self.cancelled.append(agent)
+            raise
+        return self._stream(agent)
+
+    @staticmethod
+    async def _stream(agent: str):
+        yield chunk(f"{agent} answer")
+        yield chunk(
+            usage=SimpleNamespace(
+                prompt_tokens=10, completion_tokens=2, total_tokens=12
+            )
+        )
+
+
+@pytest.fixture
+def orchestrator():
+    return AutoGenOrchestrator()
+
+
+def pending_tasks() -> List[asyncio.Task]:
+    return [
+        task
+        for task in asyncio.all_tasks()
+        if task is not asyncio.current_task() and not task.done()
+    ]
+
+
+def fake_llm(monkeypatch, orchestrator, delays: Dict[str, float]) -> FakeCompletions:
+    completions = FakeCompletions(orchestrator, delays)
+    monkeypatch.setattr(LLM, "_create_completion", completions.create)
+    return completions
+
+
+@pytest.mark.asyncio
+async def test_agent_timeout_stops_the_llm_call(monkeypatch, orchestrator):
+    completions = fake_llm(monkeypatch, orchestrator, {"analyst": 10})
+
+    _, result = await orchestrator._run_agent("analyst", "question", timeout=0.05)
+    await asyncio.sleep(0.1)
+
+    assert result["status"] == "timeout"
+    assert not pending_tasks()
+    assert completions.cancelled == ["analyst"]
+    # The cancelled call was not retried
+    assert completions.started == ["analyst"]
+
+
+@pytest.mark.asyncio
+async def test_quorum_stops_the_slow_agents(monkeypatch, orchestrator):
+    completions = fake_llm(
+        monkeypatch, orchestrator, {"creative": 10, "technical": 10, "product": 10}
+    )
+
+    result = await orchestrator.process_with_multi_agents(
+        "question", quorum=1, session_id="quorum"
+    )
+    await asyncio.sleep(0.1)
+
+    statuses = {name: r["status"] for name, r in result["agent_responses"].items()}
+    assert statuses == {
+        "analyst": "ok",
+        "creative": "skipped",
+        "technical": "skipped",
+        "product": "skipped",
+    }
+    assert result["final_response"] == "coordinator answer"
+    assert not pending_tasks()
+    assert sorted(completions.cancelled) == ["creative", "product", "technical"]
+    assert sorted(completions.started) == [
+        "analyst",
+        "coordinator",
+        "creative",
+        "product",
+        "technical",
+    ]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(autogen_system.time, "monotonic", fake)
+    return fake
+
+
+def test_session_store_evicts_least_recently_used():
+    store = SessionStore(max_sessions=3, ttl=None)
+    for session in ("a", "b", "c"):
+        store.get(session)["turns"] = session
+    store.get("a")  # a is now the most recently used
+    store.get("d")
+
+    assert len(store) == 3
+    assert store.get("a") == {"turns": "a"}
+    assert store.get("c") == {"turns": "c"}
+    # b was evicted and comes back empty
+    assert store.get("b") == {}
+
+
+def test_session_store_expires_idle_sessions(clock):
+    store = SessionStore(max_sessions=10, ttl=60)
+    store.get("idle")["turns"] = 1
+    clock.now += 30
+    store.get("active")["turns"] = 2
+    clock.now += 40
+
+    # idle was last used 70s ago, active 40s ago
+    assert store.get("active") == {"turns": 2}
+    assert len(store) == 1
+    assert store.get("idle") == {}
+
+
+def test_session_memory_stays_bounded_over_many_sessions():
+    sessions = SessionStore(max_sessions=1000, ttl=None)
+    agent = AutoGenAgent("analyst", "analyst", "system", sessions=sessions)
+
+    def converse(first: int, last: int) -> None:
+        for session in range(first, last):
+            history = agent.get_history(f"user-{session}")
+            for turn in range(MAX_HISTORY_TURNS + 3):
+                history.append({"role": "user", "content": f"question {turn}"})
+                history.append({"role": "assistant", "content": "answer " * 20})
+
+    tracemalloc.start()
+    try:
+        converse(0, 2000)
+        at_2k = tracemalloc.get_traced_memory()[0]
+        converse(2000, 10000)
+        at_10k = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    assert len(sessions) == 1000
+    assert all(
+        len(history) == MAX_HISTORY_TURNS * 2
+        for _, state in sessions._sessions.values()
+        for history in state.values()
+    )
+    assert at_10k < at_2k * 1.1
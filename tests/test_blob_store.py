@@ -0,0 +1,40 @@
+import pytest
+
+from app import schema
+from app.blob_store import BlobStore
+from app.schema import Message
+
+
+def spilled_store(tmp_path) -> BlobStore:
+    """A store that keeps a single blob in memory and spills the rest"""
+    return BlobStore(max_memory_mb=1 / 1024 / 1024, directory=tmp_path)
+
+
+def test_spilled_blob_is_read_back(tmp_path):
+    store = spilled_store(tmp_path)
+    first = store.put("first image")
+    store.put("second image")
+
+    assert store.get(first) == "first image"
+
+
+def test_missing_spill_file_raises_key_error(tmp_path):
+    store = spilled_store(tmp_path)
+    first = store.put("first image")
+    store.put("second image")
+    store._path(first).unlink()
+
+    with pytest.raises(KeyError):
+        store.get(first)
+    assert first not in store
+    assert store._disk_size == 0
+
+
+def test_message_without_readable_image_has_none(tmp_path, monkeypatch):
+    store = spilled_store(tmp_path)
+    monkeypatch.setattr(schema, "image_store", store)
+    message = Message.user_message("look", base64_image="screenshot")
+    store.put("newer screenshot")
+    store._path(message.image_ref).unlink()
+
+    assert message.base64_image is None
@@ -0,0 +1,223 @@
+import asyncio
+from typing import Optional
+
+import httpx
+import openai
+import pytest
+
+from app.circuit_breaker import (
+    CircuitBreaker,
+    CircuitState,
+    RetryBudget,
+    is_retryable,
+    llm_retry,
+)
+from app.config import ResilienceSettings
+from app.exceptions import CircuitOpenError
+from app.llm_router import RoutedEndpoint
+
+
+def server_error() -> openai.InternalServerError:
+    request = httpx.Request("POST", "http://llm.test/v1/chat/completions")
+    return openai.InternalServerError(
+        "boom", response=httpx.Response(503, request=request), body=None
+    )
+
+
+class FakeClient:
+    """Chat completions client answering after a delay, or failing"""
+
+    def __init__(self, delay: float = 0.0, error: Optional[Exception] = None):
+        self.delay = delay
+        self.error = error
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **params):
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return params["model"]
+
+
+def make_breaker(name: str, **overrides) -> CircuitBreaker:
+    settings = ResilienceSettings(
+        **{"failure_threshold": 2, "recovery_timeout": 0.05, **overrides}
+    )
+    return CircuitBreaker(name, settings)
+
+
+def make_endpoint(name: str, client: FakeClient) -> RoutedEndpoint:
+    CircuitBreaker._breakers[name] = make_breaker(name)
+    return RoutedEndpoint(name, "model", client)
+
+
+async def wait_for_half_open(breaker: CircuitBreaker) -> None:
+    await asyncio.sleep(breaker.recovery_timeout + 0.01)
+    assert breaker.state == CircuitState.HALF_OPEN
+
+
+def test_opens_after_consecutive_failures():
+    breaker = make_breaker("opens")
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitState.CLOSED
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_success_resets_failure_count():
+    breaker = make_breaker("resets")
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_retry_after_extends_open_period():
+    breaker = make_breaker("retry-after")
+    breaker.record_failure()
+    breaker.record_failure(retry_after=30)
+    assert breaker.snapshot()["retry_after"] > 29
+
+
+@pytest.mark.asyncio
+async def test_half_open_admits_limited_trials():
+    breaker = make_breaker("trials")
+    breaker.record_failure()
+    breaker.record_failure()
+    await wait_for_half_open(breaker)
+
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CircuitState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_half_open_failure_reopens():
+    breaker = make_breaker("reopens", failure_threshold=5)
+    for _ in range(5):
+        breaker.record_failure()
+    await wait_for_half_open(breaker)
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN
+
+
+@pytest.mark.asyncio
+async def test_release_returns_half_open_slot():
+    breaker = make_breaker("release")
+    breaker.record_failure()
+    breaker.record_failure()
+    await wait_for_half_open(breaker)
+
+    breaker.before_call()
+    breaker.release()
+    breaker.before_call()
+    assert breaker.state == CircuitState.HALF_OPEN
+
+
+def test_release_when_closed_is_a_no_op():
+    breaker = make_breaker("release-closed")
+    breaker.before_call()
+    breaker.release()
+    assert breaker.state == CircuitState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_cancelled_trial_call_does_not_wedge_breaker():
+    endpoint = make_endpoint("cancelled-trial", FakeClient(delay=10))
+    endpoint.breaker.record_failure()
+    endpoint.breaker.record_failure()
+    await wait_for_half_open(endpoint.breaker)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(endpoint.create(messages=[]), timeout=0.01)
+    assert endpoint.inflight == 0
+
+    # The slot came back: the next trial is admitted and closes the circuit
+    endpoint.client.delay = 0
+    assert await endpoint.create(messages=[]) == "model"
+    assert endpoint.breaker.state == CircuitState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_endpoint_failures_trip_the_breaker():
+    endpoint = make_endpoint("failing", FakeClient(error=server_error()))
+    for _ in range(2):
+        with pytest.raises(openai.InternalServerError):
+            await endpoint.create(messages=[])
+    assert endpoint.breaker.state == CircuitState.OPEN
+    assert not endpoint.available
+    with pytest.raises(CircuitOpenError):
+        await endpoint.create(messages=[])
+
+
+@pytest.mark.asyncio
+async def test_client_errors_do_not_trip_the_breaker():
+    request = httpx.Request("POST", "http://llm.test/v1/chat/completions")
+    error = openai.BadRequestError(
+        "bad", response=httpx.Response(400, request=request), body=None
+    )
+    endpoint = make_endpoint("bad-request", FakeClient(error=error))
+    for _ in range(3):
+        with pytest.raises(openai.BadRequestError):
+            await endpoint.create(messages=[])
+    assert endpoint.breaker.state == CircuitState.CLOSED
+
+
+def test_retry_budget_limits_retries_to_ratio_of_requests():
+    budget = RetryBudget(ratio=0.5, min_per_second=0, max_balance=2)
+    # Starts with max_balance * ratio = 1 retry
+    assert budget.try_acquire()
+    assert not budget.try_acquire()
+
+    budget.record_request()
+    assert not budget.try_acquire()
+    budget.record_request()
+    assert budget.try_acquire()
+
+
+def test_retry_budget_balance_is_capped():
+    budget = RetryBudget(ratio=1, min_per_second=0, max_balance=3)
+    for _ in range(10):
+        budget.record_request()
+    assert [budget.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+
+@pytest.mark.parametrize(
+    "error, expected",
+    [
+        (server_error(), True),
+        (ValueError("bad json"), True),
+        (CircuitOpenError("llm", 1.0), False),
+        (asyncio.CancelledError(), False),
+        (KeyboardInterrupt(), False),
+    ],
+)
+def test_is_retryable(error, expected):
+    assert is_retryable(error) is expected
+
+
+@pytest.mark.asyncio
+async def test_cancelled_call_is_not_retried():
+    calls = []
+
+    @llm_retry(ResilienceSettings(max_attempts=3))
+    async def slow_call():
+        calls.append(1)
+        await asyncio.sleep(10)
+        return "done"
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(slow_call(), timeout=0.05)
+    await asyncio.sleep(0.1)
+    assert len(calls) == 1
@@ -0,0 +1,134 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Dict, List
+
+import pytest
+
+from app.agent.base import BaseAgent
+from app.flow.ensemble import EnsembleFlow
+from app.llm import LLM
+from app.schema import AgentState, Message
+
+
+class AskingAgent(BaseAgent):
+    """Answers in one step with a single LLM call"""
+
+    async def step(self) -> str:
+        answer = await self.llm.ask(
+            [Message.user_message("task")],
+            system_msgs=[Message.system_message(self.name)],
+        )
+        self.state = AgentState.FINISHED
+        return answer
+
+
+def chunk(content=None, usage=None):
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=content))]
+    return SimpleNamespace(choices=choices if content else [], usage=usage)
+
+
+class FakeCompletions:
+    """Streams "<agent> answer" after the agent's delay; the judge picks [0]"""
+
+    def __init__(self, delays: Dict[str, float]):
+        self.delays = delays
+        self.started: List[str] = []
+        self.cancelled: List[str] = []
+        self.judged: List[str] = []
+
+    async def create(self, llm, input_tokens=0, **params):
+        if not params["stream"]:
+            self.judged.append(params["messages"][-1]["content"])
+            message = SimpleNamespace(content="[0]")
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=message)],
+                usage=SimpleNamespace(prompt_tokens=1, completion_tokens=1),
+            )
+
+        agent = params["messages"][0]["content"]
+        self.started.append(agent)
+        try:
+            await asyncio.sleep(self.delays.get(agent, 0))
+        except asyncio.CancelledError:
+            self.cancelled.append(agent)
+            raise
+        return self._stream(agent)
+
+    @staticmethod
+    async def _stream(agent: str):
+        yield chunk(f"{agent} answer")
+        yield chunk(
+            usage=SimpleNamespace(
+                prompt_tokens=10, completion_tokens=2, total_tokens=12
+            )
+        )
+
+
+def fake_llm(monkeypatch, delays: Dict[str, float]) -> FakeCompletions:
+    completions = FakeCompletions(delays)
+    monkeypatch.setattr(LLM, "_create_completion", completions.create)
+    return completions
+
+
+def ensemble(*names: str, **options) -> EnsembleFlow:
+    return EnsembleFlow({name: AskingAgent(name=name) for name in names}, **options)
+
+
+def pending_tasks() -> List[asyncio.Task]:
+    return [
+        task
+        for task in asyncio.all_tasks()
+        if task is not asyncio.current_task() and not task.done()
+    ]
+
+
+@pytest.mark.asyncio
+async def test_agent_timeout_stops_the_agent(monkeypatch):
+    completions = fake_llm(monkeypatch, {"slow": 10})
+    flow = ensemble("fast", "slow", agent_timeout=0.2)
+
+    result = await flow.execute("task")
+    await asyncio.sleep(0.1)
+
+    assert result == "Step 1: fast answer"
+    statuses = {c.agent: c.status for c in flow.last_report.candidates}
+    assert statuses == {"fast": "ok", "slow": "timeout"}
+    assert completions.cancelled == ["slow"]
+    assert sorted(completions.started) == ["fast", "slow"]
+    assert not pending_tasks()
+
+
+@pytest.mark.asyncio
+async def test_losers_are_stopped_once_a_result_is_accepted(monkeypatch):
+    completions = fake_llm(monkeypatch, {"slow": 10})
+    flow = ensemble("fast", "slow", validator=lambda result: True)
+
+    assert await flow.execute("task") == "Step 1: fast answer"
+    await asyncio.sleep(0.1)
+
+    assert flow.last_report.decided_by == "validator"
+    assert completions.cancelled == ["slow"]
+    assert not pending_tasks()
+
+
+@pytest.mark.asyncio
+async def test_rejected_results_are_not_judged(monkeypatch):
+    completions = fake_llm(monkeypatch, {})
+    flow = ensemble("first", "second", validator=lambda result: False)
+
+    result = await flow.execute("task")
+
+    assert result.startswith("Execution failed")
+    assert flow.last_report.decided_by == "no_result"
+    assert completions.judged == []
+
+
+@pytest.mark.asyncio
+async def test_judge_picks_among_finished_results(monkeypatch):
+    completions = fake_llm(monkeypatch, {"second": 0.05})
+    flow = ensemble("first", "second")
+
+    assert await flow.execute("task") == "Step 1: first answer"
+    assert flow.last_report.decided_by == "judge"
+    assert len(completions.judged) == 1
+    assert "second answer" in completions.judged[0]
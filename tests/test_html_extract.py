@@ -0,0 +1,149 @@
+from pathlib import Path
+
+import pytest
+
+from app.html_extract import EXTRACTORS, extract_text, get_extractor, is_boilerplate
+
+
+CORPUS = Path(__file__).parent / "fixtures" / "html"
+
+# Saved pages: text the main content must keep, and boilerplate it must drop
+PAGES = {
+    "wordpress_post.html": (
+        [
+            "Most latency problems in asyncio services",
+            "slow_callback_duration",
+            "move them to a worker thread or process pool",
+        ],
+        ["Share this:", "Recent Posts", "We use cookies", "Archive"],
+    ),
+    "news_article.html": (
+        [
+            "City council approves new rail line",
+            "voted nine to two on Tuesday",
+            "congestion on the airport highway",
+        ],
+        [
+            "Share on Facebook",
+            "Advertisement",
+            "morning briefing",
+            "free articles",
+            "Subscribe",
+        ],
+    ),
+    "docs_page.html": (
+        [
+            "Every client keeps a pool of open connections",
+            "Close the client when the application shuts down",
+        ],
+        ["Search docs", "Quickstart"],
+    ),
+    "chinese_news.html": (
+        ["新能源汽车销量持续增长", "市场渗透率首次超过四成", "进一步扩大市场规模"],
+        ["分享到", "首页"],
+    ),
+}
+
+FAST_EXTRACTORS = ["html.parser", "lxml", "selectolax"]
+
+
+def extractor(name: str):
+    if name == "lxml":
+        pytest.importorskip("lxml")
+    elif name == "selectolax":
+        pytest.importorskip("selectolax.lexbor")
+    return get_extractor(name)
+
+
+@pytest.mark.parametrize("name", FAST_EXTRACTORS)
+@pytest.mark.parametrize("page", sorted(PAGES))
+def test_corpus_keeps_content_and_drops_boilerplate(name, page):
+    keep, drop = PAGES[page]
+    text = extractor(name).extract((CORPUS / page).read_text(encoding="utf-8"))
+
+    assert text
+    for phrase in keep:
+        assert phrase in text
+    for phrase in drop:
+        assert phrase not in text
+
+
+@pytest.mark.parametrize("page", sorted(PAGES))
+def test_extractors_agree_on_corpus(page):
+    html = (CORPUS / page).read_text(encoding="utf-8")
+    outputs = {name: extractor(name).extract(html) for name in FAST_EXTRACTORS}
+    assert len(set(outputs.values())) == 1, outputs
+
+
+@pytest.mark.parametrize("name", FAST_EXTRACTORS)
+def test_body_classes_never_drop_the_page(name):
+    html = (
+        '<html><body class="post-template-default single has-sidebar">'
+        '<div class="content"><p>The article text.</p></div>'
+        '<div class="widget-sidebar">Related links</div></body></html>'
+    )
+    assert extractor(name).extract(html) == "The article text."
+
+
+@pytest.mark.parametrize("name", FAST_EXTRACTORS)
+def test_markers_match_whole_class_tokens(name):
+    html = (
+        '<html><body><div class="main-content sharedaddy"><p>Whole article.</p>'
+        '</div><div class="share-buttons">Tweet this</div></body></html>'
+    )
+    assert extractor(name).extract(html) == "Whole article."
+
+
+@pytest.mark.parametrize("name", FAST_EXTRACTORS)
+def test_content_containers_are_kept(name):
+    html = (
+        '<html><body><main class="menu-page"><article class="post modal">'
+        "<p>Menu of the day.</p></article></main>"
+        '<ul id="Main-Menu"><li>Home</li></ul></body></html>'
+    )
+    assert extractor(name).extract(html) == "Menu of the day."
+
+
+@pytest.mark.parametrize(
+    "names, expected",
+    [
+        ("sidebar", True),
+        ("left-sidebar widget", True),
+        ("cookie_notice", True),
+        ("Main-Menu", True),
+        ("sharedaddy", False),
+        ("menubar-spacer", False),
+        ("has-sidebar", False),
+        ("is-modal-open", False),
+        ("main-content", False),
+    ],
+)
+def test_is_boilerplate(names, expected):
+    assert is_boilerplate(names) is expected
+
+
+@pytest.mark.parametrize("name", FAST_EXTRACTORS)
+def test_stops_at_the_budget(name):
+    html = "<html><body>" + "<p>word</p>" * 10000 + "</body></html>"
+    text = extractor(name).extract(html, max_chars=100)
+    assert len(text) <= 100
+    assert text.startswith("word word")
+
+
+def test_unknown_extractor_is_rejected():
+    with pytest.raises(ValueError):
+        get_extractor("regex")
+
+
+def test_extract_text_falls_back_to_html_parser(monkeypatch):
+    pytest.importorskip("lxml")
+
+    def broken(html, max_chars):
+        raise ValueError("parse error")
+
+    monkeypatch.setattr(get_extractor("lxml"), "extract", broken)
+    assert extract_text("<p>still works</p>", extractor="lxml") == "still works"
+
+
+def test_every_extractor_is_registered():
+    assert set(FAST_EXTRACTORS) < set(EXTRACTORS)
@@ -0,0 +1,104 @@
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+from app.llm import LLM, track_usage
+
+
+def chunk(content=None, tool_call=None, usage=None):
+    if content is None and tool_call is None:
+        return SimpleNamespace(choices=[], usage=usage)
+    delta = SimpleNamespace(
+        content=content, tool_calls=[tool_call] if tool_call else None
+    )
+    choice = SimpleNamespace(delta=delta, finish_reason=None)
+    return SimpleNamespace(choices=[choice], usage=usage)
+
+
+def tool_delta(index, name=None, arguments=None, id=None):
+    function = SimpleNamespace(name=name, arguments=arguments)
+    return SimpleNamespace(index=index, id=id, function=function)
+
+
+def fake_stream(monkeypatch, chunks: List[SimpleNamespace]) -> None:
+    async def stream():
+        for item in chunks:
+            yield item
+
+    async def create(llm, input_tokens=0, **params):
+        return stream()
+
+    monkeypatch.setattr(LLM, "_create_completion", create)
+
+
+@pytest.fixture
+def llm():
+    return LLM()
+
+
+@pytest.fixture
+def encoded(monkeypatch, llm) -> List[str]:
+    """Every text the tokenizer encodes"""
+    texts: List[str] = []
+    original = llm.tokenizer.encode
+
+    def encode(text, *args, **kwargs):
+        texts.append(text)
+        return original(text, *args, **kwargs)
+
+    monkeypatch.setattr(llm.tokenizer, "encode", encode)
+    return texts
+
+
+PARTS = ["The quick brown fox ", "jumps over ", "the lazy dog."]
+
+
+@pytest.mark.asyncio
+async def test_stream_without_usage_counts_tokens_per_chunk(monkeypatch, llm, encoded):
+    fake_stream(monkeypatch, [chunk(part) for part in PARTS])
+
+    with track_usage() as usage:
+        answer = await llm.ask([{"role": "user", "content": "hi"}])
+
+    assert answer == "".join(PARTS)
+    assert usage.completion_tokens == sum(llm.count_tokens(part) for part in PARTS)
+    # The full answer is never encoded again after the stream
+    assert answer not in encoded
+
+
+@pytest.mark.asyncio
+async def test_stream_usage_frame_wins_over_the_estimate(monkeypatch, llm):
+    frame = SimpleNamespace(prompt_tokens=7, completion_tokens=42, total_tokens=49)
+    fake_stream(monkeypatch, [chunk(part) for part in PARTS] + [chunk(usage=frame)])
+
+    with track_usage() as usage:
+        await llm.ask([{"role": "user", "content": "hi"}])
+
+    assert (usage.prompt_tokens, usage.completion_tokens) == (7, 42)
+
+
+@pytest.mark.asyncio
+async def test_tool_stream_without_usage_counts_tokens_per_delta(
+    monkeypatch, llm, encoded
+):
+    deltas = [
+        tool_delta(0, name="web_search", id="call_1"),
+        tool_delta(0, arguments='{"query": '),
+        tool_delta(0, arguments='"asyncio"}'),
+    ]
+    fake_stream(
+        monkeypatch, [chunk("Searching")] + [chunk(tool_call=d) for d in deltas]
+    )
+
+    with track_usage() as usage:
+        message = await llm.ask_tool(
+            [{"role": "user", "content": "search"}], tools=[], stream=True
+        )
+
+    assert message.tool_calls[0].function.arguments == '{"query": "asyncio"}'
+    assert usage.completion_tokens == sum(
+        llm.count_tokens(text)
+        for text in ["Searching", "web_search", '{"query": ', '"asyncio"}']
+    )
+    assert '{"query": "asyncio"}' not in encoded
@@ -0,0 +1,188 @@
+"""LLMRouter against local mock chat completion servers.
+
+Each MockServer is a real HTTP server that the openai client talks to, with
+a per-request plan of latency and status code.
+"""
+
+import asyncio
+import json
+import random
+import time
+from typing import Callable, List, Set, Tuple
+
+import pytest
+import pytest_asyncio
+from openai import AsyncOpenAI, InternalServerError
+
+from app.circuit_breaker import CircuitBreaker
+from app.llm_router import LLMRouter, RoutedEndpoint
+
+
+COMPLETION = {
+    "id": "chatcmpl-mock",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "mock",
+    "choices": [
+        {
+            "index": 0,
+            "message": {"role": "assistant", "content": "ok"},
+            "finish_reason": "stop",
+        }
+    ],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+
+
+class MockServer:
+    """Chat completions server; plan(n) gives (delay, status) of the n-th request"""
+
+    def __init__(self, plan: Callable[[int], Tuple[float, int]]):
+        self.plan = plan
+        self.requests = 0
+        self._server = None
+        self._handlers: Set[asyncio.Task] = set()
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/v1"
+
+    async def close(self) -> None:
+        """Stop listening and let requests still being answered finish"""
+        self._server.close()
+        await asyncio.gather(*self._handlers)
+
+    async def _handle(self, reader, writer) -> None:
+        self._handlers.add(asyncio.current_task())
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = next(
+                int(line.split(b":", 1)[1])
+                for line in head.split(b"\r\n")
+                if line.lower().startswith(b"content-length:")
+            )
+            await reader.readexactly(length)
+            delay, status = self.plan(self.requests)
+            self.requests += 1
+            await asyncio.sleep(delay)
+            body = json.dumps(
+                COMPLETION if status == 200 else {"error": {"message": "unavailable"}}
+            ).encode()
+            writer.write(
+                f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            self._handlers.discard(asyncio.current_task())
+
+
+@pytest_asyncio.fixture
+async def servers():
+    started: List[MockServer] = []
+
+    async def serve(plan: Callable[[int], Tuple[float, int]]):
+        server = MockServer(plan)
+        started.append(server)
+        return server, await server.start()
+
+    yield serve
+    for server in started:
+        await server.close()
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(CircuitBreaker, "_breakers", {})
+    monkeypatch.setattr(LLMRouter, "EXPLORE_PROBABILITY", 0)
+
+
+def endpoint(name: str, base_url: str) -> RoutedEndpoint:
+    client = AsyncOpenAI(api_key="test", base_url=base_url, max_retries=0)
+    return RoutedEndpoint(name, "mock", client)
+
+
+def p99(latencies: List[float]) -> float:
+    ordered = sorted(latencies)
+    return ordered[int(len(ordered) * 0.99) - 1]
+
+
+async def measure(router: LLMRouter, requests: int = 100) -> List[float]:
+    """Send requests one after another and return their latencies"""
+    latencies: List[float] = []
+    for _ in range(requests):
+        start = time.monotonic()
+        response = await router.create(messages=[{"role": "user", "content": "hi"}])
+        assert response.choices[0].message.content == "ok"
+        latencies.append(time.monotonic() - start)
+    return latencies
+
+
+def slow_tail(seed: int, share: float = 0.1, slow: float = 0.15, fast: float = 0.002):
+    rng = random.Random(seed)
+    return lambda n: (slow if rng.random() < share else fast, 200)
+
+
+@pytest.mark.asyncio
+async def test_hedging_cuts_p99_latency(servers):
+    _, flaky_url = await servers(slow_tail(seed=1))
+    _, steady_url = await servers(lambda n: (0.005, 200))
+
+    alone = await measure(LLMRouter([endpoint("flaky-alone", flaky_url)]))
+    hedged = await measure(
+        LLMRouter(
+            [endpoint("flaky", flaky_url), endpoint("steady", steady_url)],
+            hedge_after=0.02,
+        )
+    )
+
+    assert p99(alone) >= 0.15
+    assert p99(hedged) < p99(alone) / 2
+
+
+@pytest.mark.asyncio
+async def test_failover_keeps_requests_succeeding(servers):
+    down, down_url = await servers(lambda n: (0, 503))
+    _, up_url = await servers(lambda n: (0.002, 200))
+    router = LLMRouter([endpoint("down", down_url), endpoint("up", up_url)])
+
+    latencies = await measure(router, requests=50)
+
+    assert p99(latencies) < 0.15
+    # The breaker opened: later requests went straight to the healthy endpoint
+    assert down.requests <= 5
+
+
+@pytest.mark.asyncio
+async def test_failed_hedge_does_not_call_its_backup_again(servers):
+    primary, primary_url = await servers(lambda n: (0.1, 503))
+    backup, backup_url = await servers(lambda n: (0, 503))
+    last, last_url = await servers(lambda n: (0, 200))
+    router = LLMRouter(
+        [
+            endpoint("hedge-primary", primary_url),
+            endpoint("hedge-backup", backup_url),
+            endpoint("hedge-last", last_url),
+        ],
+        hedge_after=0.02,
+    )
+
+    response = await router.create(messages=[{"role": "user", "content": "hi"}])
+
+    assert response.choices[0].message.content == "ok"
+    assert (primary.requests, backup.requests, last.requests) == (1, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_all_endpoints_failing_raises_the_error(servers):
+    _, first_url = await servers(lambda n: (0, 503))
+    _, second_url = await servers(lambda n: (0, 503))
+    router = LLMRouter([endpoint("fail-1", first_url), endpoint("fail-2", second_url)])
+
+    with pytest.raises(InternalServerError):
+        await router.create(messages=[{"role": "user", "content": "hi"}])
@@ -0,0 +1,69 @@
+from app import schema
+from app.agent.base import BaseAgent
+from app.schema import Memory, Message, ToolCall, estimate_message_tokens
+
+
+class IdleAgent(BaseAgent):
+    async def step(self) -> str:
+        return ""
+
+
+def tool_turn(n: int, output: str):
+    call = ToolCall(id=f"call_{n}", function={"name": "search", "arguments": "{}"})
+    return [
+        Message.from_tool_calls([call], content=f"step {n}"),
+        Message.tool_message(output, name="search", tool_call_id=f"call_{n}"),
+    ]
+
+
+def recount(memory: Memory) -> int:
+    return sum(estimate_message_tokens(m) for m in memory.messages)
+
+
+def test_running_token_total_matches_the_messages():
+    memory = Memory(max_messages=40, max_tokens=2000, keep_recent=4)
+    memory.add_message(Message.system_message("system"))
+    memory.add_message(Message.user_message("task " * 50))
+    for n in range(100):
+        memory.add_messages(tool_turn(n, "result " * (n % 30 + 1)))
+        assert memory.tokens == recount(memory)
+
+    assert memory.tokens <= 2000
+    assert memory.drop_incomplete_turn() is False
+    memory.add_message(tool_turn(100, "")[0])
+    assert memory.drop_incomplete_turn() is True
+    assert memory.tokens == recount(memory)
+    memory.clear()
+    assert memory.tokens == 0
+
+
+def test_compaction_does_not_recount_the_conversation(monkeypatch):
+    estimates = []
+
+    def counting_estimate(message):
+        estimates.append(message)
+        return estimate_message_tokens(message)
+
+    monkeypatch.setattr(schema, "estimate_message_tokens", counting_estimate)
+    memory = Memory(max_messages=10_000, max_tokens=20_000, keep_recent=6)
+    memory.add_message(Message.user_message("task"))
+    for n in range(1000):
+        memory.add_messages(tool_turn(n, "result " * 20))
+
+    # A handful of estimates per message, not one per stored message per add
+    assert len(estimates) < 2000 * 5
+    assert memory.tokens == recount(memory)
+
+
+def test_replacing_agent_messages_rebuilds_the_indexes():
+    agent = IdleAgent(name="test")
+    repeated = Message.assistant_message("same answer")
+    agent.memory.add_messages([repeated, repeated])
+    assert agent.memory.last_response_repeats == 1
+
+    agent.messages = [Message.user_message("fresh"), repeated]
+
+    assert agent.memory.last_response_repeats == 0
+    assert agent.memory.tokens == recount(agent.memory)
+    agent.memory.add_message(Message.assistant_message("same answer"))
+    assert agent.memory.last_response_repeats == 1
@@ -0,0 +1,84 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from app.rate_limiter import LLMRequestLimiter, Priority, RequestCoalescer, llm_priority
+
+
+class Upstream:
+    """Answers with the call number after a delay"""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self) -> int:
+        self.calls += 1
+        call = self.calls
+        await asyncio.sleep(self.delay)
+        return call
+
+
+@pytest.mark.asyncio
+async def test_followers_share_the_leaders_result():
+    coalescer, upstream = RequestCoalescer("test"), Upstream()
+
+    results = await asyncio.gather(*(coalescer.run("key", upstream) for _ in range(3)))
+
+    assert results == [1, 1, 1]
+    assert upstream.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_followers():
+    coalescer, upstream = RequestCoalescer("test"), Upstream()
+    leader = asyncio.create_task(coalescer.run("key", upstream))
+    await asyncio.sleep(0)
+    followers = [asyncio.create_task(coalescer.run("key", upstream)) for _ in range(2)]
+    await asyncio.sleep(0.01)
+
+    leader.cancel()
+
+    # One follower runs the request again and the other shares it
+    assert await asyncio.gather(*followers) == [2, 2]
+    assert leader.cancelled()
+    assert upstream.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_leader_errors_reach_followers():
+    coalescer = RequestCoalescer("test")
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    results = await asyncio.gather(
+        *(coalescer.run("key", failing) for _ in range(2)), return_exceptions=True
+    )
+
+    assert [type(r) for r in results] == [ValueError, ValueError]
+
+
+@pytest.mark.asyncio
+async def test_background_requests_wait_behind_interactive_ones():
+    limiter = LLMRequestLimiter("test", max_concurrency=1)
+    served: List[Priority] = []
+    await limiter.acquire()
+
+    async def request(priority: Priority):
+        with llm_priority(priority):
+            await limiter.acquire()
+        served.append(priority)
+        limiter.release()
+
+    waiting = [
+        asyncio.create_task(request(priority))
+        for priority in (Priority.BACKGROUND, Priority.DEFAULT, Priority.INTERACTIVE)
+    ]
+    await asyncio.sleep(0)
+    limiter.release()
+    await asyncio.gather(*waiting)
+
+    assert served == [Priority.INTERACTIVE, Priority.DEFAULT, Priority.BACKGROUND]
@@ -0,0 +1,204 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import pytest
+
+from app.tool import web_search as web_search_module
+from app.tool.search.base import SearchItem
+from app.tool.web_search import EngineHealth, WebSearch
+
+
+def items(engine: str, *paths: str) -> List[SearchItem]:
+    return [
+        SearchItem(title=f"{engine} {path}", url=f"https://example.com/{path}")
+        for path in paths
+    ]
+
+
+class FakeEngines:
+    """Answers per engine after a delay; None as the answer means the engine fails"""
+
+    def __init__(self, answers: Dict[str, Tuple[float, Optional[List[SearchItem]]]]):
+        self.answers = answers
+        self.started: List[str] = []
+        self.cancelled: List[str] = []
+
+    async def perform(self, tool, engine, query, num_results, search_params):
+        name = next(n for n, e in tool._search_engine.items() if e is engine)
+        self.started.append(name)
+        delay, answer = self.answers.get(name, (0, None))
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(name)
+            raise
+        if answer is None:
+            raise RuntimeError(f"{name} is down")
+        return answer
+
+
+@pytest.fixture
+def health(monkeypatch):
+    fresh = defaultdict(EngineHealth)
+    monkeypatch.setattr(web_search_module, "engine_health", fresh)
+    return fresh
+
+
+def patch_engines(monkeypatch, engines: FakeEngines) -> WebSearch:
+    async def perform(tool, engine, query, num_results, search_params):
+        return await engines.perform(tool, engine, query, num_results, search_params)
+
+    monkeypatch.setattr(WebSearch, "_perform_search_with_engine", perform)
+    return WebSearch()
+
+
+async def race(
+    tool: WebSearch,
+    order: List[str],
+    hedge_delay: float,
+    merge: bool = False,
+    merge_window: float = 0.0,
+):
+    return await tool._race_engines(
+        order,
+        "query",
+        5,
+        {},
+        hedge_delay=hedge_delay,
+        merge=merge,
+        merge_window=merge_window,
+    )
+
+
+@pytest.mark.asyncio
+async def test_hedge_beats_a_slow_engine(monkeypatch, health):
+    engines = FakeEngines(
+        {"google": (5, items("google", "a")), "bing": (0.01, items("bing", "b"))}
+    )
+    tool = patch_engines(monkeypatch, engines)
+
+    started = time.monotonic()
+    results = await race(tool, ["google", "bing"], hedge_delay=0.05)
+
+    assert time.monotonic() - started < 1
+    assert [r.source for r in results] == ["bing"]
+    await asyncio.sleep(0)  # let the cancellation reach the losing engine
+    assert engines.cancelled == ["google"]
+    # Losing the race is not held against the engine
+    assert "google" not in health
+
+
+@pytest.mark.asyncio
+async def test_fast_engine_is_not_hedged(monkeypatch, health):
+    engines = FakeEngines(
+        {"google": (0.01, items("google", "a")), "bing": (0, items("bing", "b"))}
+    )
+    tool = patch_engines(monkeypatch, engines)
+
+    results = await race(tool, ["google", "bing"], hedge_delay=1)
+
+    assert [r.source for r in results] == ["google"]
+    assert engines.started == ["google"]
+
+
+@pytest.mark.asyncio
+async def test_failure_starts_the_next_engine_at_once(monkeypatch, health):
+    engines = FakeEngines({"google": (0, None), "bing": (0, items("bing", "b"))})
+    tool = patch_engines(monkeypatch, engines)
+
+    started = time.monotonic()
+    results = await race(tool, ["google", "bing"], hedge_delay=5)
+
+    assert time.monotonic() - started < 1
+    assert [r.source for r in results] == ["bing"]
+    assert health["google"].error_ewma > 0
+
+
+@pytest.mark.asyncio
+async def test_all_engines_failing_returns_nothing(monkeypatch, health):
+    engines = FakeEngines({"google": (0, None), "bing": (0, [])})
+    tool = patch_engines(monkeypatch, engines)
+
+    assert await race(tool, ["google", "bing"], hedge_delay=0.05) == []
+    assert engines.started == ["google", "bing"]
+
+
+@pytest.mark.asyncio
+async def test_merge_interleaves_and_deduplicates(monkeypatch, health):
+    engines = FakeEngines(
+        {
+            "google": (0, items("google", "a", "b")),
+            "bing": (0.02, items("bing", "a/", "c")),
+            "baidu": (5, items("baidu", "d")),
+        }
+    )
+    tool = patch_engines(monkeypatch, engines)
+
+    results = await race(
+        tool,
+        ["google", "bing", "baidu"],
+        hedge_delay=0,
+        merge=True,
+        merge_window=0.5,
+    )
+
+    assert [(r.source, r.url) for r in results] == [
+        ("google", "https://example.com/a"),
+        ("google", "https://example.com/b"),
+        ("bing", "https://example.com/c"),
+    ]
+    assert [r.position for r in results] == [1, 2, 3]
+    await asyncio.sleep(0)  # let the cancellation reach the losing engine
+    assert engines.cancelled == ["baidu"]
+
+
+def test_engine_health_is_unknown_until_measured():
+    assert EngineHealth().expected_latency() is None
+
+
+def test_failures_raise_expected_latency():
+    healthy, flaky = EngineHealth(), EngineHealth()
+    for failed in (False, True, False, True):
+        healthy.record(1.0, failed=False)
+        flaky.record(1.0, failed=failed)
+
+    assert healthy.expected_latency() == pytest.approx(1.0)
+    assert flaky.expected_latency() > healthy.expected_latency()
+
+
+def test_engine_health_tracks_recent_latency():
+    health = EngineHealth()
+    health.record(4.0, failed=False)
+    for _ in range(10):
+        health.record(0.5, failed=False)
+    assert health.expected_latency() < 0.6
+
+
+def test_unmeasured_engines_keep_their_configured_order(health):
+    assert WebSearch._adapt_engine_order(["google", "bing", "baidu"]) == [
+        "google",
+        "bing",
+        "baidu",
+    ]
+
+
+def test_measured_engines_are_sorted_within_their_slots(health):
+    health["google"].record(2.0, failed=False)
+    health["baidu"].record(0.5, failed=False)
+
+    assert WebSearch._adapt_engine_order(["google", "bing", "baidu", "duckduckgo"]) == [
+        "baidu",
+        "bing",
+        "google",
+        "duckduckgo",
+    ]
+
+
+def test_failing_engine_falls_behind_a_slower_healthy_one(health):
+    for _ in range(3):
+        health["google"].record(0.5, failed=True)
+    health["bing"].record(1.0, failed=False)
+
+    assert WebSearch._adapt_engine_order(["google", "bing"]) == ["bing", "google"]